@@ -0,0 +1,188 @@
+###########################################################################
+#      ____  _____________  __    __  __ _           _____ ___   _        #
+#     / __ \/ ____/ ___/\ \/ /   |  \/  (_)__ _ _ __|_   _/ __| /_\  (R)  #
+#    / / / / __/  \__ \  \  /    | |\/| | / _| '_/ _ \| || (__ / _ \      #
+#   / /_/ / /___ ___/ /  / /     |_|  |_|_\__|_| \___/|_| \___/_/ \_\     #
+#  /_____/_____//____/  /_/      T  E  C  H  N  O  L  O  G  Y   L A B     #
+#                                                                         #
+#          Copyright 2021 Deutsches Elektronen-Synchrotron DESY.          #
+#                  SPDX-License-Identifier: BSD-3-Clause                  #
+#                                                                         #
+###########################################################################
+
+''' Container format for archiving many FRU images in one file
+
+Layout (all integers little endian):
+
+    header    magic "FRUGYARC", u16 version, u16 reserved, u32 entry count, u64 index offset, 8 reserved bytes
+    images    raw FRU images, packed back-to-back
+    index     per entry: u64 offset, u32 length, 20 byte SHA-1 of the image, u16 board ID length, board ID (UTF-8)
+
+New images are appended behind the index. On flush / close, a new index is written behind them
+and synced to disk before the header is switched over to it, so an interrupted append leaves the
+archive as it was after the last flush. The space of the old index is not reused.
+'''
+
+from collections import namedtuple
+import hashlib
+import mmap
+import os
+import struct
+
+from frugy.fru import Fru
+
+ArchiveEntry = namedtuple('ArchiveEntry', ['board_id', 'sha1', 'offset', 'length'])
+
+
+class FruArchive:
+    ''' Archive of FRU images with memory-mapped random access '''
+
+    _magic = b'FRUGYARC'
+    _version = 1
+    _header_fmt = struct.Struct('<8sHHIQ8x')
+    _entry_fmt = struct.Struct('<QI20sH')
+
+    def __init__(self, fname, mode='r'):
+        if mode not in ('r', 'w', 'a'):
+            raise ValueError(f'invalid archive mode: {mode}')
+        self.fname = fname
+        self._mode = mode
+        self._map = None
+        self._dirty = False
+        self.entries = []
+
+        if mode == 'w' or (mode == 'a' and not os.path.exists(fname)):
+            self._file = open(fname, 'w+b')
+            # end of the images appended, where the next index is written
+            self._data_end = self._header_fmt.size
+            self._dirty = True
+            self.flush()
+        else:
+            self._file = open(fname, 'rb' if mode == 'r' else 'r+b')
+            try:
+                if os.fstat(self._file.fileno()).st_size < self._header_fmt.size:
+                    raise RuntimeError(f'{fname}: not a frugy archive')
+                self._remap()
+                self._read_index()
+            except RuntimeError:
+                self._unmap()
+                self._file.close()
+                raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return (self.image(i) for i in range(len(self.entries)))
+
+    def _unmap(self):
+        if self._map is None:
+            return
+        try:
+            self._map.close()
+        except BufferError:
+            # images returned by image() still refer to it, it is unmapped once they are released
+            pass
+        self._map = None
+
+    def _remap(self):
+        self._unmap()
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self._map, 'madvise'):
+            self._map.madvise(mmap.MADV_SEQUENTIAL)
+
+    def _read_index(self):
+        magic, version, _, count, index_offs = self._header_fmt.unpack_from(self._map, 0)
+        if magic != self._magic:
+            raise RuntimeError(f'{self.fname}: not a frugy archive')
+        if version != self._version:
+            raise RuntimeError(f'{self.fname}: unsupported archive version {version}')
+
+        pos = index_offs
+        try:
+            for _ in range(count):
+                offset, length, sha1, id_len = self._entry_fmt.unpack_from(self._map, pos)
+                pos += self._entry_fmt.size
+                if pos + id_len > len(self._map) or offset + length > index_offs:
+                    raise struct.error('entry out of bounds')
+                board_id = self._map[pos:pos+id_len].decode('utf-8')
+                pos += id_len
+                self.entries.append(ArchiveEntry(board_id, sha1, offset, length))
+        except (struct.error, UnicodeDecodeError) as e:
+            raise RuntimeError(f'{self.fname}: truncated or corrupt index ({e})') from e
+        # anything behind the index is left over from an interrupted append
+        self._data_end = pos
+
+    def append(self, image, board_id=''):
+        ''' Append a FRU image, return its index '''
+        if self._mode == 'r':
+            raise RuntimeError(f'{self.fname}: archive opened read-only')
+        self._file.seek(self._data_end)
+        self._file.write(image)
+        self.entries.append(ArchiveEntry(
+            board_id, hashlib.sha1(image).digest(), self._data_end, len(image)))
+        self._data_end += len(image)
+        self._dirty = True
+        return len(self.entries) - 1
+
+    def flush(self):
+        ''' Write index and header, make appended images readable '''
+        ''' The images and the new index are on disk before the header refers to them. '''
+        if not self._dirty:
+            return
+        index = []
+        for e in self.entries:
+            board_id = e.board_id.encode('utf-8')
+            index.append(self._entry_fmt.pack(e.offset, e.length, e.sha1, len(board_id)) + board_id)
+        index_offs = self._data_end
+        self._file.seek(index_offs)
+        self._file.write(b''.join(index))
+        self._file.truncate()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        self._file.seek(0)
+        self._file.write(self._header_fmt.pack(
+            self._magic, self._version, 0, len(self.entries), index_offs))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        # further images go behind the index, which stays valid until the next flush
+        self._data_end = self._file.seek(0, os.SEEK_END)
+        self._dirty = False
+        self._remap()
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self._mode != 'r':
+            self.flush()
+        self._unmap()
+        self._file.close()
+
+    def image(self, idx):
+        ''' Return raw image of entry idx, as memoryview of the mapped archive (without copying) '''
+        e = self.entries[idx]
+        if self._dirty and e.offset + e.length > len(self._map):
+            self.flush()
+        return memoryview(self._map)[e.offset:e.offset+e.length]
+
+    def find(self, board_id):
+        ''' Return indices of all entries with given board ID '''
+        return [i for i, e in enumerate(self.entries) if e.board_id == board_id]
+
+    def load_fru(self, idx, store=None):
+        ''' Deserialize entry idx straight from the mapped archive '''
+        fru = Fru()
+        fru.load_archive_entry(self, idx, store=store)
+        return fru
+
+    def iter_frus(self, store=None):
+        ''' Sequentially deserialize all entries, yield (entry, Fru) '''
+        for i, e in enumerate(self.entries):
+            yield e, self.load_fru(i, store=store)
@@ -84,6 +84,10 @@ class BoardInfo(FruAreaSized):
     _time_ref = datetime(1996, 1, 1)
     _time_rollover_limit = 2**24
 
+    _json_schema_extra = {'properties': {
+        'mfg_date_time': {'type': ['string', 'null'], 'format': 'date-time'},
+    }}
+
     def _timestamp_to_minutes(self, timestamp):
         td = timestamp - self._time_ref
         return td.seconds // 60 + td.days * (60*24)
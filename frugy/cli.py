@@ -10,7 +10,10 @@
 #                                                                         #
 ###########################################################################
 
+from concurrent.futures import ProcessPoolExecutor
 import argparse
+import atexit
+import bitstruct
 import os
 import sys
 import yaml
@@ -18,10 +21,17 @@ from datetime import datetime
 import logging
 
 from frugy.__init__ import __version__
-from frugy.fru import Fru
+from frugy.fru import Fru, yaml_loader
+from frugy.archive import FruArchive
 from frugy.fru_registry import FruRecordType, rec_enumerate, rec_lookup_by_name, rec_info, schema_entry_info
-from frugy.types import FruAreaChecksummed
+from frugy.types import FruAreaChecksummed, FixedField
 from frugy.multirecords import MultirecordEntry
+from frugy.validate import validate, json_schema
+from frugy.optimize import optimize, size_budget, format_budget, write_amplification, format_write_amplification
+import frugy.profiling
+import frugy.regress
+from frugy import metrics
+import json
 
 
 def list_supported_records():
@@ -68,6 +78,227 @@ def writer(fname, content, bin_mode=False):
             sys.stdout.write(content)
 
 
+def iter_sources(sources):
+    ''' Parse FRU images and archives one by one, yield (name, Fru or RuntimeError) '''
+    for src in sources:
+        if src.endswith('.fra'):
+            try:
+                archive = FruArchive(src)
+            except RuntimeError as e:
+                # a corrupt archive doesn't end the stream
+                yield src, e
+                continue
+            with archive:
+                for idx in range(len(archive)):
+                    try:
+                        yield f'{src}[{idx}]', archive.load_fru(idx)
+                    except RuntimeError as e:
+                        yield f'{src}[{idx}]', e
+        else:
+            fru = Fru()
+            try:
+                fru.load_bin(src)
+                yield src, fru
+            except RuntimeError as e:
+                yield src, e
+
+
+def stream_frus(sources, outfile, jsonl=False):
+    ''' Write all parsed FRUs as a stream of YAML documents or JSON lines, return number of errors '''
+    ''' Each FRU is written as soon as it is parsed, so memory use doesn't grow with the number of inputs. '''
+    out = sys.stdout if outfile == '-' else open(outfile, 'w')
+    errors = 0
+    try:
+        for name, fru in iter_sources(sources):
+            if isinstance(fru, RuntimeError):
+                print(f'Error while parsing {name}: {fru}', file=sys.stderr)
+                errors += 1
+            elif jsonl:
+                fru.write_json(out, source=name)
+            else:
+                out.write('---\n')
+                fru.write_yaml(out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return errors
+
+
+def _is_description(doc):
+    ''' True if doc is a mapping of FRU area names, e.g. {'BoardInfo': ...} '''
+    return isinstance(doc, dict) and bool(doc) and all(k in Fru._area_classes for k in doc)
+
+
+def named_documents(docs, basename):
+    ''' Return [(output name, FRU description)] for a YAML stream describing several FRUs '''
+    ''' Each document is a FRU description, named <basename>-<n>, or a mapping of output names
+    to FRU descriptions (or a list of such single-key mappings). Returns None for a single
+    unnamed FRU description, which is written as before. A mapping is only taken for named
+    descriptions if all its values are mappings of area names, so a description with a
+    misspelled area is still reported as such by the validation. '''
+    docs = [d for d in docs if d is not None]
+    result = []
+    for n, doc in enumerate(docs):
+        if isinstance(doc, list) and doc and all(
+                isinstance(d, dict) and len(d) == 1 and _is_description(next(iter(d.values()))) for d in doc):
+            result += [next(iter(d.items())) for d in doc]
+        elif isinstance(doc, dict) and doc and all(_is_description(v) for v in doc.values()):
+            result += doc.items()
+        else:
+            result.append((f'{basename}-{n}', doc))
+    if len(docs) <= 1 and len(result) <= 1 and all(name.startswith(f'{basename}-') for name, _ in result):
+        return None
+    return result
+
+
+def build_image(fru, fru_dict, args, name):
+    ''' Build FRU image from a YAML description as requested by the write mode options '''
+    ''' fru is updated in place, so it can be reused for the next description. Returns
+    (image, report for stderr); errors raise a RuntimeError with the message to print. '''
+    if not isinstance(fru_dict, dict):
+        raise RuntimeError(f'Error: {name} is not a FRU description')
+
+    if args.set is not None:
+        for s in args.set:
+            k, v = s.split('=')
+            key_path = k.split('.')
+            if len(key_path) > 1:
+                # Traverse hierarchy of selected key_path e.g. ['BoardInfo', 'serial_number']
+                dict_set(fru_dict, key_path, set_value(key_path, v))
+            else:
+                # Set property e.g 'serial_number' of all first level records (e.g. 'BoardInfo', 'ProductInfo')
+                key = key_path[0]
+                for k in fru_dict.keys():
+                    if key in fru_dict[k]:
+                        fru_dict[k][key] = set_value([k, key], v)
+
+    if args.timestamp:
+        if 'BoardInfo' in fru_dict:
+            fru_dict['BoardInfo']['mfg_date_time'] = datetime.utcnow()
+        else:
+            raise RuntimeError('Error: FRU needs BoardInfo area to carry the timestamp')
+
+    if not args.no_validate:
+        errors = validate(fru_dict)
+        if errors:
+            raise RuntimeError('\n'.join([f'Error: {name} is invalid:'] + [f'  {e}' for e in errors]))
+
+    fru.update(fru_dict, in_place=True)
+    if args.optimize:
+        saved = optimize(fru)
+        logging.info(f'optimizer saved {saved} bytes')
+    try:
+        image_size = fru.size_total(args.page_size, args.slack)
+    except RuntimeError as e:
+        # the common header can't point behind 2040 bytes, e.g. with large pages
+        raise RuntimeError(f'Error: {name} cannot be laid out: {e}')
+    report = []
+    budget = size_budget(fru, args.page_size, args.slack)
+    if args.budget or args.optimize:
+        report.append(format_budget(budget, args.eeprom_size))
+    if args.budget and args.page_size is not None:
+        report.append(format_write_amplification(write_amplification(fru, args.page_size, args.slack),
+                                                 args.page_size))
+    if args.eeprom_size is not None and image_size > args.eeprom_size:
+        report.append(f'Error: Image size ({image_size}) exceeds EEPROM size ({args.eeprom_size})')
+        if not (args.budget or args.optimize):
+            report.append(format_budget(budget, args.eeprom_size))
+        raise RuntimeError('\n'.join(report))
+    # padded to the EEPROM size while serializing
+    try:
+        img = fru.serialize(args.eeprom_size, args.page_size, args.slack)
+    except (bitstruct.Error, ValueError) as e:
+        # values of the wrong type or out of range, only caught here with --no-validate
+        raise RuntimeError(f'Error: {name} cannot be encoded: {e}')
+    if args.verify:
+        diffs = fru.verify_roundtrip(img)
+        if diffs:
+            report.append('Error: FRU image does not decode to its source:')
+            report += [f'  {d}' for d in diffs]
+            raise RuntimeError('\n'.join(report))
+    return img, '\n'.join(report)
+
+
+# Fru of a build_images() worker process, reused for all its documents
+_worker_fru = None
+
+
+def _build_job(job):
+    ''' Build one image of build_images(), return (name, image or None, report or error message) '''
+    global _worker_fru
+    name, fru_dict, args = job
+    if _worker_fru is None:
+        _worker_fru = Fru()
+    try:
+        img, report = build_image(_worker_fru, fru_dict, args, name)
+    except RuntimeError as e:
+        return name, None, str(e)
+    return name, img, report
+
+
+# Number of documents from which build_images() uses a process pool by default
+parallel_min_docs = 64
+
+
+def build_images(named_docs, outdir, args):
+    ''' Build an image per (name, FRU description) into outdir, return number of errors '''
+    ''' Large sets are built in a process pool of args.jobs processes (default: one per CPU).
+    Records and codecs are set up before the pool is started, so forked workers share them.
+    Profiling and metrics only cover the images built in this process. '''
+    os.makedirs(outdir, exist_ok=True)
+    jobs = [(name, fru_dict, args) for name, fru_dict in named_docs]
+    num_procs = args.jobs if args.jobs is not None else (
+        os.cpu_count() or 1) if len(jobs) >= parallel_min_docs else 1
+    if num_procs > 1:
+        # load plugins and compile all codecs once, inherited by the workers
+        rec_enumerate()
+        pool = ProcessPoolExecutor(num_procs)
+        results = pool.map(_build_job, jobs, chunksize=max(1, len(jobs) // (4 * num_procs)))
+    else:
+        pool = None
+        results = map(_build_job, jobs)
+    errors = 0
+    try:
+        for name, img, report in results:
+            if img is None:
+                errors += 1
+                if not report.startswith(f'Error: {name} '):
+                    # tell which image the error belongs to
+                    print(f'{name}:', file=sys.stderr)
+            if report:
+                print(report, file=sys.stderr)
+            if img is not None:
+                fname = os.path.join(outdir, name if name.endswith('.bin') else f'{name}.bin')
+                writer(fname, img, bin_mode=True)
+                logging.info(f'wrote {fname}')
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return errors
+
+
+def print_profile(fmt):
+    frugy.profiling.disable()
+    if fmt == 'json':
+        print(frugy.profiling.to_json(), file=sys.stderr)
+    else:
+        print(frugy.profiling.format_table(), file=sys.stderr)
+
+
+def set_value(key_path, value):
+    ''' Convert the string value of --set for the field at key_path, e.g. ['ChassisInfo', 'type'] '''
+    ''' Values of integer fields are read like a YAML scalar, so '17' and '0x11' become 17 while
+    constant names stay strings; string fields keep the value as given, e.g. a serial number '1234'. '''
+    cls = Fru._area_classes.get(key_path[0])
+    entry = next((e for e in getattr(cls, '_schema', []) if e[0] == key_path[-1]), None)
+    if len(key_path) != 2 or entry is None or entry[1] is not FixedField:
+        return value
+    try:
+        return yaml.safe_load(value)
+    except yaml.YAMLError:
+        return value
+
+
 def dict_set(d, keys, item):
     if len(keys) > 1:
         key, rest = keys[0], keys[1:]
@@ -79,13 +310,19 @@ def dict_set(d, keys, item):
 
 
 def main():
+    if sys.argv[1:2] == ['regress']:
+        # subcommand with its own options
+        sys.exit(frugy.regress.main(sys.argv[2:]))
+
     parser = argparse.ArgumentParser(
-        description='FRU Generator YAML'
+        description='FRU Generator YAML',
+        epilog='frugy regress [-h] [-j JOBS] path [...]: check YAML / .bin files against reference images'
     )
     parser.add_argument('srcfile',
                         type=str,
-                        nargs='?',
-                        help='Source file for reading'
+                        nargs='*',
+                        help='Source file for reading (read mode: several FRU images or .fra archives are '
+                        'written as one stream of YAML documents)'
                         )
     parser.add_argument('--version',
                         action='version',
@@ -107,10 +344,24 @@ def main():
                         action='store_true',
                         help='dump FRU information to stdout (same as -r -o -)'
                         )
+    parser.add_argument('--jsonl',
+                        action='store_true',
+                        help='write JSON Lines instead of YAML (only valid in read mode)'
+                        )
     parser.add_argument('-e', '--eeprom-size',
                         type=int,
                         help='pad FRU image to match EEPROM size in bytes (only valid in write mode)'
                         )
+    parser.add_argument('--page-size',
+                        type=int,
+                        help='start each area on an EEPROM page boundary (multiple of 8 bytes, only valid in write mode)'
+                        )
+    parser.add_argument('--slack',
+                        type=int,
+                        default=0,
+                        help='reserve bytes behind each area, so it can grow without moving the following areas '
+                             '(only valid in write mode)'
+                        )
     parser.add_argument('-s', '--set',
                         type=str,
                         action='append',
@@ -120,6 +371,11 @@ def main():
                         action='store_true',
                         help='set BoardInfo.mfg_date_time timestamp to current UTC time (only valid in write mode)'
                         )
+    parser.add_argument('-j', '--jobs',
+                        type=int,
+                        help='number of processes building the images of a multi-document YAML file '
+                             '(default: one per CPU for large files, only valid in write mode)'
+                        )
     parser.add_argument('-b', '--broken',
                         action='store_true',
                         help='enable workaround to parse Opal Kelly EEPROMs'
@@ -135,6 +391,37 @@ def main():
                         nargs='?',
                         help='list supported FRU records or schema of specified record'
                         )
+    parser.add_argument('-O', '--optimize',
+                        action='store_true',
+                        help='minimize image size by compact string encodings and dropping empty areas (only valid in write mode)'
+                        )
+    parser.add_argument('--budget',
+                        action='store_true',
+                        help='print size budget per area and record to stderr (only valid in write mode)'
+                        )
+    parser.add_argument('--json-schema',
+                        action='store_true',
+                        help='print JSON Schema of the YAML format (to output file, if given)'
+                        )
+    parser.add_argument('--no-validate',
+                        action='store_true',
+                        help='skip validation of the YAML source before building the FRU image'
+                        )
+    parser.add_argument('--verify',
+                        action='store_true',
+                        help='parse the generated FRU image again and compare it to the source, field by field'
+                        )
+    parser.add_argument('--profile',
+                        choices=['table', 'json'],
+                        const='table',
+                        nargs='?',
+                        help='print timing of parser / serializer phases per record type to stderr'
+                        )
+    parser.add_argument('--metrics',
+                        type=str,
+                        metavar='FILE',
+                        help='write parser / serializer metrics in Prometheus text format to FILE on exit'
+                        )
     parser.add_argument('-v', '--verbosity',
                         type=int,
                         help='set verbosity (0=quiet, 1=info, 2=debug)'
@@ -147,6 +434,13 @@ def main():
         level=[logging.WARNING, logging.INFO, logging.DEBUG][verbosity]
     )
 
+    if args.profile is not None:
+        frugy.profiling.enable()
+        atexit.register(print_profile, args.profile)
+
+    if args.metrics is not None:
+        atexit.register(metrics.write_textfile, args.metrics)
+
     if args.list is not None:
         if args.list == '':
             list_supported_records()
@@ -154,7 +448,11 @@ def main():
             list_record_schema(args.list)
         sys.exit(0)
 
-    if args.srcfile is None:
+    if args.json_schema:
+        writer(args.output or '-', json.dumps(json_schema(), indent=2) + '\n')
+        sys.exit(0)
+
+    if not args.srcfile:
         parser.print_help(sys.stderr)
         sys.exit(1)
 
@@ -163,10 +461,24 @@ def main():
         parser.print_help(sys.stderr)
         sys.exit(1)
 
-    if read_mode and (args.eeprom_size is not None or args.set or args.timestamp):
+    if not read_mode and (args.jsonl or len(args.srcfile) > 1):
         parser.print_help(sys.stderr)
         sys.exit(1)
 
+    if read_mode and (args.eeprom_size is not None or args.set or args.timestamp or
+                      args.optimize or args.budget or
+                      args.page_size is not None or args.slack or args.jobs is not None):
+        parser.print_help(sys.stderr)
+        sys.exit(1)
+
+    if args.page_size is not None and (args.page_size <= 0 or args.page_size % 8 != 0):
+        print(f'Error: page size ({args.page_size}) is not a multiple of 8 bytes', file=sys.stderr)
+        sys.exit(1)
+
+    if args.slack < 0:
+        print(f'Error: slack ({args.slack}) is negative', file=sys.stderr)
+        sys.exit(1)
+
     if read_mode and args.broken:
         MultirecordEntry.opalkelly_workaround_enabled = True
 
@@ -180,65 +492,65 @@ def main():
             sys.exit(1)
         outfile = '-'
 
-    basename, ext = os.path.splitext(os.path.basename(args.srcfile))
-
-    if read_mode and ext != '.bin':
-        print('Cowardly refusing to read a FRU file not ending with .bin',
-              file=sys.stderr)
-        sys.exit(1)
-    if not read_mode and ext != '.yml' and ext != '.yaml':
-        print('Cowardly refusing to read a YAML file not ending with .yaml or .yml', file=sys.stderr)
-        sys.exit(1)
+    for src in args.srcfile:
+        _, ext = os.path.splitext(src)
+        if read_mode and ext != '.bin' and ext != '.fra':
+            print('Cowardly refusing to read a FRU file not ending with .bin or .fra',
+                  file=sys.stderr)
+            sys.exit(1)
+        if not read_mode and ext != '.yml' and ext != '.yaml':
+            print('Cowardly refusing to read a YAML file not ending with .yaml or .yml', file=sys.stderr)
+            sys.exit(1)
 
-    if not outfile:
-        basename, _ = os.path.splitext(os.path.basename(args.srcfile))
-        outfile = basename + ('.yml' if read_mode else '.bin')
+    srcfile = args.srcfile[0]
+    stream_mode = read_mode and (len(args.srcfile) > 1 or srcfile.endswith('.fra'))
+    if stream_mode:
+        if stream_frus(args.srcfile, outfile or '-', args.jsonl):
+            sys.exit(1)
+        return
 
-    fru = Fru()
+    basename, _ = os.path.splitext(os.path.basename(srcfile))
 
-    if read_mode:
+    if not read_mode:
+        with open(srcfile, 'r') as infile:
+            # one pass over all documents of the stream
+            docs = list(yaml.load_all(infile, Loader=yaml_loader))
+        named_docs = named_documents(docs, basename)
+        if named_docs is not None:
+            if outfile == '-' or (outfile and os.path.exists(outfile) and not os.path.isdir(outfile)):
+                print('Error: several FRU images need an output directory', file=sys.stderr)
+                sys.exit(1)
+            if build_images(named_docs, outfile or '.', args):
+                sys.exit(1)
+            return
+        fru_dict = docs[0] if docs else None
         try:
-            fru.load_bin(args.srcfile)
-            writer(outfile, fru.dump_yaml())
+            img, report = build_image(Fru(), fru_dict, args, srcfile)
         except RuntimeError as e:
-            print(f'Error while parsing or writing: {e}')
-            return False
-    else:
-        with open(args.srcfile, 'r') as infile:
-            fru_dict = yaml.safe_load(infile)
-
-        if args.set is not None:
-            for s in args.set:
-                k, v = s.split('=')
-                key_path = k.split('.')
-                if len(key_path) > 1:
-                    # Traverse hierarchy of selected key_path e.g. ['BoardInfo', 'serial_number']
-                    dict_set(fru_dict, key_path, v)
-                else:
-                    # Set property e.g 'serial_number' of all first level records (e.g. 'BoardInfo', 'ProductInfo')
-                    key = key_path[0]
-                    for k in fru_dict.keys():
-                        if key in fru_dict[k]:
-                            fru_dict[k][key] = v
-
-        if args.timestamp:
-            if 'BoardInfo' in fru_dict:
-                fru_dict['BoardInfo']['mfg_date_time'] = datetime.utcnow()
-            else:
-                print(
-                    'Error: FRU needs BoardInfo area to carry the timestamp', file=sys.stderr)
-                sys.exit(1)
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        if report:
+            print(report, file=sys.stderr)
+        writer(outfile or basename + '.bin', img, bin_mode=True)
+        return
 
-        fru.update(fru_dict)
-        img = fru.serialize()
-        if args.eeprom_size is not None:
-            if len(img) <= args.eeprom_size:
-                img += b'\xff' * (args.eeprom_size - len(img))
+    if not outfile:
+        outfile = basename + ('.jsonl' if args.jsonl else '.yml')
+
+    fru = Fru()
+    try:
+        fru.load_bin(srcfile)
+        if args.jsonl:
+            if outfile == '-':
+                fru.write_json(sys.stdout)
             else:
-                print(
-                    f'Error: Image size ({len(img)}) exceeds EEPROM size ({args.eeprom_size})', file=sys.stderr)
-                sys.exit(1)
-        writer(outfile, img, bin_mode=True)
+                with open(outfile, 'w') as f:
+                    fru.write_json(f)
+        else:
+            writer(outfile, fru.dump_yaml())
+    except RuntimeError as e:
+        print(f'Error while parsing or writing: {e}')
+        return False
 
 
 if __name__ == '__main__':
@@ -0,0 +1,188 @@
+###########################################################################
+#      ____  _____________  __    __  __ _           _____ ___   _        #
+#     / __ \/ ____/ ___/\ \/ /   |  \/  (_)__ _ _ __|_   _/ __| /_\  (R)  #
+#    / / / / __/  \__ \  \  /    | |\/| | / _| '_/ _ \| || (__ / _ \      #
+#   / /_/ / /___ ___/ /  / /     |_|  |_|_\__|_| \___/|_| \___/_/ \_\     #
+#  /_____/_____//____/  /_/      T  E  C  H  N  O  L  O  G  Y   L A B     #
+#                                                                         #
+#          Copyright 2021 Deutsches Elektronen-Synchrotron DESY.          #
+#                  SPDX-License-Identifier: BSD-3-Clause                  #
+#                                                                         #
+###########################################################################
+
+import bitstruct
+import re
+
+_unsigned_fmt = re.compile(r'^u(\d+)$')
+
+
+def schema_steps(cls):
+    ''' Split a record schema into (de)serialization steps '''
+    ''' Consecutive bitfield members are merged into one ('bits', [entries]) step,
+    all other fields become ('field', entry) steps. '''
+    steps = []
+    bit_entries = []
+    for entry in cls._schema:
+        if hasattr(entry[1], 'bit_fmt'):
+            bit_entries.append(entry)
+        else:
+            if bit_entries:
+                steps.append(('bits', bit_entries))
+                bit_entries = []
+            steps.append(('field', entry))
+    if bit_entries:
+        steps.append(('bits', bit_entries))
+    return steps
+
+
+def _has_div(entry):
+    return len(entry) > 3 and entry[3].get('div') is not None
+
+
+def _bit_runs(fmt_list, merge):
+    ''' Locate the bits of each field inside the packed bitfield '''
+    ''' The packed bitfield is read as one big-endian integer (little-endian for merged bitfields,
+    as they are stored byte-reversed). Returns per field a list of (position in packed integer,
+    position in field value, length) runs. The mapping is probed from bitstruct itself,
+    so the generated code matches its byte order handling exactly. '''
+    fmt = ''.join(fmt_list) + ('' if merge else '<')
+    widths = [int(_unsigned_fmt.match(f).group(1)) for f in fmt_list]
+    result = []
+    for n, width in enumerate(widths):
+        runs = []
+        for k in range(width):
+            values = [0] * len(widths)
+            values[n] = 1 << k
+            packed = bitstruct.pack(fmt, *values)
+            pos = int.from_bytes(packed, 'big').bit_length() - 1
+            if runs and runs[-1][0] + runs[-1][2] == pos and runs[-1][1] + runs[-1][2] == k:
+                runs[-1][2] += 1
+            else:
+                runs.append([pos, k, 1])
+        result.append(runs)
+    return widths, result
+
+
+def _extract_expr(runs):
+    terms = []
+    for pos, k, length in runs:
+        term = f'(x >> {pos}) & {hex((1 << length) - 1)}' if pos else f'x & {hex((1 << length) - 1)}'
+        terms.append(f'({term}) << {k}' if k else f'({term})')
+    return ' | '.join(terms)
+
+
+def _insert_expr(var, runs):
+    terms = []
+    for pos, k, length in runs:
+        term = f'({var} >> {k}) & {hex((1 << length) - 1)}' if k else f'{var} & {hex((1 << length) - 1)}'
+        terms.append(f'({term}) << {pos}' if pos else f'({term})')
+    return ' | '.join(terms)
+
+
+def codec_source(cls):
+    ''' Generate straight-line source code for _serialize / _serialize_into / _deserialize of a record class '''
+    ''' Returns source and the namespace it has to be executed in. '''
+    namespace = {'Error': bitstruct.Error}
+    merge = cls._mergeBitfield
+    byteorder = repr('little' if merge else 'big')
+    ser = [
+        'def _serialize(self):',
+        '    d = self._dict',
+    ]
+    # (expression, size in bytes or None for fields writing themselves)
+    ser_chunks = []
+    deser = [
+        'def _deserialize(self, input):',
+        '    d = self._dict',
+        '    remainder = input',
+    ]
+
+    # element counts have to be set before any bitfield is packed
+    for entry in cls._schema:
+        if hasattr(entry[1], 'pre_serialize'):
+            ser.append(f'    d[{entry[0]!r}].pre_serialize()')
+
+    for step in schema_steps(cls):
+        if step[0] == 'field':
+            name = repr(step[1][0])
+            ser_chunks.append((f'd[{name}]', None))
+            deser.append(f'    remainder = d[{name}].deserialize(remainder)')
+            continue
+
+        entries = step[1]
+        fmt_list = [e[2] for e in entries]
+        size = bitstruct.calcsize(''.join(fmt_list)) // 8
+        if not all(_unsigned_fmt.match(f) for f in fmt_list):
+            # not a plain unsigned bitfield, let bitstruct handle it
+            fmt_name = f'_fmt{len(namespace)}'
+            namespace[fmt_name] = bitstruct.compile(''.join(fmt_list) + ('' if merge else '<'))
+            values = ', '.join(f'd[{e[0]!r}].to_serialized()' for e in entries)
+            ser_chunks.append((f'{fmt_name}.pack({values})' + ('[::-1]' if merge else ''), size))
+            data = f'remainder[:{size}]' + ('[::-1]' if merge else '')
+            deser.append(f'    v = {fmt_name}.unpack({data})')
+            deser.append(f'    remainder = remainder[{size}:]')
+            for n, e in enumerate(entries):
+                deser.append(f'    d[{e[0]!r}].from_serialized(v[{n}])')
+            continue
+
+        widths, runs = _bit_runs(fmt_list, merge)
+        value_vars = [f'v{len(ser)}_{n}' for n in range(len(entries))]
+        for var, e, width in zip(value_vars, entries, widths):
+            if _has_div(e):
+                ser.append(f'    {var} = d[{e[0]!r}].to_serialized()')
+            else:
+                # same conversion as FixedField.to_serialized, called for anything but int
+                ser.append(f'    {var} = d[{e[0]!r}]._value')
+                ser.append(f'    if type({var}) is not int:')
+                ser.append(f'        {var} = d[{e[0]!r}].to_serialized()')
+            ser.append(f'    if not 0 <= {var} <= {hex((1 << width) - 1)}:')
+            ser.append(f'        raise Error(f"\\"{e[2]}\\" requires 0 <= integer <= {(1 << width) - 1} (got {{{var}}})")')
+        packed = ' | '.join(f'({_insert_expr(var, r)})' for var, r in zip(value_vars, runs))
+        ser_var = f'b{len(ser)}'
+        ser.append(f'    {ser_var} = ({packed}).to_bytes({size}, {byteorder})')
+        ser_chunks.append((ser_var, size))
+
+        deser.append(f'    if len(remainder) < {size}:')
+        deser.append(f'        raise Error("unpack requires at least {size * 8} bits")')
+        deser.append(f'    x = int.from_bytes(remainder[:{size}], {byteorder})')
+        deser.append(f'    remainder = remainder[{size}:]')
+        for e, r in zip(entries, runs):
+            if _has_div(e):
+                deser.append(f'    d[{e[0]!r}].from_serialized({_extract_expr(r)})')
+            else:
+                deser.append(f'    d[{e[0]!r}]._value = {_extract_expr(r)}')
+
+    ser_into = ['def _serialize_into(self, buf, offs):'] + ser[1:]
+    ser.append('    return b\'\'.join((' + ''.join(
+        f'{c}, ' if size is not None else f'{c}.serialize(), ' for c, size in ser_chunks) + '))')
+    for c, size in ser_chunks:
+        if size is None:
+            ser_into.append(f'    offs = {c}.serialize_into(buf, offs)')
+        else:
+            ser_into.append(f'    buf[offs:offs + {size}] = {c}')
+            ser_into.append(f'    offs += {size}')
+    ser_into.append('    return offs')
+    deser.append('    return remainder')
+    return '\n'.join(ser + [''] + ser_into + [''] + deser) + '\n', namespace
+
+
+def _serialize_into_hand_written(self, buf, offs):
+    ''' _serialize_into() of a class with a hand-written _serialize() '''
+    data = self._serialize()
+    buf[offs:offs + len(data)] = data
+    return offs + len(data)
+
+
+def compile_codec(cls):
+    ''' Install generated _serialize / _serialize_into / _deserialize methods on a record class '''
+    ''' Methods the class defines itself are kept; if that is _serialize, _serialize_into writes
+    its result. The generated source is kept in cls._codec_source for inspection. '''
+    source, namespace = codec_source(cls)
+    code = compile(source, f'<frugy codec {cls.__qualname__}>', 'exec')
+    exec(code, namespace)
+    if '_serialize' in cls.__dict__ and '_serialize_into' not in cls.__dict__:
+        cls._serialize_into = _serialize_into_hand_written
+    for name in ('_serialize', '_serialize_into', '_deserialize'):
+        if name not in cls.__dict__:
+            setattr(cls, name, namespace[name])
+    cls._codec_source = source
@@ -0,0 +1,163 @@
+###########################################################################
+#      ____  _____________  __    __  __ _           _____ ___   _        #
+#     / __ \/ ____/ ___/\ \/ /   |  \/  (_)__ _ _ __|_   _/ __| /_\  (R)  #
+#    / / / / __/  \__ \  \  /    | |\/| | / _| '_/ _ \| || (__ / _ \      #
+#   / /_/ / /___ ___/ /  / /     |_|  |_|_\__|_| \___/|_| \___/_/ \_\     #
+#  /_____/_____//____/  /_/      T  E  C  H  N  O  L  O  G  Y   L A B     #
+#                                                                         #
+#          Copyright 2021 Deutsches Elektronen-Synchrotron DESY.          #
+#                  SPDX-License-Identifier: BSD-3-Clause                  #
+#                                                                         #
+###########################################################################
+
+''' Columnar decoding of arrays of fixed-size records with NumPy
+
+Records consisting only of unsigned FixedFields (e.g. SlotEntry, AmcChannelDescriptor,
+AmcLinkDescriptor) have a constant size, so an array of them can be decoded at once:
+the raw bytes are viewed as a (count, record size) uint8 matrix with np.frombuffer,
+and each field is extracted with vectorized shifts and masks. div scaling and constant
+names are applied per column as well.
+
+NumPy is an optional dependency (pip3 install frugy[numpy]); it is imported on first use.
+'''
+
+import re
+
+from frugy.codegen import _bit_runs
+from frugy.types import FixedField
+
+_unsigned_fmt = re.compile(r'^u(\d+)$')
+
+# maximum number of bits extracted in one step, so partial bytes still fit into uint64
+_max_run_bits = 32
+
+# constants are mapped through lookup tables for fields up to this width
+_max_table_bits = 16
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError('columnar decoding requires NumPy (pip3 install frugy[numpy])')
+    return numpy
+
+
+def is_fixed_size(cls):
+    ''' True if cls is a record class made up of unsigned FixedFields only '''
+    schema = getattr(cls, '_schema', None)
+    if not schema:
+        return False
+    return all(e[1] is FixedField and _unsigned_fmt.match(e[2]) for e in schema)
+
+
+def record_size(cls):
+    ''' Size in bytes of one record of a fixed-size class '''
+    return sum(int(_unsigned_fmt.match(e[2]).group(1)) for e in cls._schema) // 8
+
+
+def _check_fixed_size(cls):
+    if not is_fixed_size(cls):
+        raise ValueError(f'{cls.__name__} is not a fixed-size record class')
+
+
+def _kwargs(entry):
+    return entry[3] if len(entry) > 3 else {}
+
+
+def _int_dtype(np, width):
+    for t in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if width <= np.iinfo(t).bits:
+            return np.dtype(t)
+    raise ValueError(f'unsupported field width: {width}')
+
+
+def columnar_dtype(cls):
+    ''' NumPy structured dtype holding one decoded record of a fixed-size class '''
+    ''' Plain fields become the smallest fitting unsigned integer type, fields with div
+    become float64 and fields with constants become objects (constant name, or the
+    raw integer for unknown values). '''
+    _check_fixed_size(cls)
+    np = _numpy()
+    fields = []
+    for e in cls._schema:
+        kwargs = _kwargs(e)
+        if kwargs.get('constants') is not None:
+            t = np.dtype(object)
+        elif kwargs.get('div') is not None:
+            t = np.dtype(np.float64)
+        else:
+            t = _int_dtype(np, int(_unsigned_fmt.match(e[2]).group(1)))
+        fields.append((e[0], t))
+    return np.dtype(fields)
+
+
+def _split_runs(runs):
+    for pos, k, length in runs:
+        while length > _max_run_bits:
+            yield pos, k, _max_run_bits
+            pos, k, length = pos + _max_run_bits, k + _max_run_bits, length - _max_run_bits
+        yield pos, k, length
+
+
+def _extract(np, raw, runs, size, merge):
+    ''' Extract one field from the (count, size) raw byte matrix '''
+    result = np.zeros(raw.shape[0], dtype=np.uint64)
+    for pos, k, length in _split_runs(runs):
+        lo, hi = pos // 8, (pos + length - 1) // 8
+        acc = np.zeros(raw.shape[0], dtype=np.uint64)
+        for j in range(lo, hi + 1):
+            # byte j of the packed integer, counted from the least significant end
+            col = j if merge else size - 1 - j
+            acc |= raw[:, col].astype(np.uint64) << np.uint64(8 * (j - lo))
+        acc >>= np.uint64(pos - 8 * lo)
+        acc &= np.uint64((1 << length) - 1)
+        result |= acc << np.uint64(k)
+    return result
+
+
+def _map_constants(np, values, width, constants):
+    inverse = {v: k for k, v in constants.items()}
+    if width <= _max_table_bits:
+        table = np.empty(1 << width, dtype=object)
+        table[:] = list(range(1 << width))
+        for v, name in inverse.items():
+            table[v] = name
+        return table[values]
+    result = np.empty(len(values), dtype=object)
+    result[:] = [inverse.get(v, v) for v in values.tolist()]
+    return result
+
+
+def _scale(np, values, div):
+    values = values.astype(np.float64)
+    # same arithmetic as FixedField.from_serialized, to get identical floats
+    if div < 1:
+        return values / (1 / div)
+    return values * div
+
+
+def decode_columns(cls, buf):
+    ''' Decode buf, holding back-to-back records of cls, into a structured array '''
+    ''' The length of buf must be a multiple of the record size. '''
+    _check_fixed_size(cls)
+    np = _numpy()
+    size = record_size(cls)
+    if len(buf) % size:
+        raise RuntimeError(
+            f'{cls.__name__}: {len(buf)} bytes is not a multiple of the record size ({size} bytes)')
+
+    raw = np.frombuffer(buf, dtype=np.uint8).reshape(-1, size)
+    merge = cls._mergeBitfield
+    widths, runs = _bit_runs([e[2] for e in cls._schema], merge)
+    result = np.empty(raw.shape[0], dtype=columnar_dtype(cls))
+    for e, width, r in zip(cls._schema, widths, runs):
+        kwargs = _kwargs(e)
+        values = _extract(np, raw, r, size, merge)
+        if kwargs.get('constants') is not None:
+            result[e[0]] = _map_constants(np, values, width, kwargs['constants'])
+        elif kwargs.get('div') is not None:
+            result[e[0]] = _scale(np, values, kwargs['div'])
+        else:
+            result[e[0]] = values
+    return result
@@ -0,0 +1,245 @@
+###########################################################################
+#      ____  _____________  __    __  __ _           _____ ___   _        #
+#     / __ \/ ____/ ___/\ \/ /   |  \/  (_)__ _ _ __|_   _/ __| /_\  (R)  #
+#    / / / / __/  \__ \  \  /    | |\/| | / _| '_/ _ \| || (__ / _ \      #
+#   / /_/ / /___ ___/ /  / /     |_|  |_|_\__|_| \___/|_| \___/_/ \_\     #
+#  /_____/_____//____/  /_/      T  E  C  H  N  O  L  O  G  Y   L A B     #
+#                                                                         #
+#          Copyright 2021 Deutsches Elektronen-Synchrotron DESY.          #
+#                  SPDX-License-Identifier: BSD-3-Clause                  #
+#                                                                         #
+###########################################################################
+
+''' Crate-level connectivity index across the FRUs of a carrier and its modules
+
+The carrier FRU describes the wiring (CarrierP2pConnectivity, CarrierClkP2pConnectivity,
+CarrierBusedConnectivity), the module FRUs describe what their ports and clocks carry
+(PointToPointConnectivity, ClockConfig). All of them are indexed by endpoint, so
+compatibility queries only look at the endpoints that are actually wired together.
+
+Sites are tuples (site type, number): ('amc', 1..12) for AMC slots, ('carrier', dev_id)
+for on-carrier devices and ('backplane', dev_id) for backplane clock resources.
+Endpoints are (site, port number) for ports and (site, clock ID) for clocks.
+'''
+
+from collections import defaultdict, namedtuple
+import os
+
+from frugy.fru import Fru
+
+# One AMC link descriptor, as seen from a single port
+PortLink = namedtuple('PortLink', ['channel_id', 'lane', 'link_type', 'link_type_ext',
+                                   'asymm_match', 'grouping_id'])
+
+# One direct clock descriptor of a clock endpoint
+ClockDesc = namedtuple('ClockDesc', ['role', 'family', 'accuracy', 'frequency', 'freq_min', 'freq_max'])
+
+_p2p_site_types = {'amc': 'amc', 'carrier': 'carrier'}
+_clk_site_types = {'amc_module': 'amc', 'on_carrier': 'carrier', 'backplane': 'backplane'}
+
+# AMC.0 Table 3-19: exact matches pair with exact matches, 01b with 10b
+_asymm_partner = {
+    'match_exact': 'match_exact',
+    'match_10b': 'match_01b',
+    'match_01b': 'match_10b',
+}
+
+
+def links_compatible(a: PortLink, b: PortLink):
+    ''' True if the link descriptors on both ends of a wire can form a link '''
+    return a.link_type == b.link_type and a.link_type_ext == b.link_type_ext and \
+        _asymm_partner.get(a.asymm_match) == b.asymm_match
+
+
+def _multirecords(fru):
+    if isinstance(fru, Fru):
+        fru = fru.to_dict()
+    return fru.get('MultirecordArea', [])
+
+
+def load_fru(fname):
+    ''' Load a FRU from a binary image or YAML file '''
+    fru = Fru()
+    if os.path.splitext(fname)[1] in ('.yml', '.yaml'):
+        fru.load_yaml(fname)
+    else:
+        fru.load_bin(fname)
+    return fru
+
+
+class CrateConnectivity:
+    ''' Connectivity graph of a MicroTCA crate (or several crates, if sites are kept unique) '''
+
+    def __init__(self):
+        # (site, port) -> [PortLink]
+        self.ports = defaultdict(list)
+        # (site, port) -> (site, port), both directions
+        self.wires = {}
+        # (site, clock ID) -> [ClockDesc]
+        self.clocks = defaultdict(list)
+        # (site, clock ID) -> (site, clock ID), both directions
+        self.clock_wires = {}
+        # list of buses, each a list of (site, port)
+        self.buses = []
+        self._bus_index = {}
+        # sites whose FRU has been added
+        self.sites = set()
+
+    # building the index
+
+    def add_carrier(self, fru):
+        ''' Add the carrier FRU (Fru, dict as returned by Fru.to_dict, or file name) '''
+        ''' On-carrier devices count as added sites if the carrier describes them
+        with a PointToPointConnectivity or ClockConfig record. '''
+        if isinstance(fru, str):
+            fru = load_fru(fru)
+        for rec in _multirecords(fru):
+            rec_type = rec['type']
+            if rec_type == 'CarrierP2pConnectivity':
+                self._add_carrier_p2p(rec)
+            elif rec_type == 'CarrierClkP2pConnectivity':
+                self._add_carrier_clk_p2p(rec)
+            elif rec_type == 'CarrierBusedConnectivity':
+                self._add_carrier_bused(rec)
+            elif rec_type == 'PointToPointConnectivity' and \
+                    rec.get('record_type') == 'on_carrier_device':
+                site = ('carrier', rec.get('connected_dev_id', 0))
+                self.sites.add(site)
+                self._add_p2p(site, rec)
+            elif rec_type == 'ClockConfig':
+                site = (_clk_site_types.get(rec.get('resource_type'), 'carrier'), rec.get('dev_id', 0))
+                self.sites.add(site)
+                self._add_clock_config(site, rec)
+
+    def add_module(self, site_no, fru, site_type='amc'):
+        ''' Add the FRU of a module plugged into site (site_type, site_no) '''
+        ''' Each site must only be added once. '''
+        if isinstance(fru, str):
+            fru = load_fru(fru)
+        site = (site_type, site_no)
+        self.sites.add(site)
+        for rec in _multirecords(fru):
+            if rec['type'] == 'PointToPointConnectivity':
+                self._add_p2p(site, rec)
+            elif rec['type'] == 'ClockConfig':
+                self._add_clock_config(site, rec)
+
+    def _add_p2p(self, site, rec):
+        channels = rec.get('channel_descriptors', [])
+        for link in rec.get('link_descriptors', []):
+            channel_id = link.get('channel_id', 0)
+            if channel_id >= len(channels):
+                continue
+            for lane, (port, flag) in enumerate(zip(channels[channel_id], link.get('lane_flags', []))):
+                if flag:
+                    self.ports[(site, port)].append(PortLink(
+                        channel_id, lane, link.get('link_type'), link.get('link_type_ext', 0),
+                        link.get('asymm_match'), link.get('grouping_id', 0)))
+
+    def _add_clock_config(self, site, rec):
+        for conf in rec.get('conf_desc', []):
+            endpoint = (site, conf.get('clk_id'))
+            for d in conf.get('direct_clk_desc', []):
+                self.clocks[endpoint].append(ClockDesc(
+                    d.get('asymm_match'), d.get('family', 'unspecified'), d.get('accuracy', 0),
+                    d.get('frequency', 0), d.get('freq_min', 0), d.get('freq_max', 0)))
+
+    def _add_carrier_p2p(self, rec):
+        for res in rec.get('resource_descriptors', []):
+            local_site = (_p2p_site_types[res.get('resource_type')], res.get('site_no', 0))
+            for p in res.get('port_descriptors', []):
+                local = (local_site, p.get('local_port', 0))
+                remote = ((_p2p_site_types[p.get('resource_type')], p.get('site_no', 0)),
+                          p.get('remote_port', 0))
+                self.wires[local] = remote
+                self.wires[remote] = local
+
+    def _add_carrier_clk_p2p(self, rec):
+        for res in rec.get('clk_p2p_resource_descriptors', []):
+            local_site = (_clk_site_types[res.get('resource_type')], res.get('dev_id', 0))
+            for c in res.get('p2p_clk_conn_descriptors', []):
+                local = (local_site, c.get('local_clock_id'))
+                remote = ((_clk_site_types[c.get('resource_type')], c.get('dev_id', 0)),
+                          c.get('remote_clock_id'))
+                self.clock_wires[local] = remote
+                self.clock_wires[remote] = local
+
+    def _add_carrier_bused(self, rec):
+        for conn in rec.get('bused_connection_descriptors', []):
+            bus = []
+            for d in conn.get('bused_device_descriptor', []):
+                site_type = 'amc' if d.get('resource_id') == 'AMC' else 'carrier'
+                endpoint = ((site_type, d.get('amc_site', 0)), d.get('port', 0))
+                self._bus_index[endpoint] = len(self.buses)
+                bus.append(endpoint)
+            self.buses.append(bus)
+
+    # queries
+
+    def remote(self, endpoint):
+        ''' Port wired to endpoint, or None '''
+        return self.wires.get(endpoint)
+
+    def compatible_links(self, endpoint):
+        ''' Pairs of compatible (local, remote) PortLinks across the wire at endpoint '''
+        remote = self.wires.get(endpoint)
+        if remote is None:
+            return []
+        return [(a, b) for a in self.ports.get(endpoint, ()) for b in self.ports.get(remote, ())
+                if links_compatible(a, b)]
+
+    def link_pairs(self):
+        ''' Yield (endpoint, remote, [(local PortLink, remote PortLink), ...]) for each described wire '''
+        for endpoint in self.ports:
+            remote = self.wires.get(endpoint)
+            # report each wire once, from its lower end (or the only described one)
+            if remote is None or (remote in self.ports and remote < endpoint):
+                continue
+            yield endpoint, remote, self.compatible_links(endpoint)
+
+    def unmatched_ports(self):
+        ''' List of (endpoint, reason) for module ports that can't form a link '''
+        ''' Ports of sites without a FRU (e.g. on-carrier devices without a P2P record)
+        are assumed to match anything. '''
+        result = []
+        for endpoint, links in self.ports.items():
+            remote = self.wires.get(endpoint)
+            if remote is None:
+                result.append((endpoint, 'not connected'))
+            elif remote[0] not in self.sites:
+                continue
+            elif remote not in self.ports:
+                result.append((endpoint, f'remote port {remote} not described'))
+            elif not self.compatible_links(endpoint):
+                result.append((endpoint, f'no compatible link type with {remote}'))
+        return result
+
+    def clock_pairs(self):
+        ''' Yield (source, receiver) for each wired clock with one source and one receiver end '''
+        for endpoint, remote in self.clock_wires.items():
+            roles = {d.role for d in self.clocks.get(endpoint, ())}
+            remote_roles = {d.role for d in self.clocks.get(remote, ())}
+            if 'clk_source' in roles and 'clk_receiver' in remote_roles:
+                yield endpoint, remote
+
+    def unmatched_clocks(self):
+        ''' List of (endpoint, reason) for module clocks that have no usable peer '''
+        result = []
+        for endpoint, descs in self.clocks.items():
+            remote = self.clock_wires.get(endpoint)
+            if remote is None:
+                result.append((endpoint, 'not connected'))
+                continue
+            if remote[0] not in self.sites or remote not in self.clocks:
+                continue
+            roles = {d.role for d in descs}
+            remote_roles = {d.role for d in self.clocks[remote]}
+            if not (('clk_source' in roles and 'clk_receiver' in remote_roles) or
+                    ('clk_receiver' in roles and 'clk_source' in remote_roles)):
+                result.append((endpoint, f'no source/receiver pair with {remote}'))
+        return result
+
+    def bus_members(self, endpoint):
+        ''' All endpoints on the bus endpoint is connected to (including itself) '''
+        idx = self._bus_index.get(endpoint)
+        return [] if idx is None else list(self.buses[idx])
@@ -13,13 +13,18 @@
 from frugy import __version__
 from frugy.areas import CommonHeader, ChassisInfo, BoardInfo, ProductInfo
 from frugy.multirecords import MultirecordArea
+from frugy.types import malformed_data_errors
+from frugy import metrics
 import frugy.multirecords_ipmi
 import frugy.multirecords_picmg
 import frugy.multirecords_fmc
 import yaml
 from bidict import bidict
 import os
-from copy import deepcopy
+import json
+import logging
+import time
+from datetime import datetime
 
 
 # YAML formatting helpers
@@ -36,12 +41,44 @@ def yaml_flowstyle_list_rep(dumper, data):
 yaml.add_representer(YamlFlowstyleList, yaml_flowstyle_list_rep)
 
 
+def yaml_flowstyle_tree(part):
+    ''' Set lists at edges of tree to YAML flow style '''
+    if type(part) is list:
+        if len(part) == 0:
+            return part, False
+        part, edge_flags = zip(*[yaml_flowstyle_tree(elem) for elem in part])
+        part = list(part)
+        if all(edge_flags):
+            part = YamlFlowstyleList(part)
+        return part, False
+    elif type(part) is dict:
+        part = {k: yaml_flowstyle_tree(part[k])[0] for k in part.keys()}
+        return part, False
+    elif type(part) is str:
+        # don't collapse strings in YAML, for better readability
+        return part, False
+    else:
+        # no dict list, or str ==> reached edge of tree
+        return part, True
+
+
+def json_default(obj):
+    ''' JSON representation of values not supported by the json module (timestamps) '''
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f'{obj.__class__.__name__} is not JSON serializable')
+
+
 def import_log(msg):
     if not hasattr(import_log, "str"):
         import_log.str = ''
     import_log.str += msg + '\n'
 
 
+# libyaml based loader, if PyYAML was built with it
+yaml_loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
 class Fru:
     _area_table_lookup = bidict({
         'ChassisInfo': 'chassis_info_offs',
@@ -50,6 +87,9 @@ class Fru:
         'MultirecordArea': 'multirecord_offs',
     })
 
+    # Size of the image parsed by deserialize (64 KiB, the biggest common FRU EEPROM)
+    max_image_size = 0x10000
+
     def __init__(self, initdict=None):
         self.header = CommonHeader()
         self.areas = {}
@@ -57,21 +97,41 @@ class Fru:
         if initdict is not None:
             self.update(initdict)
 
+    _area_classes = {
+        'ChassisInfo': ChassisInfo,
+        'BoardInfo': BoardInfo,
+        'ProductInfo': ProductInfo,
+        'MultirecordArea': MultirecordArea
+    }
+
     def factory(self, cls_name, cls_args=None):
-        map = {
-            'ChassisInfo': ChassisInfo,
-            'BoardInfo': BoardInfo,
-            'ProductInfo': ProductInfo,
-            'MultirecordArea': MultirecordArea
-        }
-        if cls_name not in map:
+        if cls_name not in self._area_classes:
             raise ValueError(f"unknown FRU area: {cls_name}")
-        # Some constructors modify their arguments; make sure to leave the user-supplied initdict intact
-        return map[cls_name](deepcopy(cls_args))
+        # constructors don't modify their arguments, so the user-supplied initdict is used as-is
+        return self._area_classes[cls_name](cls_args)
 
-    def update(self, src):
+    def update(self, src, in_place=False):
+        ''' Set areas from a dict, like the YAML source '''
+        ''' By default, all areas are created anew. With in_place, existing areas, records and
+        fields are reused and set to their new values (or defaults), so only added records
+        are allocated; for applying the same structure repeatedly with a few changed values.
+        Areas shared with other FRUs (see frugy.store) are replaced instead. '''
         self.comment = ''
-        self.areas = {k: self.factory(k, v) for k, v in src.items()}
+        if not in_place:
+            self.areas = {k: self.factory(k, v) for k, v in src.items()}
+            return
+        areas = {}
+        for k, v in src.items():
+            area = self.areas.get(k)
+            if area is None or getattr(area, '_frozen', False):
+                areas[k] = self.factory(k, v)
+                continue
+            if hasattr(area, 'reset'):
+                area.reset()
+            if v is not None:
+                area.update(v)
+            areas[k] = area
+        self.areas = areas
 
     def to_dict(self):
         return {k: v.to_dict() for k, v in self.areas.items()}
@@ -79,98 +139,298 @@ class Fru:
     def __repr__(self):
         return repr(self.to_dict())
 
-    def serialize(self):
-        self.header.reset()
+    def size_total(self, page_size=None, slack=0):
+        ''' Image size, for the layout given by page_size and slack (see serialize) '''
+        return self._placements(page_size, slack)[1]
 
-        # Determine offsets for areas
-        curr_offs = self.header.size_total()
-        for area, offs in self._area_table_lookup.items():
-            if area in self.areas:
-                self.header[offs] = curr_offs
-                curr_offs += self.areas[area].size_total()
+    def serialize(self, eeprom_size=None, page_size=None, slack=0):
+        ''' Serialize FRU image; with eeprom_size, pad it with 0xff to that size '''
+        ''' Raises a RuntimeError if the image doesn't fit into eeprom_size.
+        By default, areas are packed back to back. With page_size (a multiple of 8), each area
+        starts on an EEPROM page boundary, and slack bytes are reserved behind each area. An
+        area growing by at most its slack keeps its offset, so patch_bin() rewrites only its
+        pages instead of shifting all following areas. '''
+        start = time.perf_counter()
+        result = self._serialize_image(eeprom_size, page_size, slack)
+        metrics.images_serialized.inc()
+        metrics.bytes_serialized.inc(amount=len(result))
+        metrics.phase_seconds.observe(time.perf_counter() - start, ('serialize',))
+        return result
+
+    def serialize_into(self, buf, offset=0, page_size=None, slack=0):
+        ''' Write FRU image into the preallocated buffer buf at offset, return offset behind it '''
+        ''' buf has to hold size_total(page_size, slack) bytes from offset. Gaps between
+        areas (alignment and slack) are left as they are. '''
+        placements, size = self._layout(page_size, slack)
+        self._serialize_areas_into(buf, offset, placements)
+        return offset + size
 
-        # Serialize everything
-        result = self.header.serialize()
+    def _placements(self, page_size=None, slack=0):
+        ''' Return [(area name, offset, size)] and image size '''
+        if page_size is not None and (page_size <= 0 or page_size % 8 != 0):
+            raise ValueError(f'page size {page_size} is not a multiple of 8 bytes')
+        if slack < 0:
+            raise ValueError(f'slack {slack} is negative')
+        # the common header stores offsets in multiples of 8 bytes
+        align = page_size or 8
+        result = []
+        curr_offs = self.header.size_total()
         for area in self._area_table_lookup.keys():
             if area in self.areas:
-                result += self.areas[area].serialize()
+                curr_offs += -curr_offs % align
+                if curr_offs > 255 * 8:
+                    raise RuntimeError(f'{area}: area offset ({curr_offs}) exceeds 2040 bytes')
+                size = self.areas[area].size_total()
+                result.append((area, curr_offs, size))
+                curr_offs += size + slack
+        return result, curr_offs
 
-        return result
+    def _layout(self, page_size=None, slack=0):
+        ''' Determine offsets for areas, return placements and image size '''
+        placements, size = self._placements(page_size, slack)
+        self.header.reset()
+        for area, offs, _ in placements:
+            self.header[self._area_table_lookup[area]] = offs
+        return placements, size
 
-    def deserialize(self, input):
+    def _serialize_areas_into(self, buf, offset, placements):
+        self.header.serialize_into(buf, offset)
+        for area, offs, size in placements:
+            end = self.areas[area].serialize_into(buf, offset + offs)
+            if end != offset + offs + size:
+                raise RuntimeError(f'{area}: serialized size ({end - offset - offs}) differs from its layout ({size})')
+
+    def _serialize_image(self, eeprom_size=None, page_size=None, slack=0):
+        placements, size = self._layout(page_size, slack)
+        if eeprom_size is not None and size > eeprom_size:
+            raise RuntimeError(f'Image size ({size}) exceeds EEPROM size ({eeprom_size})')
+        # everything behind the areas keeps its 0xff padding
+        buf = bytearray(b'\xff') * max(size, eeprom_size or 0)
+        self._serialize_areas_into(buf, 0, placements)
+        return bytes(buf)
+
+    def deserialize(self, input, store=None):
+        ''' Parse FRU image; if a frugy.store.RecordStore is given, identical records are shared '''
+        ''' Malformed images raise a RuntimeError. Only the first max_image_size bytes are parsed,
+        which limits the work done; the rest of e.g. a dump of a larger EEPROM is ignored. '''
+        start = time.perf_counter()
+        try:
+            self._deserialize_image(input, store)
+        except RuntimeError:
+            metrics.parse_errors.inc()
+            raise
+        metrics.images_parsed.inc()
+        metrics.bytes_parsed.inc(amount=len(input))
+        metrics.phase_seconds.observe(time.perf_counter() - start, ('parse',))
+
+    def _deserialize_image(self, input, store):
         import_log.str = ''
         self.areas = {}
-        self.header.deserialize(input)
-        for k, v in self.header.to_dict().items():
-            # Ignore "internal use area"
-            # TODO: Support it as opaque byte array?
-            if v and k != 'internal_use_offs':
-                obj_name = self._area_table_lookup.inverse[k]
-                obj = self.factory(obj_name)
-                obj.deserialize(input[v:])
-                self.areas[obj_name] = obj
+        # parse from a memoryview, so the remainders handed from field to field aren't copied
+        input = memoryview(input)
+        if len(input) > self.max_image_size:
+            logging.info(f'Ignoring {len(input) - self.max_image_size} bytes of the {len(input)} byte image '
+                         f'beyond {self.max_image_size} bytes')
+            input = input[:self.max_image_size]
+        obj_name = 'CommonHeader'
+        try:
+            self.header.deserialize(input)
+            for k, v in self.header.to_dict().items():
+                # Ignore "internal use area"
+                # TODO: Support it as opaque byte array?
+                if v and k != 'internal_use_offs':
+                    obj_name = self._area_table_lookup.inverse[k]
+                    if obj_name == 'MultirecordArea':
+                        obj = self.factory(obj_name)
+                        obj.deserialize(input[v:], store=store)
+                    elif store is not None:
+                        # key by the raw area, as given by its length field
+                        area_raw = bytes(input[v:v + input[v + 1] * 8])
+                        obj = store.intern((obj_name, area_raw),
+                                           lambda: self._deserialize_area(obj_name, input[v:]))
+                    else:
+                        obj = self._deserialize_area(obj_name, input[v:])
+                    self.areas[obj_name] = obj
+        except malformed_data_errors as e:
+            raise RuntimeError(f'{obj_name}: malformed data ({e.__class__.__name__}: {e})') from e
+
+    def _deserialize_area(self, obj_name, input):
+        if obj_name not in self._area_classes:
+            raise ValueError(f"unknown FRU area: {obj_name}")
+        cls = self._area_classes[obj_name]
+        # info areas are filled by the parser, no need to initialize their fields with defaults
+        obj = cls._new_blank() if hasattr(cls, '_new_blank') else cls()
+        obj.deserialize(input)
+        return obj
+
+    def verify_roundtrip(self, image=None):
+        ''' Parse image (default: the serialized FRU) and compare it field by field to this FRU '''
+        ''' Returns a list of differences like "BoardInfo.serial_number: expected 'x', got 'y'";
+        empty if the image decodes to the same content. Values with a div only have to match
+        within the resolution of their encoding. '''
+        if image is None:
+            image = self.serialize()
+        parsed = Fru()
+        try:
+            parsed.deserialize(image)
+        except RuntimeError as e:
+            return [f'image does not parse: {e}']
+        result = []
+        for name, area in self.areas.items():
+            if name not in parsed.areas:
+                result.append(f'{name}: missing in image')
+            else:
+                result += area.diff(parsed.areas[name], name)
+        for name in parsed.areas.keys() - self.areas.keys():
+            result.append(f'{name}: unexpected in image')
+        return result
+
+    @classmethod
+    def patch_bin(cls, image, updates):
+        ''' Patch field values in an existing FRU image and return the new image '''
+        ''' updates maps field paths to values, e.g. {'BoardInfo.serial_number': '1234'}.
+        Only the affected areas are parsed. Fields keeping their serialized length are
+        overwritten in place and the area checksum is adjusted by the byte delta. An area
+        changing its length is rewritten in place if it fits up to the next area (e.g. into
+        the slack of serialize(page_size=..., slack=...)); otherwise the whole image is
+        re-serialized (and padded to its old size). Re-serializing would drop an internal use
+        area, so images with one raise a RuntimeError instead. '''
+        area_updates = {}
+        for path, value in updates.items():
+            area_name, _, key = path.partition('.')
+            if area_name not in cls._area_table_lookup or area_name == 'MultirecordArea' or not key:
+                raise ValueError(f'cannot patch field {path}')
+            area_updates.setdefault(area_name, {})[key] = value
+
+        fru = cls()
+        fru.header.deserialize(image)
+        result = bytearray(image)
+        for area_name, fields in area_updates.items():
+            offs = fru.header[cls._area_table_lookup[area_name]]
+            if offs == 0:
+                raise ValueError(f'{area_name} not present in image')
+            area = fru.factory(area_name)
+            area.deserialize(image[offs:])
+            old_chunks = [chunk for _, chunk in area._serialize_chunks()]
+            for k, v in fields.items():
+                area[k] = v
+            new_chunks = [chunk for _, chunk in area._serialize_chunks()]
+
+            # area length is still the one parsed from the image
+            old_len = area._get_area_length()
+            if any(len(old) != len(new) for old, new in zip(old_chunks, new_chunks)):
+                new_area = area.serialize()
+                if offs + len(new_area) > cls._area_end(fru.header, offs, len(image)):
+                    if fru.header['internal_use_offs']:
+                        raise RuntimeError(f'{area_name}: no room to grow without dropping the internal use area')
+                    return cls._patch_bin_full(image, area_updates)
+                result[offs:offs + old_len] = b'\xff' * old_len
+                result[offs:offs + len(new_area)] = new_area
+                continue
+
+            cksum_offs = offs + old_len - 1
+            curr_offs = offs + len(area._prologue())
+            for old, new in zip(old_chunks, new_chunks):
+                if old != new:
+                    result[curr_offs:curr_offs+len(new)] = new
+                    delta = sum(new) - sum(old)
+                    result[cksum_offs] = (result[cksum_offs] - delta) & 0xff
+                curr_offs += len(new)
+
+        return bytes(result)
+
+    @classmethod
+    def _area_end(cls, header, offs, image_size):
+        ''' End of the space available to the area at offs: start of the next area or end of image '''
+        # the internal use area isn't parsed, but its space isn't available either
+        keys = ['internal_use_offs'] + list(cls._area_table_lookup.values())
+        following = [header[k] for k in keys if header[k] > offs]
+        return min(following, default=image_size)
+
+    @classmethod
+    def _patch_bin_full(cls, image, area_updates):
+        fru = cls()
+        fru.deserialize(image)
+        for area_name, fields in area_updates.items():
+            for k, v in fields.items():
+                fru.areas[area_name][k] = v
+        return fru.serialize(max(len(image), fru.size_total()))
 
     def load_yaml(self, fname):
+        start = time.perf_counter()
         with open(fname, 'r') as infile:
-            fru_dict = yaml.safe_load(infile)
+            fru_dict = yaml.load(infile, Loader=yaml_loader)
         self.update(fru_dict)
+        metrics.phase_seconds.observe(time.perf_counter() - start, ('yaml.load',))
 
     def dump_yaml_raw(self):
-        def fmt_tree(part):
-            ''' Set lists at edges of tree to YAML flow style '''
-            if type(part) is list:
-                if len(part) == 0:
-                    return part, False
-                part, edge_flags = zip(*[fmt_tree(elem) for elem in part])
-                part = list(part)
-                if all(edge_flags):
-                    part = YamlFlowstyleList(part)
-                return part, False
-            elif type(part) is dict:
-                part = {k: fmt_tree(part[k])[0] for k in part.keys()}
-                return part, False
-            elif type(part) is str:
-                # don't collapse strings in YAML, for better readability
-                return part, False
-            else:
-                # no dict list, or str ==> reached edge of tree
-                return part, True
-
-        yaml_dict = self.to_dict()
-        yaml_dict, _ = fmt_tree(yaml_dict)
+        yaml_dict, _ = yaml_flowstyle_tree(self.to_dict())
         return yaml.dump(yaml_dict, sort_keys=False)
 
-    def postprocess_yaml(self, data):
-        result = ''
+    def _yaml_raw_lines(self):
+        ''' Lines of dump_yaml_raw(), generated one area at a time '''
+        if not self.areas:
+            yield from self.dump_yaml_raw().splitlines()
+        for k, v in self.areas.items():
+            area_dict, _ = yaml_flowstyle_tree({k: v.to_dict()})
+            yield from yaml.dump(area_dict, sort_keys=False).splitlines()
+
+    def _yaml_lines(self, raw_lines):
         if hasattr(import_log, 'str'):
-            if len(import_log.str) != 0:
-                import_log.str = '\n' + import_log.str
-            for line in [self.comment, *import_log.str.splitlines()]:
-                result += f'# {line}\n'
+            log = import_log.str
+            if len(log) != 0:
+                log = '\n' + log
+            for line in [self.comment, *log.splitlines()]:
+                yield f'# {line}\n'
         line_prev = ''
-        for line in data.splitlines():
+        for line in raw_lines:
             if line.endswith(':') and not line.startswith(' '):
                 # add LF before entries on root level
-                result += '\n'
+                yield '\n'
             if line.startswith('- type:') and line_prev != 'MultirecordArea:':
                 # add LF between multirecord entries
-                result += '\n'
-            result += line + '\n'
+                yield '\n'
+            yield line + '\n'
             line_prev = line
-        return result
+
+    def postprocess_yaml(self, data):
+        return ''.join(self._yaml_lines(data.splitlines()))
 
     def dump_yaml(self):
-        yaml_raw = self.dump_yaml_raw()
-        return self.postprocess_yaml(yaml_raw)
+        start = time.perf_counter()
+        result = ''.join(self._yaml_lines(self._yaml_raw_lines()))
+        metrics.phase_seconds.observe(time.perf_counter() - start, ('yaml.dump',))
+        return result
+
+    def write_yaml(self, stream):
+        ''' Write YAML document to a text stream, one area at a time '''
+        start = time.perf_counter()
+        stream.writelines(self._yaml_lines(self._yaml_raw_lines()))
+        metrics.phase_seconds.observe(time.perf_counter() - start, ('yaml.dump',))
+
+    def write_json(self, stream, source=None):
+        ''' Write FRU as one line of JSON to a text stream (for JSON Lines output) '''
+        ''' If source is given, the line is {"source": source, "fru": {...}}. '''
+        data = self.to_dict()
+        if source is not None:
+            data = {'source': source, 'fru': data}
+        stream.write(json.dumps(data, default=json_default) + '\n')
 
     def save_yaml(self, fname):
         with open(fname, 'w') as outfile:
-            outfile.write(self.dump_yaml())
+            self.write_yaml(outfile)
 
-    def load_bin(self, fname):
+    def load_bin(self, fname, store=None):
         self.comment = f'created with frugy {__version__} from "{os.path.basename(fname)}"'
         with open(fname, 'rb') as infile:
-            self.deserialize(infile.read())
+            self.deserialize(infile.read(), store=store)
+
+    def load_archive_entry(self, archive, idx, store=None):
+        ''' Load FRU image idx from an opened frugy.archive.FruArchive '''
+        entry = archive.entries[idx]
+        self.comment = f'created with frugy {__version__} from "{os.path.basename(archive.fname)}" ' \
+            f'entry {idx} ({entry.board_id})'
+        self.deserialize(archive.image(idx), store=store)
 
     def save_bin(self, fname):
         with open(fname, 'wb') as outfile:
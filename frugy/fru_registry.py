@@ -13,6 +13,7 @@
 from enum import Enum, auto
 from collections import defaultdict
 from itertools import chain
+import logging
 
 
 class FruRecordType(Enum):
@@ -22,6 +23,7 @@ class FruRecordType(Enum):
     picmg_secondary = auto()
     fmc_multirecord = auto()
     fmc_secondary = auto()
+    oem_multirecord = auto()
 
 
 _registry = defaultdict(list)
@@ -29,17 +31,140 @@ _registry = defaultdict(list)
 _lookup_by_id = defaultdict(dict)
 _lookup_by_name = {}
 
+# Flat multirecord dispatch index: (IPMI type ID, manufacturer ID, record ID) -> class.
+# Manufacturer and record ID are None for records not in the OEM range.
+_lookup_multirecord = {}
+# (IPMI type ID, manufacturer ID) of all registered OEM records
+_multirecord_manufacturers = set()
+
+# Entry point group of third-party multirecord modules. The entry point name lists the IDs
+# handled by the module, as Python integer literals: 'type_id:manufacturer_id' for all
+# records of a manufacturer, 'type_id:manufacturer_id:record_id' for a single record.
+# The module is only imported when such a record is parsed (or all records are enumerated).
+plugin_group = 'frugy.multirecords'
+
+# (IPMI type ID, manufacturer ID, record ID) -> entry points not loaded yet, None until discovered
+_plugins = None
+_plugin_manufacturers = set()
+
+# Incremented whenever records are registered or removed, to invalidate caches derived from them
+_generation = 0
+
 
 def rec_register(cls, rec_type: FruRecordType, rec_id=None):
     ''' Register FRU record type in central registry and lookup table '''
+    global _generation
     _registry[rec_type].append(cls)
     _lookup_by_name[cls.__name__] = cls
     if rec_id is not None:
         _lookup_by_id[rec_type][rec_id] = cls
-
-
-def rec_enumerate(rec_type_filter=None):
+    _generation += 1
+
+
+def rec_unregister(cls):
+    ''' Remove FRU record type from registry and lookup tables, e.g. a record defined by a test '''
+    global _generation
+    for classes in _registry.values():
+        if cls in classes:
+            classes.remove(cls)
+    if _lookup_by_name.get(cls.__name__) is cls:
+        del _lookup_by_name[cls.__name__]
+    for by_id in _lookup_by_id.values():
+        for rec_id in [k for k, v in by_id.items() if v is cls]:
+            del by_id[rec_id]
+    for key in [k for k, v in _lookup_multirecord.items() if v is cls]:
+        del _lookup_multirecord[key]
+    _multirecord_manufacturers.clear()
+    _multirecord_manufacturers.update(k[:2] for k in _lookup_multirecord if k[1] is not None)
+    _generation += 1
+
+
+def rec_generation():
+    ''' Number changing whenever the set of registered records changes '''
+    return _generation
+
+
+def rec_register_multirecord(cls, type_id: int, manufacturer_id=None, record_id=None):
+    ''' Add multirecord class to the dispatch index used for parsing '''
+    _lookup_multirecord[(type_id, manufacturer_id, record_id)] = cls
+    if manufacturer_id is not None:
+        _multirecord_manufacturers.add((type_id, manufacturer_id))
+
+
+def rec_lookup_multirecord(type_id: int, manufacturer_id=None, record_id=None):
+    ''' Lookup multirecord class by its complete ID, return None if unknown '''
+    ''' On a miss, plugins declaring the ID are loaded and the lookup is repeated. '''
+    key = (type_id, manufacturer_id, record_id)
+    cls = _lookup_multirecord.get(key)
+    if cls is None and _load_plugins([key, (type_id, manufacturer_id, None)]):
+        cls = _lookup_multirecord.get(key)
+    return cls
+
+
+def rec_known_manufacturer(type_id: int, manufacturer_id: int):
+    ''' Check if any OEM multirecord is registered or declared by a plugin for type_id and manufacturer_id '''
+    key = (type_id, manufacturer_id)
+    return key in _multirecord_manufacturers or key in _plugin_manufacturers
+
+
+def _entry_points(group):
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        # Python < 3.8
+        import pkg_resources
+        return list(pkg_resources.iter_entry_points(group))
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        return list(eps.select(group=group))
+    return list(eps.get(group, []))
+
+
+def _plugin_key(name):
+    ids = [int(x, 0) for x in name.split(':')]
+    if not 2 <= len(ids) <= 3:
+        raise ValueError(f'expected type_id:manufacturer_id[:record_id], got {name}')
+    return tuple(ids + [None] * (3 - len(ids)))
+
+
+def _discover_plugins():
+    ''' Collect the entry points of plugin_group once, without importing them '''
+    global _plugins
+    if _plugins is None:
+        _plugins = defaultdict(list)
+        for ep in _entry_points(plugin_group):
+            try:
+                key = _plugin_key(ep.name)
+            except ValueError as e:
+                logging.warning(f'Ignoring multirecord plugin {ep.name}: {e}')
+                continue
+            _plugins[key].append(ep)
+            _plugin_manufacturers.add(key[:2])
+    return _plugins
+
+
+def _load_plugins(keys=None):
+    ''' Import the plugins declared for keys (default: all), return True if any was loaded '''
+    plugins = _discover_plugins()
+    if keys is None:
+        keys = list(plugins.keys())
+    loaded = False
+    for key in keys:
+        for ep in plugins.pop(key, []):
+            try:
+                ep.load()
+            except Exception as e:
+                logging.warning(f'Failed to load multirecord plugin {ep.name}: {e}')
+                continue
+            loaded = True
+    return loaded
+
+
+def rec_enumerate(rec_type_filter=None, load_plugins=True):
     ''' Enumerate registered FRU records, filter if rec_type_filter given '''
+    ''' All plugins are loaded first, unless load_plugins is False. '''
+    if load_plugins:
+        _load_plugins()
     if rec_type_filter is None:
         rec_type_filter = list(FruRecordType)
     elif type(rec_type_filter) is not list:
@@ -57,6 +182,9 @@ def rec_lookup_by_id(rec_type: FruRecordType, rec_id: int):
 
 def rec_lookup_by_name(rec_name: str):
     ''' Lookup record class by name '''
+    if rec_name not in _lookup_by_name:
+        # record names don't tell which plugin defines them
+        _load_plugins()
     return _lookup_by_name[rec_name]
 
 
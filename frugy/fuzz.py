@@ -0,0 +1,149 @@
+###########################################################################
+#      ____  _____________  __    __  __ _           _____ ___   _        #
+#     / __ \/ ____/ ___/\ \/ /   |  \/  (_)__ _ _ __|_   _/ __| /_\  (R)  #
+#    / / / / __/  \__ \  \  /    | |\/| | / _| '_/ _ \| || (__ / _ \      #
+#   / /_/ / /___ ___/ /  / /     |_|  |_|_\__|_| \___/|_| \___/_/ \_\     #
+#  /_____/_____//____/  /_/      T  E  C  H  N  O  L  O  G  Y   L A B     #
+#                                                                         #
+#          Copyright 2021 Deutsches Elektronen-Synchrotron DESY.          #
+#                  SPDX-License-Identifier: BSD-3-Clause                  #
+#                                                                         #
+###########################################################################
+
+''' Robustness harness for the FRU parser
+
+Feeds randomly mutated copies of a corpus of FRU images to Fru.deserialize and records
+the outcome and parse time of every input. A parser rejecting an input is expected to
+raise a RuntimeError; any other exception is reported as a crash.
+
+Run as: python -m frugy.fuzz [-n ITERATIONS] [-s SEED] corpus.bin [...]
+'''
+
+from collections import namedtuple
+import argparse
+import logging
+import random
+import sys
+import time
+
+from frugy.fru import Fru
+from frugy.types import FruAreaChecksummed
+
+FuzzResult = namedtuple('FuzzResult', ['source', 'iteration', 'outcome', 'error', 'size', 'parse_time'])
+
+
+def _flip(data, rng):
+    pos = rng.randrange(len(data))
+    data[pos] ^= 1 << rng.randrange(8)
+
+
+def _overwrite(data, rng):
+    for _ in range(rng.randint(1, 8)):
+        data[rng.randrange(len(data))] = rng.randrange(256)
+
+
+def _truncate(data, rng):
+    del data[rng.randrange(len(data)):]
+
+
+def _insert(data, rng):
+    pos = rng.randrange(len(data) + 1)
+    data[pos:pos] = bytes(rng.randrange(256) for _ in range(rng.randint(1, 16)))
+
+
+def _delete(data, rng):
+    pos = rng.randrange(len(data))
+    del data[pos:pos + rng.randint(1, 16)]
+
+
+def _splice(data, rng):
+    ''' Duplicate a chunk of the image to another position '''
+    start = rng.randrange(len(data))
+    chunk = data[start:start + rng.randint(1, 64)]
+    pos = rng.randrange(len(data) + 1)
+    data[pos:pos] = chunk
+
+
+_mutators = [_flip, _overwrite, _truncate, _insert, _delete, _splice]
+
+
+def mutate(image, rng):
+    ''' Return a mutated copy of image, applying 1..4 random mutations '''
+    data = bytearray(image)
+    for _ in range(rng.randint(1, 4)):
+        if not data:
+            break
+        rng.choice(_mutators)(data, rng)
+    return bytes(data)
+
+
+def parse_one(image):
+    ''' Deserialize image, return (outcome, error, parse time) '''
+    ''' outcome is 'ok', 'error' (rejected by a RuntimeError) or 'crash' (any other exception) '''
+    start = time.perf_counter()
+    try:
+        Fru().deserialize(image)
+        outcome, error = 'ok', None
+    except RuntimeError as e:
+        outcome, error = 'error', e
+    except Exception as e:
+        outcome, error = 'crash', e
+    return outcome, error, time.perf_counter() - start
+
+
+def fuzz(corpus, iterations=100, seed=0):
+    ''' Yield a FuzzResult for each of iterations mutations of every (name, image) in corpus '''
+    ''' Checksum errors are ignored while fuzzing, so mutations reach the field parsers. '''
+    rng = random.Random(seed)
+    saved_ignore = FruAreaChecksummed.ignore_checksum_errors
+    FruAreaChecksummed.ignore_checksum_errors = True
+    try:
+        for source, image in corpus:
+            for n in range(iterations):
+                data = mutate(image, rng)
+                outcome, error, parse_time = parse_one(data)
+                yield FuzzResult(source, n, outcome, error, len(data), parse_time)
+    finally:
+        FruAreaChecksummed.ignore_checksum_errors = saved_ignore
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fuzz the FRU parser with mutated images')
+    parser.add_argument('corpus', nargs='+', help='FRU binary files to mutate')
+    parser.add_argument('-n', '--iterations', type=int, default=100,
+                        help='mutations per corpus file (default: 100)')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='random seed (default: 0)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print every crash')
+    args = parser.parse_args()
+
+    corpus = []
+    for fname in args.corpus:
+        with open(fname, 'rb') as f:
+            corpus.append((fname, f.read()))
+
+    # the parser warns about every broken record, which would drown the report
+    logging.disable(logging.WARNING)
+    counts = {'ok': 0, 'error': 0, 'crash': 0}
+    slowest = None
+    total_bytes, total_time = 0, 0.0
+    for res in fuzz(corpus, args.iterations, args.seed):
+        counts[res.outcome] += 1
+        total_bytes += res.size
+        total_time += res.parse_time
+        if slowest is None or res.parse_time > slowest.parse_time:
+            slowest = res
+        if res.outcome == 'crash' and args.verbose:
+            print(f'{res.source} #{res.iteration}: {res.error.__class__.__name__}: {res.error}')
+
+    total = sum(counts.values())
+    print(f'{total} inputs: {counts["ok"]} ok, {counts["error"]} rejected, {counts["crash"]} crashed')
+    if total:
+        print(f'parse time: {total_time / total * 1e6:.1f} us/input avg, '
+              f'{total_bytes / total_time / 1e6:.2f} MB/s')
+        print(f'slowest: {slowest.source} #{slowest.iteration} '
+              f'({slowest.size} bytes, {slowest.parse_time * 1e6:.1f} us)')
+    return 1 if counts['crash'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
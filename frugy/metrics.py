@@ -0,0 +1,210 @@
+###########################################################################
+#      ____  _____________  __    __  __ _           _____ ___   _        #
+#     / __ \/ ____/ ___/\ \/ /   |  \/  (_)__ _ _ __|_   _/ __| /_\  (R)  #
+#    / / / / __/  \__ \  \  /    | |\/| | / _| '_/ _ \| || (__ / _ \      #
+#   / /_/ / /___ ___/ /  / /     |_|  |_|_\__|_| \___/|_| \___/_/ \_\     #
+#  /_____/_____//____/  /_/      T  E  C  H  N  O  L  O  G  Y   L A B     #
+#                                                                         #
+#          Copyright 2021 Deutsches Elektronen-Synchrotron DESY.          #
+#                  SPDX-License-Identifier: BSD-3-Clause                  #
+#                                                                         #
+###########################################################################
+
+''' Prometheus-style metrics of the parser and serializer
+
+Counters and histograms are always collected. Updating them is a dict increment keyed by
+a tuple of label values, so the hot paths don't format any strings; the text exposition
+is only produced on request:
+
+    snapshot()              {metric name: {label values: value}} for use from Python
+    to_prometheus()         Prometheus text exposition format
+    write_textfile(path)    atomically (re)write a file, e.g. for the node_exporter textfile collector
+    serve(port)             HTTP endpoint /metrics in a background thread, on localhost by default
+
+Updates aren't locked; with several threads parsing concurrently, increments may get lost.
+'''
+
+from bisect import bisect_left
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import os
+import tempfile
+import threading
+
+_metrics = {}
+
+
+def _format_labels(labelnames, labels, extra=''):
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    ''' Monotonically increasing count '''
+
+    _type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = defaultdict(int)
+        _metrics[name] = self
+
+    def inc(self, labels=(), amount=1):
+        ''' Increment count of the tuple of label values by amount '''
+        self._values[labels] += amount
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def reset(self):
+        self._values.clear()
+
+    def snapshot(self):
+        return dict(self._values)
+
+    def _samples(self):
+        if not self.labelnames and not self._values:
+            yield self.name, (), '', 0
+        for labels, value in sorted(self._values.items()):
+            yield self.name, labels, '', value
+
+
+class Histogram:
+    ''' Distribution of observed values, counted in cumulative buckets '''
+
+    _type = 'histogram'
+
+    # latency in seconds, from 10 us (a small record) to 1 s
+    default_buckets = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 0.1, 1.0)
+
+    def __init__(self, name, help, labelnames=(), buckets=default_buckets):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket (last one: +Inf), sum]
+        self._values = {}
+        _metrics[name] = self
+
+    def observe(self, value, labels=()):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def value(self, labels=()):
+        ''' return (number of observations, sum of observed values) '''
+        entry = self._values.get(labels)
+        return (sum(entry[0]), entry[1]) if entry is not None else (0, 0.0)
+
+    def reset(self):
+        self._values.clear()
+
+    def snapshot(self):
+        return {labels: self.value(labels) for labels in self._values}
+
+    def _samples(self):
+        for labels, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', labels, f'le="{_format_value(bound)}"', cumulative
+            yield f'{self.name}_sum', labels, '', total
+            yield f'{self.name}_count', labels, '', cumulative
+
+
+# Metrics updated by frugy
+
+images_parsed = Counter('frugy_images_parsed_total', 'FRU images parsed')
+images_serialized = Counter('frugy_images_serialized_total', 'FRU images serialized')
+parse_errors = Counter('frugy_parse_errors_total', 'FRU images rejected by the parser')
+bytes_parsed = Counter('frugy_bytes_parsed_total', 'Bytes of FRU images parsed')
+bytes_serialized = Counter('frugy_bytes_serialized_total', 'Bytes of FRU images serialized')
+checksum_errors = Counter('frugy_checksum_errors_total', 'Checksum or padding mismatches, also if ignored',
+                          ['area'])
+unknown_multirecords = Counter('frugy_unknown_multirecords_total',
+                               'Multirecords without a record class (private: of an unknown manufacturer)',
+                               ['kind'])
+opalkelly_workaround = Counter('frugy_opalkelly_workaround_total', 'Records handled by the Opal Kelly workaround',
+                               ['kind'])
+phase_seconds = Histogram('frugy_phase_seconds', 'Latency of parser / serializer phases', ['phase'])
+
+
+def metric(name):
+    ''' Lookup metric by name '''
+    return _metrics[name]
+
+
+def reset():
+    ''' Clear all metrics '''
+    for m in _metrics.values():
+        m.reset()
+
+
+def snapshot():
+    ''' Current values as {metric name: {tuple of label values: value}} '''
+    ''' Histogram values are (number of observations, sum of observed values). '''
+    return {name: m.snapshot() for name, m in _metrics.items()}
+
+
+def to_prometheus():
+    ''' All metrics in the Prometheus text exposition format '''
+    lines = []
+    for m in _metrics.values():
+        lines.append(f'# HELP {m.name} {m.help}')
+        lines.append(f'# TYPE {m.name} {m._type}')
+        for name, labels, extra, value in m._samples():
+            lines.append(f'{name}{_format_labels(m.labelnames, labels, extra)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_textfile(path):
+    ''' Write metrics to path, replacing it atomically so scrapers never see a partial file '''
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.frugy-metrics')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(to_prometheus())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = to_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, addr='127.0.0.1'):
+    ''' Serve metrics at http://addr:port/metrics from a daemon thread, return the HTTPServer '''
+    ''' Only local clients can connect by default; pass addr='' to expose the endpoint on all
+    interfaces, or the address of one of them. Call shutdown() on the returned server to stop it. '''
+    server = HTTPServer((addr, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -10,14 +10,24 @@
 #                                                                         #
 ###########################################################################
 
-from frugy.types import FruAreaBase, FixedField, FixedStringField, GuidField, ArrayField, BytearrayField, IpV4Field, bin2hex_helper
+from frugy.types import FruAreaBase, FixedField, FixedStringField, GuidField, ArrayField, BytearrayField, IpV4Field, bin2hex_helper, malformed_data_errors, \
+    diff_lists, write_into, reuse_record
 import bitstruct
-from frugy.fru_registry import FruRecordType, rec_register, rec_lookup_by_id, rec_lookup_by_name
+from frugy.fru_registry import FruRecordType, rec_register, rec_lookup_by_name, rec_register_multirecord, \
+    rec_lookup_multirecord, rec_known_manufacturer
 from frugy.areas import ipmi_area
+from frugy import metrics
+from contextlib import contextmanager
 import logging
+import threading
 import frugy.fru
 
 
+# IPMI FRU spec, section 18: record types 0xc0..0xff are OEM records. Their payload
+# starts with the 3 byte manufacturer ID (LSB first), followed by a record ID byte.
+_oem_type_min = 0xc0
+
+
 @ipmi_area
 class MultirecordArea:
     ''' Platform Management FRU Information Storage Definition, Table 16-1 '''
@@ -25,17 +35,29 @@ class MultirecordArea:
 
     def __init__(self, initdict=None):
         self.records = []
+        # records dropped by reset(), to be reused by update()
+        self._spare = []
         if initdict is not None:
             self.update(initdict)
 
+    def reset(self):
+        # keep records for reuse by update()
+        self._spare, self.records = self.records or self._spare, []
+
     def update(self, initdict):
+        ''' Set records from list of dicts; existing records of the same type are reused '''
+        old = self.records or self._spare
         self.records = []
-        for v in initdict:
+        self._spare = []
+        for n, v in enumerate(initdict):
             try:
                 constructor = rec_lookup_by_name(v['type'])
             except KeyError:
                 raise RuntimeError(f"Unknown multirecord entry {v['type']}")
-            self.records.append(constructor(v))
+            if n < len(old) and old[n].__class__ is constructor:
+                self.records.append(reuse_record(old[n], v))
+            else:
+                self.records.append(constructor(v))
 
     def __repr__(self):
         return self.to_dict().__repr__()
@@ -44,18 +66,22 @@ class MultirecordArea:
         return [v.to_dict() for v in self.records]
 
     def serialize(self):
-        result = b''
+        buf = bytearray(self.size_total())
+        self.serialize_into(buf, 0)
+        return bytes(buf)
+
+    def serialize_into(self, buf, offset):
+        last = len(self.records) - 1
         for i, v in enumerate(self.records):
-            v.end_of_list = 1 if i == len(self.records)-1 else 0
-            result += v.serialize()
-        return result
+            offset = v.serialize_into(buf, offset, end_of_list=i == last)
+        return offset
 
-    def deserialize(self, input):
+    def deserialize(self, input, store=None):
         self.records = []
         remainder = input
         while len(remainder):
             new_entry, remainder, end_of_list = MultirecordEntry.deserialize(
-                remainder)
+                remainder, store=store)
             if new_entry is not None:
                 self.records.append(new_entry)
             if end_of_list:
@@ -66,19 +92,37 @@ class MultirecordArea:
     def size_total(self):
         return sum([v.size_total() for v in self.records])
 
+    def diff(self, other, path):
+        return diff_lists(path, self.records, other.records)
+
 
 class MultirecordEntry(FruAreaBase):
     _format_version = 2
     _multirecord_header_fmt = 'u8u1u3u4u8u8'
+    # header including its checksum
+    _multirecord_header_codec = bitstruct.compile(_multirecord_header_fmt + 'u8')
+    _multirecord_header_len = bitstruct.calcsize(_multirecord_header_fmt + 'u8') // 8
 
     opalkelly_workaround_enabled = False
+    _opalkelly_lock = threading.RLock()
 
-    def __init__(self, initdict=None):
-        self.end_of_list = 0
-        if initdict is not None:
-            # for MultirecordEntry, type is used for type identification, not for the fields
-            initdict.pop('type', None)
-        super().__init__(initdict=initdict)
+    @classmethod
+    @contextmanager
+    def opalkelly_workaround(cls, enabled=True):
+        ''' Enable or disable the Opal Kelly workaround within the block, restore it afterwards '''
+        ''' The switch is global to the process; blocks in concurrent threads are executed one
+        after the other, so a parser doesn't see the setting of another thread. '''
+        with cls._opalkelly_lock:
+            prev = cls.opalkelly_workaround_enabled
+            cls.opalkelly_workaround_enabled = enabled
+            try:
+                yield
+            finally:
+                cls.opalkelly_workaround_enabled = prev
+
+    def update(self, src):
+        # for MultirecordEntry, type is used for type identification, not for the fields
+        super().update({k: v for k, v in src.items() if k != 'type'})
 
     def size_payload(self):
         # Add header size
@@ -94,64 +138,127 @@ class MultirecordEntry(FruAreaBase):
         result.update(super().to_dict())
         return result
 
-    def serialize(self):
-        payload = self._payload_prologue() + super().serialize()
-        payload_cksum = (-sum(payload)) & 0xff
-        header = bitstruct.pack(self._multirecord_header_fmt,
-                                self._type_id,
-                                self.end_of_list,
-                                0,
-                                self._format_version,
-                                len(payload),
-                                payload_cksum)
-        header_cksum = (-sum(header)) & 0xff
-        header += header_cksum.to_bytes(length=1, byteorder='little')
-        return header + payload
+    def serialize(self, end_of_list=False):
+        buf = bytearray(self.size_total())
+        self.serialize_into(buf, 0, end_of_list)
+        return bytes(buf)
+
+    def serialize_into(self, buf, offset, end_of_list=False):
+        ''' Write record with header into buf at offset, return end offset '''
+        ''' The end of list flag is a property of the position in the area, not of the record,
+        which may be shared between several areas (see frugy.store). '''
+        payload_offs = offset + self._multirecord_header_len
+        end = write_into(buf, payload_offs, self._payload_prologue())
+        end = self._serialize_into(buf, end)
+        payload_cksum = (-sum(memoryview(buf)[payload_offs:end])) & 0xff
+        header = self._multirecord_header_codec.pack(self._type_id,
+                                                     1 if end_of_list else 0,
+                                                     0,
+                                                     self._format_version,
+                                                     end - payload_offs,
+                                                     payload_cksum,
+                                                     0)
+        write_into(buf, offset, header)
+        buf[offset + self._multirecord_header_len - 1] = (-sum(header)) & 0xff
+        return end
 
     @classmethod
-    def deserialize(cls, input):
-        header_fmt_complt = MultirecordEntry._multirecord_header_fmt + 'u8'
-        header_len = bitstruct.calcsize(header_fmt_complt) // 8
-        type_id, end_of_list, _, format_version, \
-            payload_len, payload_cksum, _ = bitstruct.unpack(
-                header_fmt_complt, input)
+    def from_payload(cls, payload):
+        ''' Create record from its payload (for OEM records, without manufacturer and record ID) '''
+        entry = cls._new_blank()
+        entry._deserialize(payload)
+        return entry
+
+    @classmethod
+    def _lookup(cls, type_id, payload):
+        ''' Return (record class, payload for from_payload), or (None, manufacturer ID) for private records '''
+        if type_id < _oem_type_min:
+            rec_cls = rec_lookup_multirecord(type_id)
+            if rec_cls is None:
+                metrics.unknown_multirecords.inc(('unknown',))
+                raise RuntimeError(f"Unknown multirecord type 0x{type_id:02x}")
+            return rec_cls, payload
+
+        manufacturer_id = int.from_bytes(payload[:3], 'little')
+        record_id = payload[3] if len(payload) > 3 else None
+        rec_cls = rec_lookup_multirecord(type_id, manufacturer_id, record_id)
+        if rec_cls is not None:
+            return rec_cls, payload[4:]
+
+        if cls.opalkelly_workaround_enabled and len(payload):
+            # Opal Kelly FMC records seem to skip the manufacturer ID and have the record ID as last byte
+            rec_cls = rec_lookup_multirecord(type_id, None, payload[-1])
+            if rec_cls is not None:
+                metrics.opalkelly_workaround.inc(('record_id',))
+                return rec_cls, payload[:-1]
+
+        if not rec_known_manufacturer(type_id, manufacturer_id):
+            metrics.unknown_multirecords.inc(('private',))
+            return None, manufacturer_id
+        metrics.unknown_multirecords.inc(('unknown',))
+        raise RuntimeError(f"Unknown OEM multirecord 0x{record_id:02x} of manufacturer 0x{manufacturer_id:06x}"
+                           if record_id is not None else "Truncated OEM multirecord")
+
+    @classmethod
+    def deserialize(cls, input, store=None):
+        header_len = cls._multirecord_header_len
+        if len(input) < header_len:
+            logging.warning(f"Truncated multirecord header: {bin2hex_helper(input)}")
+            frugy.fru.import_log('Truncated multirecord header')
+            return None, b'', 1
         header, remainder = input[:header_len], input[header_len:]
+        type_id, end_of_list, _, format_version, \
+            payload_len, payload_cksum, _ = cls._multirecord_header_codec.unpack(header)
         payload, remainder = remainder[:payload_len], remainder[payload_len:]
 
-        logging.debug(
-            f"{cls.__name__}: Trying to deserialize multirecord type_id=0x{type_id:02x}, len={len(header)+len(payload)}")
-        logging.debug(
-            f"{cls.__name__}: header: {bin2hex_helper(header)}, payload: {bin2hex_helper(payload)}")
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(
+                f"{cls.__name__}: Trying to deserialize multirecord type_id=0x{type_id:02x}, len={len(header)+len(payload)}")
+            logging.debug(
+                f"{cls.__name__}: header: {bin2hex_helper(header)}, payload: {bin2hex_helper(payload)}")
 
         try:
             if sum(header) & 0xff != 0:
                 end_of_list = 1
+                metrics.checksum_errors.inc(('MultirecordEntry',))
                 raise RuntimeError("MultirecordEntry header checksum invalid")
 
             if cls.opalkelly_workaround_enabled and len(payload) == 0:
                 # Opal Kelly seems to mark the end of list with an empty payload multirecord
                 end_of_list = 1
+                metrics.opalkelly_workaround.inc(('end_of_list',))
                 return None, remainder, end_of_list
 
             if (sum(payload) + payload_cksum) & 0xff != 0:
                 end_of_list = 1
+                metrics.checksum_errors.inc(('MultirecordEntry',))
                 raise RuntimeError("MultirecordEntry payload checksum invalid")
 
-            try:
-                cls_id = rec_lookup_by_id(
-                    FruRecordType.ipmi_multirecord, type_id)
-            except KeyError:
-                raise RuntimeError(f"Unknown multirecord type 0x{type_id:02x}")
+            rec_cls, rec_payload = cls._lookup(type_id, payload)
+            if rec_cls is None:
+                # OEM record of a manufacturer we don't know about: don't issue a warning, just ignore it
+                logging.debug(f"Silently ignoring private / proprietary multirecord 0x{type_id:02x} "
+                              f"of manufacturer 0x{rec_payload:06x}")
+                frugy.fru.import_log(
+                    f'Ignored private / proprietary multirecord (manufacturer 0x{rec_payload:06x})')
+                return None, remainder, end_of_list
 
-            if hasattr(cls_id, 'from_payload'):
-                new_entry = cls_id.from_payload(payload)
-            else:
-                new_entry = cls_id()
-                new_entry._deserialize(payload)
+            def parse_payload():
+                entry = rec_cls.from_payload(rec_payload)
+                entry._type_id = type_id
+                entry._format_version = format_version
+                return entry
 
-            new_entry._type_id = type_id
-            new_entry._format_version = format_version
-            new_entry.end_of_list = end_of_list
+            try:
+                if store is not None:
+                    new_entry = store.intern(
+                        (type_id, format_version, cls.opalkelly_workaround_enabled, bytes(payload)), parse_payload)
+                else:
+                    new_entry = parse_payload()
+            except (RuntimeError, EOFError):
+                raise
+            except malformed_data_errors as e:
+                raise RuntimeError(f"malformed payload ({e.__class__.__name__}: {e})") from e
 
         except RuntimeError as e:
             logging.warning(f"Failed to deserialize multirecord, type_id=0x{type_id:02x}, end_of_list={end_of_list}, "
@@ -163,15 +270,6 @@ class MultirecordEntry(FruAreaBase):
                 f'Failed to deserialize multirecord 0x{type_id:02x} ({e})')
             new_entry = None
 
-        except ValueError as e:
-            # Vendor ID mismatch: Don't issue a warning, just ignore it
-            logging.debug(f"{e}")
-            logging.debug(
-                f"Silently ignoring private / proprietary multirecord")
-            frugy.fru.import_log(
-                f'Ignored private / proprietary multirecord ({e})')
-            new_entry = None
-
         except EOFError as e:
             # Empty payload: Issue warning, but try to proceed
             logging.warning(f"{e}")
@@ -184,5 +282,26 @@ def ipmi_multirecord(rec_id):
     def register_and_set_id(cls):
         cls._type_id = rec_id
         rec_register(cls, FruRecordType.ipmi_multirecord, rec_id)
+        if rec_id < _oem_type_min:
+            rec_register_multirecord(cls, rec_id)
+        return cls
+    return register_and_set_id
+
+
+class OemEntry(MultirecordEntry):
+    ''' Superclass of OEM multirecords of further manufacturers, e.g. defined by plugins '''
+
+    def _payload_prologue(self):
+        return self._manufacturer_id.to_bytes(3, 'little') + self._record_id.to_bytes(length=1, byteorder='little')
+
+
+def oem_multirecord(type_id, manufacturer_id, rec_id):
+    ''' Register OEM multirecord (type_id 0xc0..0xff) by manufacturer and record ID '''
+    def register_and_set_id(cls):
+        cls._type_id = type_id
+        cls._manufacturer_id = manufacturer_id
+        cls._record_id = rec_id
+        rec_register(cls, FruRecordType.oem_multirecord)
+        rec_register_multirecord(cls, type_id, manufacturer_id, rec_id)
         return cls
     return register_and_set_id
@@ -12,7 +12,7 @@
 
 from frugy.types import FixedField, BytearrayField, ser_6bit, deser_6bit
 from frugy.multirecords import ipmi_multirecord, MultirecordEntry
-from frugy.fru_registry import FruRecordType, rec_register, rec_lookup_by_id
+from frugy.fru_registry import FruRecordType, rec_register, rec_register_multirecord
 
 import bitstruct
 from bidict import bidict
@@ -28,31 +28,6 @@ class FmcEntry(MultirecordEntry):
     def _payload_prologue(self):
         return self._fmc_identifier.to_bytes(3, 'little') + self._record_id.to_bytes(length=1, byteorder='little')
 
-    @classmethod
-    def from_payload(cls, payload):
-        if not MultirecordEntry.opalkelly_workaround_enabled:
-            # Opal Kelly FMC records seem to skip the manufacturer ID ...
-            fmc_id, payload = payload[:3], payload[3:]
-            rec_id, payload = payload[0], payload[1:]
-            fmc_id = int.from_bytes(fmc_id, 'little')
-
-            if fmc_id != cls._fmc_identifier:
-                raise ValueError(
-                    f"FMC identifier mismatch: expected 0x{cls._fmc_identifier:06x}, received 0x{fmc_id:06x} ({fmc_id})")
-        else:
-            # Opal Kelly FMC records seem to have the rec_id as _last_ instead of first byte
-            rec_id, payload = payload[-1], payload[:-1]
-
-        try:
-            cls_inst = rec_lookup_by_id(
-                FruRecordType.fmc_multirecord, rec_id)()
-        except KeyError:
-            raise RuntimeError(f"Unknown FMC entry 0x{rec_id:02x}")
-
-        cls_inst._deserialize(payload)
-        cls_inst._record_id = rec_id
-        return cls_inst
-
 
 # FMC multirecords
 
@@ -60,6 +35,9 @@ def fmc_multirecord(rec_id):
     def register_and_set_id(cls):
         cls._record_id = rec_id
         rec_register(cls, FruRecordType.fmc_multirecord, rec_id)
+        rec_register_multirecord(cls, FmcEntry._type_id, FmcEntry._fmc_identifier, rec_id)
+        # Opal Kelly FMC records skip the manufacturer ID and have the record ID as last byte
+        rec_register_multirecord(cls, FmcEntry._type_id, None, rec_id)
         return cls
     return register_and_set_id
 
@@ -139,6 +117,14 @@ class FmcPlusMainDefinition(FmcEntry):
         ('tck_max_clock', FixedField, 'u8')
     ]
 
+    _json_schema_extra = {
+        'properties': {
+            'p2_b_num_signals': {'type': 'integer', 'minimum': 0, 'maximum': 0x3f},
+            'p1_gbt_num_trcv': {'type': 'integer', 'minimum': 0, 'maximum': 0x3f},
+        },
+        'required': ['p2_b_num_signals', 'p1_gbt_num_trcv'],
+    }
+
     # Convert FMC+ bit-twiddled fields to / from plain values
 
     def to_dict(self):
@@ -172,9 +158,7 @@ class FmcPlusMainDefinition(FmcEntry):
             'u2u2u4',
             int.to_bytes(val['p1_gbt_num_trcv'], 1, byteorder='little')
         )
-        del val['p2_b_num_signals']
-        del val['p1_gbt_num_trcv']
-        super().update(val)
+        super().update({k: v for k, v in val.items() if k not in ('p2_b_num_signals', 'p1_gbt_num_trcv')})
 
 
 @fmc_multirecord(0x10)
@@ -204,6 +188,23 @@ class FmcI2cDeviceDefinition(FmcEntry):
         b'/': 0b1111,
     })
 
+    _json_schema_extra = {
+        'properties': {'devices': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    # 6-bit ASCII, without the characters encoding addresses
+                    'name': {'type': 'string', 'pattern': '^[0-9A-Za-z_ ]*$'},
+                    'addresses': {'type': 'array', 'items': {'enum': list(_addr_encoding_lookup.values())}},
+                },
+                'required': ['name', 'addresses'],
+                'additionalProperties': False,
+            },
+        }},
+        'required': ['devices'],
+    }
+
     def encode_addr(self, addr_num):
         if addr_num in self._addr_encoding_lookup.values():
             return self._addr_encoding_lookup.inverse[addr_num]
@@ -253,5 +254,4 @@ class FmcI2cDeviceDefinition(FmcEntry):
             encoded += device['name'].encode('utf-8')
 
         self._dict['_device_string']._value = ser_6bit(encoded.decode('utf-8'))
-        del val['devices']
-        super().update(val)
+        super().update({k: v for k, v in val.items() if k != 'devices'})
@@ -13,7 +13,7 @@
 
 from frugy.types import FruAreaBase, FixedField, FixedStringField, GuidField, ArrayField, BytearrayField, IpV4Field, bin2hex_helper, _grouper
 from frugy.multirecords import ipmi_multirecord, MultirecordEntry
-from frugy.fru_registry import FruRecordType, rec_register, rec_lookup_by_id
+from frugy.fru_registry import FruRecordType, rec_register, rec_register_multirecord
 
 import re
 import logging
@@ -36,30 +36,17 @@ class PicmgEntry(MultirecordEntry):
 
     @classmethod
     def from_payload(cls, payload):
-        picmg_id, payload = payload[:3], payload[3:]
-        rec_id, rec_fmt_version, payload = payload[0], payload[1], payload[2:]
-        picmg_id = int.from_bytes(picmg_id, 'little')
-
-        if picmg_id != cls._picmg_identifier:
-            raise ValueError(
-                f"PICMG identifier mismatch: expected 0x{cls._picmg_identifier:06x}, received 0x{picmg_id:06x} ({picmg_id})")
-
+        # manufacturer and record ID are already consumed by the multirecord dispatch
+        rec_fmt_version, payload = payload[0], payload[1:]
         if rec_fmt_version not in [0x00, 0x01]:
             raise RuntimeError(
                 f"Unexpected record format version: 0x{rec_fmt_version:02x}")
 
-        try:
-            cls_inst = rec_lookup_by_id(
-                FruRecordType.picmg_multirecord, rec_id)()
-        except KeyError:
-            raise RuntimeError(f"Unknown PICMG entry 0x{rec_id:02x}")
-
         if len(payload) == 0:
             raise EOFError(
-                f"Skipping creation of {cls_inst.__class__.__name__} due to empty payload")
+                f"Skipping creation of {cls.__name__} due to empty payload")
 
-        cls_inst._deserialize(payload)
-        return cls_inst
+        return super().from_payload(payload)
 
 
 # PICMG AMC.0 multirecords
@@ -68,6 +55,7 @@ def picmg_multirecord(rec_id):
     def register_and_set_id(cls):
         cls._record_id = rec_id
         rec_register(cls, FruRecordType.picmg_multirecord, rec_id)
+        rec_register_multirecord(cls, PicmgEntry._type_id, PicmgEntry._picmg_identifier, rec_id)
         return cls
     return register_and_set_id
 
@@ -104,6 +92,13 @@ class AmcChannelDescriptor(FruAreaBase):
     ]
     _mergeBitfield = True
 
+    # represented as list of the used lanes' port numbers
+    _json_schema = {
+        'type': 'array',
+        'items': {'type': 'integer', 'minimum': 0, 'maximum': _lane_unused},
+        'maxItems': len(_lanes),
+    }
+
     def to_dict(self):
         return [self[l] for l in AmcChannelDescriptor._lanes if self[l] != AmcChannelDescriptor._lane_unused]
 
@@ -152,6 +147,16 @@ class AmcLinkDescriptor(FruAreaBase):
     ]
     _mergeBitfield = True
 
+    _json_schema_extra = {
+        'properties': {'lane_flags': {
+            'type': 'array',
+            'items': {'type': 'integer', 'minimum': 0, 'maximum': 1},
+            'minItems': len(_lane_flag_names),
+            'maxItems': len(_lane_flag_names),
+        }},
+        'required': ['lane_flags'],
+    }
+
     def to_dict(self):
         result = super().to_dict()
         result['lane_flags'] = [self[f] for f in self._lane_flag_names]
@@ -160,8 +165,7 @@ class AmcLinkDescriptor(FruAreaBase):
     def update(self, val):
         for n, f in enumerate(self._lane_flag_names):
             self[f] = val['lane_flags'][n]
-        del val['lane_flags']
-        super().update(val)
+        super().update({k: v for k, v in val.items() if k != 'lane_flags'})
 
 
 @picmg_multirecord(0x19)
@@ -294,6 +298,11 @@ class Zone3InterfaceCompatibility(PicmgEntry):
         ('identifier_body', BytearrayField, None, {'hex': True}),
     ]
 
+    _json_schema_extra = {'properties': {'identifier_body': {'anyOf': [
+        {'type': 'string', 'pattern': '^[0-9a-fA-F\\s]*$'},
+        {'type': 'array', 'items': {'type': 'string', 'pattern': '^(A|D)\\d+\\.\\d+$'}},
+    ]}}}
+
     # Record Format Version - this record is special, it has 0x01 version
     def format_version(self):
         return 0x01
@@ -331,7 +340,7 @@ class Zone3InterfaceCompatibility(PicmgEntry):
                 ad = {'A': 0, 'D': 1}[el[0]]
                 raw.extend(bytearray([ad, int(el[1]), int(el[2])]))
             # Convert raw data to hex string
-            val['identifier_body'] = raw.hex()
+            val = {**val, 'identifier_body': raw.hex()}
         super().update(val)
 
 
@@ -438,6 +447,15 @@ class PowerPolicyDescriptor(FruAreaBase):
          'num_elems_field': '_channel_count'}),
     ]
 
+    _json_schema_extra = {
+        'properties': {'channels': {
+            'type': 'array',
+            'items': {'type': 'integer', 'minimum': 0, 'maximum': 0xff},
+            'maxItems': 0xff,
+        }},
+        'required': ['channels'],
+    }
+
     def to_dict(self):
         ''' Convert _channels from bytearray to list of ints '''
         result = super().to_dict()
@@ -447,8 +465,7 @@ class PowerPolicyDescriptor(FruAreaBase):
     def update(self, val):
         ''' Convert channels from list of ints to bytearray '''
         self._dict['_channels']._value = bytearray(val['channels'])
-        del val['channels']
-        super().update(val)
+        super().update({k: v for k, v in val.items() if k != 'channels'})
 
 
 @picmg_multirecord(0x25)
@@ -0,0 +1,173 @@
+###########################################################################
+#      ____  _____________  __    __  __ _           _____ ___   _        #
+#     / __ \/ ____/ ___/\ \/ /   |  \/  (_)__ _ _ __|_   _/ __| /_\  (R)  #
+#    / / / / __/  \__ \  \  /    | |\/| | / _| '_/ _ \| || (__ / _ \      #
+#   / /_/ / /___ ___/ /  / /     |_|  |_|_\__|_| \___/|_| \___/_/ \_\     #
+#  /_____/_____//____/  /_/      T  E  C  H  N  O  L  O  G  Y   L A B     #
+#                                                                         #
+#          Copyright 2021 Deutsches Elektronen-Synchrotron DESY.          #
+#                  SPDX-License-Identifier: BSD-3-Clause                  #
+#                                                                         #
+###########################################################################
+
+''' Layout optimizer for small EEPROMs
+
+Info area strings can be stored more compactly than as 8-bit ASCII: BCD+ takes half
+a byte per character (digits, space, dash, period), 6-bit ASCII three bytes per four
+characters (upper case, digits, punctuation). A string is only re-encoded if it
+round-trips unchanged, i.e. it has an even length for BCD+ and a length divisible by
+four for 6-bit ASCII, as shorter strings would be padded with spaces.
+
+Info areas are padded to 8-byte multiples anyway, so strings are only re-encoded
+where that makes the padded area smaller; everything else stays readable 8-bit ASCII.
+
+For EEPROMs written page by page, write_amplification() compares the pages to be
+rewritten after typical field updates for the packed layout and for a page-aligned layout
+with slack (Fru.serialize(page_size=..., slack=...)).
+'''
+
+from collections import namedtuple
+
+from frugy.types import StringField, StringFmt, CustomStringArray, FruAreaChecksummed
+
+# One line of the size budget: area or record name, its size and the padding included in it
+BudgetEntry = namedtuple('BudgetEntry', ['name', 'size', 'padding'])
+# Pages rewritten after an update of field, with the packed and with the page-aligned layout
+WriteCost = namedtuple('WriteCost', ['field', 'packed', 'aligned'])
+
+_ascii_6bit_chars = frozenset(chr(c) for c in range(0x20, 0x60))
+
+
+def compact_formats(value: str):
+    ''' StringFmts that can store value losslessly, most compact first '''
+    result = []
+    if value and len(value) % 2 == 0 and all(c in StringField.bcdplus_lookup for c in value):
+        result.append(StringFmt.BCD_PLUS)
+    if value and len(value) % 4 == 0 and all(c in _ascii_6bit_chars for c in value):
+        result.append(StringFmt.ASCII_6BIT)
+    return result
+
+
+def _string_fields(area):
+    for field in area._dict.values():
+        if isinstance(field, StringField):
+            yield field
+        elif isinstance(field, CustomStringArray):
+            yield from field.strings
+
+
+def _optimize_area(area):
+    ''' Choose string formats, return bytes saved '''
+    size_before = area.size_total()
+    candidates = []
+    for field in _string_fields(area):
+        formats = compact_formats(field._value)
+        if formats and formats[0] != field._format:
+            orig_format, orig_size = field._format, field.bit_size()
+            field._format = formats[0]
+            candidates.append((orig_size - field.bit_size(), field, orig_format))
+
+    # re-encoding a string pays off only if it shrinks the padded area;
+    # revert strings to the format they had as long as the padded size stays the same
+    size_min = area.size_total()
+    for _, field, orig_format in sorted(candidates, key=lambda c: c[0]):
+        fmt = field._format
+        field._format = orig_format
+        if area.size_total() != size_min:
+            field._format = fmt
+    return size_before - size_min
+
+
+def optimize(fru):
+    ''' Minimize size of a Fru in place, return bytes saved '''
+    ''' Drops info areas without any non-default content and an empty multirecord area,
+    and picks compact string formats in the info areas. '''
+    size_before = fru.size_total()
+    for name in list(fru.areas.keys()):
+        area = fru.areas[name]
+        if not area.to_dict():
+            del fru.areas[name]
+        elif isinstance(area, FruAreaChecksummed):
+            _optimize_area(area)
+    return size_before - fru.size_total()
+
+
+def size_budget(fru, page_size=None, slack=0):
+    ''' Return list of BudgetEntry for header, info areas and each multirecord '''
+    ''' With page_size / slack, the space between the areas is listed as well. '''
+    result = [BudgetEntry('CommonHeader', fru.header.size_total(), 0)]
+    placements, image_size = fru._placements(page_size, slack)
+    prev_name, prev_end = 'CommonHeader', fru.header.size_total()
+    for name, offs, size in placements + [(None, image_size, 0)]:
+        if offs > prev_end:
+            result.append(BudgetEntry(f'{prev_name} slack / alignment', offs - prev_end, offs - prev_end))
+        prev_name, prev_end = name, offs + size
+        if name is None:
+            break
+        area = fru.areas[name]
+        if name == 'MultirecordArea':
+            for n, rec in enumerate(area.records):
+                result.append(BudgetEntry(f'{name}[{n}] {rec.__class__.__name__}', rec.size_total(), 0))
+        else:
+            size = area.size_total()
+            # one byte is taken by the checksum
+            result.append(BudgetEntry(name, size, size - area.size_payload() - 1))
+    return result
+
+
+def format_budget(budget, eeprom_size=None):
+    ''' Format size budget as a table '''
+    lines = [f'{"Area / record".ljust(48)} {"Size".rjust(6)} {"Padding".rjust(8)}']
+    for e in budget:
+        lines.append(f'{e.name.ljust(48)} {e.size:6} {e.padding:8}')
+    total = sum(e.size for e in budget)
+    lines.append(f'{"Total".ljust(48)} {total:6} {sum(e.padding for e in budget):8}')
+    if eeprom_size is not None:
+        lines.append(f'{"Free".ljust(48)} {eeprom_size - total:6}')
+    return '\n'.join(lines)
+
+
+def dirty_pages(old, new, page_size):
+    ''' Number of EEPROM pages differing between two images (shorter one padded with 0xff) '''
+    size = max(len(old), len(new))
+    old, new = old.ljust(size, b'\xff'), new.ljust(size, b'\xff')
+    return sum(1 for p in range(0, size, page_size) if old[p:p + page_size] != new[p:p + page_size])
+
+
+def write_amplification(fru, page_size, slack=0, grow=8):
+    ''' Pages to rewrite when a string of an info area grows by grow characters '''
+    ''' Returns a WriteCost per info area string, comparing the packed layout with the layout
+    aligned to page_size with slack. The default of 8 characters grows the area by one 8-byte
+    block, like an updated serial number or version string often does. The Fru is left unchanged. '''
+    packed = fru.serialize()
+    aligned = fru.serialize(page_size=page_size, slack=slack)
+    result = []
+    for area_name, area in fru.areas.items():
+        if not isinstance(area, FruAreaChecksummed):
+            continue
+        for key, field in area._dict.items():
+            if not isinstance(field, StringField):
+                continue
+            value = field._value
+            field._value = value + 'X' * grow
+            try:
+                result.append(WriteCost(f'{area_name}.{key}',
+                                        dirty_pages(packed, fru.serialize(), page_size),
+                                        dirty_pages(aligned, fru.serialize(page_size=page_size, slack=slack),
+                                                    page_size)))
+            finally:
+                field._value = value
+    return result
+
+
+def format_write_amplification(costs, page_size):
+    ''' Format result of write_amplification() as a table '''
+    lines = [f'{"Grown field".ljust(48)} {"Packed".rjust(8)} {"Aligned".rjust(8)}  (pages of {page_size} bytes)']
+    for c in costs:
+        lines.append(f'{c.field.ljust(48)} {c.packed:8} {c.aligned:8}')
+    packed = sum(c.packed for c in costs)
+    aligned = sum(c.aligned for c in costs)
+    lines.append(f'{"Total".ljust(48)} {packed:8} {aligned:8}')
+    if packed:
+        lines.append(f'{"Saved".ljust(48)} {f"{(packed - aligned) / packed:.0%}".rjust(17)}')
+    return '\n'.join(lines)
@@ -0,0 +1,206 @@
+###########################################################################
+#      ____  _____________  __    __  __ _           _____ ___   _        #
+#     / __ \/ ____/ ___/\ \/ /   |  \/  (_)__ _ _ __|_   _/ __| /_\  (R)  #
+#    / / / / __/  \__ \  \  /    | |\/| | / _| '_/ _ \| || (__ / _ \      #
+#   / /_/ / /___ ___/ /  / /     |_|  |_|_\__|_| \___/|_| \___/_/ \_\     #
+#  /_____/_____//____/  /_/      T  E  C  H  N  O  L  O  G  Y   L A B     #
+#                                                                         #
+#          Copyright 2021 Deutsches Elektronen-Synchrotron DESY.          #
+#                  SPDX-License-Identifier: BSD-3-Clause                  #
+#                                                                         #
+###########################################################################
+
+''' Opt-in timing instrumentation of the (de)serialization hot paths
+
+enable() wraps the instrumented methods in place, disable() puts the originals back,
+so there is no overhead at all while profiling is off. Instrumented are:
+
+    fru.serialize / fru.deserialize       Fru.serialize, Fru.deserialize
+    yaml.load / yaml.dump                 Fru.load_yaml, Fru.dump_yaml
+    multirecord.deserialize               MultirecordEntry.deserialize, per record class
+    record.serialize / record.deserialize _serialize, _serialize_into / _deserialize of every
+                                          record class, including the generated codecs
+
+Times are inclusive (a Fru deserialize includes its records). Record classes defined
+after enable() are not instrumented.
+
+Callbacks registered with add_callback() are called for each instrumented call as
+callback(phase, name, start, duration, nbytes), with start from time.perf_counter().
+'''
+
+from collections import namedtuple
+from contextlib import contextmanager
+import json
+import os
+import time
+
+from frugy.fru import Fru
+from frugy.multirecords import MultirecordEntry
+from frugy.types import FruAreaBase
+
+ProfileEntry = namedtuple('ProfileEntry', ['phase', 'name', 'calls', 'time', 'bytes'])
+
+_stats = {}
+_callbacks = []
+_originals = []
+
+
+def _record(phase, name, start, nbytes):
+    duration = time.perf_counter() - start
+    entry = _stats.get((phase, name))
+    if entry is None:
+        entry = _stats[(phase, name)] = [0, 0.0, 0]
+    entry[0] += 1
+    entry[1] += duration
+    entry[2] += nbytes
+    for cb in _callbacks:
+        cb(phase, name, start, duration, nbytes)
+
+
+def _wrap_method(phase, func, name_fn, bytes_fn):
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(self, *args, **kwargs)
+        _record(phase, name_fn(self, result), start, bytes_fn(args, result))
+        return result
+    wrapper.__wrapped__ = func
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def _class_name(self, result):
+    return self.__name__ if isinstance(self, type) else self.__class__.__name__
+
+
+def _fru_name(self, result):
+    return 'Fru'
+
+
+def _record_name(cls, result):
+    entry = result[0]
+    return entry.__class__.__name__ if entry is not None else 'MultirecordEntry'
+
+
+def _input_len(args, result):
+    return len(args[0])
+
+
+def _result_len(args, result):
+    return len(result)
+
+
+def _written(args, result):
+    return result - args[1]
+
+
+def _consumed(args, result):
+    return len(args[0]) - len(result)
+
+
+def _multirecord_consumed(args, result):
+    return len(args[0]) - len(result[1])
+
+
+def _file_size(args, result):
+    try:
+        return os.path.getsize(args[0])
+    except OSError:
+        return 0
+
+
+def _record_classes():
+    pending = [FruAreaBase]
+    while pending:
+        cls = pending.pop()
+        yield cls
+        pending.extend(cls.__subclasses__())
+
+
+def _targets():
+    ''' yield (class, attribute, phase, name function, bytes function) '''
+    yield Fru, 'serialize', 'fru.serialize', _fru_name, _result_len
+    yield Fru, 'deserialize', 'fru.deserialize', _fru_name, _input_len
+    yield Fru, 'load_yaml', 'yaml.load', _fru_name, _file_size
+    yield Fru, 'dump_yaml', 'yaml.dump', _fru_name, _result_len
+    yield MultirecordEntry, 'deserialize', 'multirecord.deserialize', _record_name, _multirecord_consumed
+    for cls in _record_classes():
+        if '_serialize' in cls.__dict__:
+            yield cls, '_serialize', 'record.serialize', _class_name, _result_len
+        if '_serialize_into' in cls.__dict__:
+            yield cls, '_serialize_into', 'record.serialize', _class_name, _written
+        if '_deserialize' in cls.__dict__:
+            yield cls, '_deserialize', 'record.deserialize', _class_name, _consumed
+
+
+def is_enabled():
+    return bool(_originals)
+
+
+def enable():
+    ''' Install instrumentation '''
+    if _originals:
+        return
+    for cls, attr, phase, name_fn, bytes_fn in list(_targets()):
+        orig = cls.__dict__[attr]
+        if isinstance(orig, classmethod):
+            wrapped = classmethod(_wrap_method(phase, orig.__func__, name_fn, bytes_fn))
+        else:
+            wrapped = _wrap_method(phase, orig, name_fn, bytes_fn)
+        _originals.append((cls, attr, orig))
+        setattr(cls, attr, wrapped)
+
+
+def disable():
+    ''' Remove instrumentation, keep collected statistics '''
+    while _originals:
+        cls, attr, orig = _originals.pop()
+        setattr(cls, attr, orig)
+
+
+def reset():
+    ''' Clear collected statistics '''
+    _stats.clear()
+
+
+@contextmanager
+def profiled():
+    ''' Enable instrumentation within a with block '''
+    enable()
+    try:
+        yield
+    finally:
+        disable()
+
+
+def add_callback(callback):
+    _callbacks.append(callback)
+
+
+def remove_callback(callback):
+    _callbacks.remove(callback)
+
+
+def results():
+    ''' Collected statistics as list of ProfileEntry, most time consuming first '''
+    entries = [ProfileEntry(phase, name, *v) for (phase, name), v in _stats.items()]
+    return sorted(entries, key=lambda e: e.time, reverse=True)
+
+
+def format_table(entries=None):
+    ''' Format statistics as a table '''
+    if entries is None:
+        entries = results()
+    lines = [f'{"Phase".ljust(24)} {"Name".ljust(32)} {"Calls".rjust(8)} {"Time/ms".rjust(10)} '
+             f'{"us/call".rjust(8)} {"Bytes".rjust(10)}']
+    for e in entries:
+        lines.append(f'{e.phase.ljust(24)} {e.name.ljust(32)} {e.calls:8} {e.time * 1e3:10.3f} '
+                     f'{e.time / e.calls * 1e6:8.1f} {e.bytes:10}')
+    return '\n'.join(lines)
+
+
+def to_json(entries=None):
+    ''' Format statistics as JSON '''
+    if entries is None:
+        entries = results()
+    return json.dumps([e._asdict() for e in entries], indent=2)
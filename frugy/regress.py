@@ -0,0 +1,261 @@
+###########################################################################
+#      ____  _____________  __    __  __ _           _____ ___   _        #
+#     / __ \/ ____/ ___/\ \/ /   |  \/  (_)__ _ _ __|_   _/ __| /_\  (R)  #
+#    / / / / __/  \__ \  \  /    | |\/| | / _| '_/ _ \| || (__ / _ \      #
+#   / /_/ / /___ ___/ /  / /     |_|  |_|_\__|_| \___/|_| \___/_/ \_\     #
+#  /_____/_____//____/  /_/      T  E  C  H  N  O  L  O  G  Y   L A B     #
+#                                                                         #
+#          Copyright 2021 Deutsches Elektronen-Synchrotron DESY.          #
+#                  SPDX-License-Identifier: BSD-3-Clause                  #
+#                                                                         #
+###########################################################################
+
+''' Golden image regression runner
+
+Pairs FRU descriptions (.yml / .yaml) with reference images (.bin) by file name and
+checks, byte for byte, that
+  * the description builds the reference image (yaml2bin)
+  * the reference image converted to YAML and back reproduces itself (bin2yaml2bin)
+Reference images padded with 0xff to an EEPROM size match the unpadded image.
+Differences are reported per area and multirecord, down to the fields. The pairs are
+checked in a process pool.
+
+Run as: frugy regress [-j JOBS] [-b] path [...]
+'''
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import logging
+import os
+import sys
+import time
+import yaml
+
+from frugy.fru import Fru
+from frugy.areas import CommonHeader
+from frugy.multirecords import MultirecordEntry
+
+RegressPair = namedtuple('RegressPair', ['name', 'yaml', 'bin'])
+# diffs: check name -> list of differences (empty if passed)
+RegressResult = namedtuple('RegressResult', ['name', 'diffs', 'size', 'time'])
+
+_yaml_ext = ('.yml', '.yaml')
+
+
+def find_pairs(paths):
+    ''' Collect YAML and .bin files from paths (files or directories), pair them by base name '''
+    ''' Returns a list of RegressPair sorted by name; yaml or bin is None for unpaired files. '''
+    files = {}
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(os.path.join(path, n) for n in os.listdir(path))
+        else:
+            names = [path]
+        for fname in names:
+            base, ext = os.path.splitext(os.path.basename(fname))
+            kind = 'yaml' if ext in _yaml_ext else 'bin' if ext == '.bin' else None
+            if kind is not None:
+                files.setdefault(base, {})[kind] = fname
+    return [RegressPair(name, f.get('yaml'), f.get('bin')) for name, f in sorted(files.items())]
+
+
+def _strip_padding(image, length):
+    ''' Remove 0xff padding beyond length from image '''
+    if len(image) > length and image[length:].count(0xff) == len(image) - length:
+        return image[:length]
+    return image
+
+
+def _raw_areas(image):
+    ''' Raw bytes of the areas in image, as {name: bytes}; multirecords as 'MultirecordArea[i]' '''
+    header = CommonHeader()
+    header.deserialize(image)
+    result = {}
+    for name, offs_key in Fru._area_table_lookup.items():
+        offs = header[offs_key]
+        if offs == 0:
+            continue
+        if name != 'MultirecordArea':
+            result[name] = bytes(image[offs:offs + image[offs + 1] * 8])
+            continue
+        idx = 0
+        # like the parser, stop at a broken header (e.g. erased EEPROM after a missing end of list)
+        while offs + 5 <= len(image) and sum(image[offs:offs + 5]) & 0xff == 0:
+            end = offs + 5 + image[offs + 2]
+            result[f'{name}[{idx}]'] = bytes(image[offs:end])
+            if image[offs + 1] & 0x80:
+                break
+            offs, idx = end, idx + 1
+    return result
+
+
+def _parse_raw(key, raw):
+    if key.startswith('MultirecordArea'):
+        return MultirecordEntry.deserialize(raw)[0]
+    area = Fru().factory(key)
+    area.deserialize(raw)
+    return area
+
+
+def _clear_end_of_list(key, raw):
+    if not key.startswith('MultirecordArea'):
+        return raw
+    # header checksum byte isn't masked, the flag shows up there as well
+    return raw[:1] + bytes([raw[1] & 0x7f]) + raw[2:4] + raw[5:]
+
+
+def _first_difference(a, b):
+    return next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+
+
+def _missing(keys, what):
+    ''' Format missing areas, collapsing runs of multirecords like "MultirecordArea[3..9]" '''
+    areas = [k for k in keys if '[' not in k]
+    records = [k for k in keys if '[' in k]
+    result = [f'{k}: {what}' for k in areas]
+    if len(records) > 1:
+        result.append(f'{records[0][:-1]}..{records[-1].split("[")[1]}: {what} ({len(records)} records)')
+    elif records:
+        result.append(f'{records[0]}: {what}')
+    return result
+
+
+def image_diff(expected, actual):
+    ''' Compare two FRU images, return list of differences per area / multirecord '''
+    ''' Fields are compared where both sides decode; otherwise the first differing byte is given. '''
+    if expected == actual:
+        return []
+    try:
+        exp_areas = _raw_areas(expected)
+        act_areas = _raw_areas(actual)
+    except RuntimeError as e:
+        return [f'image does not parse: {e}']
+
+    result = []
+    missing = []
+    for key, exp_raw in exp_areas.items():
+        act_raw = act_areas.get(key)
+        if act_raw is None:
+            missing.append(key)
+        elif act_raw != exp_raw:
+            try:
+                exp_obj, act_obj = _parse_raw(key, exp_raw), _parse_raw(key, act_raw)
+            except RuntimeError:
+                exp_obj = act_obj = None
+            fields = [] if exp_obj is None or act_obj is None else exp_obj.diff(act_obj, key)
+            if not fields and _clear_end_of_list(key, exp_raw) == _clear_end_of_list(key, act_raw):
+                fields = [f'{key}: end of list flag differs']
+            result += fields or [f'{key}: encoding differs at byte {_first_difference(exp_raw, act_raw)}']
+    result += _missing(missing, 'missing')
+    result += _missing([k for k in act_areas if k not in exp_areas], 'unexpected')
+    if not result:
+        # same areas, but different offsets, order or trailing data
+        result.append(f'layout differs at byte {_first_difference(expected, actual)}')
+    return result
+
+
+def _yaml2bin(pair, ref):
+    fru = Fru()
+    fru.load_yaml(pair.yaml)
+    img = fru.serialize()
+    return image_diff(_strip_padding(ref, len(img)), img)
+
+
+def _bin2yaml2bin(pair, ref):
+    fru = Fru()
+    fru.deserialize(ref)
+    img = Fru(yaml.safe_load(fru.dump_yaml())).serialize()
+    return image_diff(_strip_padding(ref, len(img)), img)
+
+
+_checks = [('yaml2bin', 'yaml', _yaml2bin), ('bin2yaml2bin', None, _bin2yaml2bin)]
+
+
+def check_pair(pair, opalkelly_workaround=False):
+    ''' Run the round trips of one RegressPair, return a RegressResult '''
+    ''' The Opal Kelly workaround is a global switch, it is restored when done. '''
+    start_time = time.perf_counter()
+    with MultirecordEntry.opalkelly_workaround(opalkelly_workaround):
+        with open(pair.bin, 'rb') as f:
+            ref = f.read()
+        diffs = {}
+        for name, needs, check in _checks:
+            if needs is not None and getattr(pair, needs) is None:
+                continue
+            try:
+                diffs[name] = check(pair, ref)
+            except Exception as e:
+                # a broken file must not stop the run
+                diffs[name] = [f'{e.__class__.__name__}: {e}']
+    return RegressResult(pair.name, diffs, len(ref), time.perf_counter() - start_time)
+
+
+def _init_worker():
+    # the parser warns about every broken record, which would drown the report
+    logging.disable(logging.WARNING)
+
+
+def regress(pairs, jobs=None, opalkelly_workaround=False):
+    ''' Check pairs with a reference image in a pool of jobs processes (default: one per CPU) '''
+    ''' Yields a RegressResult per pair, in the order of pairs. '''
+    pairs = [p for p in pairs if p.bin is not None]
+    args = [opalkelly_workaround] * len(pairs)
+    if jobs == 1:
+        yield from map(check_pair, pairs, args)
+        return
+    with ProcessPoolExecutor(jobs, initializer=_init_worker) as pool:
+        # a few pairs per task, to amortize the inter-process communication
+        chunksize = max(1, len(pairs) // (4 * (jobs or os.cpu_count() or 1)))
+        yield from pool.map(check_pair, pairs, args, chunksize=chunksize)
+
+
+def format_result(result, verbose=False):
+    failed = any(result.diffs.values())
+    if not failed and not verbose:
+        return ''
+    lines = [f'{"FAIL" if failed else "ok  "} {result.name} ({", ".join(result.diffs)})']
+    for check, diffs in result.diffs.items():
+        lines += [f'  {check}: {d}' for d in diffs]
+    return '\n'.join(lines) + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='frugy regress',
+                                     description='Check FRU descriptions and images against reference images')
+    parser.add_argument('paths', nargs='+',
+                        help='YAML / .bin files or directories; files are paired by base name')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: one per CPU)')
+    parser.add_argument('-b', '--broken', action='store_true',
+                        help='enable workaround to parse Opal Kelly EEPROMs')
+    parser.add_argument('-v', '--verbose', action='store_true', help='list passing files, too')
+    args = parser.parse_args(argv)
+
+    _init_worker()
+    pairs = find_pairs(args.paths)
+    start_time = time.perf_counter()
+    passed, failed, checks, total_bytes, cpu_time = 0, 0, 0, 0, 0.0
+    for res in regress(pairs, args.jobs, args.broken):
+        sys.stdout.write(format_result(res, args.verbose))
+        if any(res.diffs.values()):
+            failed += 1
+        else:
+            passed += 1
+        checks += len(res.diffs)
+        total_bytes += res.size * len(res.diffs)
+        cpu_time += res.time
+    elapsed = time.perf_counter() - start_time
+
+    unpaired = [p.yaml for p in pairs if p.bin is None]
+    print(f'{passed + failed} images: {passed} ok, {failed} failed')
+    if unpaired:
+        print(f'no reference image for: {", ".join(unpaired)}')
+    if checks:
+        print(f'{checks} round trips in {elapsed:.2f} s: {checks / elapsed:.1f} round trips/s, '
+              f'{total_bytes / elapsed / 1e6:.2f} MB/s ({cpu_time / checks * 1e3:.2f} ms per round trip)')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+###########################################################################
+#      ____  _____________  __    __  __ _           _____ ___   _        #
+#     / __ \/ ____/ ___/\ \/ /   |  \/  (_)__ _ _ __|_   _/ __| /_\  (R)  #
+#    / / / / __/  \__ \  \  /    | |\/| | / _| '_/ _ \| || (__ / _ \      #
+#   / /_/ / /___ ___/ /  / /     |_|  |_|_\__|_| \___/|_| \___/_/ \_\     #
+#  /_____/_____//____/  /_/      T  E  C  H  N  O  L  O  G  Y   L A B     #
+#                                                                         #
+#          Copyright 2021 Deutsches Elektronen-Synchrotron DESY.          #
+#                  SPDX-License-Identifier: BSD-3-Clause                  #
+#                                                                         #
+###########################################################################
+
+''' Asyncio scanner reading FRU images from many sources concurrently
+
+    async for source, result in scan(['/sys/bus/i2c/devices/0-0050/eeprom', 'dumps.fra']):
+        ...
+
+A source is one of
+  * path of a FRU image, e.g. a sysfs eeprom file or a .bin dump
+  * path of a .fra archive (frugy.archive), scanned as 'archive.fra[idx]' per entry
+  * (name, read) with read() returning the image; read may be a coroutine function,
+    e.g. for simulated devices
+
+Up to `concurrency` images are read and parsed at a time, further sources are only taken
+from the iterator when one of them completes. Blocking reads run in a thread pool, so the
+I/O of many sources overlaps; parsing runs in `executor`, by default a
+process pool (a single thread on single CPU machines). Results are yielded as they
+complete, with result being a Fru or the OSError / RuntimeError that occurred.
+
+Returning a Fru from a worker process means pickling it, which costs about half as much
+as parsing. Pass a ThreadPoolExecutor to parse in the scanning process instead. Metrics
+(frugy.metrics) of worker processes are not merged into the scanning process.
+'''
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import asyncio
+import os
+
+from frugy.fru import Fru
+from frugy.archive import FruArchive
+from frugy.multirecords import MultirecordEntry
+
+
+def read_image(fname):
+    ''' Read FRU image, at most the max_image_size bytes the parser looks at '''
+    with open(fname, 'rb') as f:
+        return f.read(Fru.max_image_size)
+
+
+def parse_image(data, opalkelly_workaround=False):
+    ''' Parse image into a Fru (executed in the parse pool) '''
+    ''' The Opal Kelly workaround is a global switch, so parsers of a thread pool take turns. '''
+    fru = Fru()
+    with MultirecordEntry.opalkelly_workaround(opalkelly_workaround):
+        fru.deserialize(data)
+    return fru
+
+
+def _default_executor():
+    if (os.cpu_count() or 1) > 1:
+        return ProcessPoolExecutor()
+    # nothing to gain from worker processes, which return pickled Frus
+    return ThreadPoolExecutor(1)
+
+
+async def scan(sources, concurrency=16, executor=None, opalkelly_workaround=False):
+    ''' Read and parse FRU images from sources, yield (source name, Fru or error) as they complete '''
+    ''' sources may be an iterator; it is consumed as images complete, so at most concurrency
+    images are pending at a time. '''
+    loop = asyncio.get_running_loop()
+    io_pool = ThreadPoolExecutor(concurrency)
+    parse_pool = executor if executor is not None else _default_executor()
+    archives = []
+    pending = set()
+
+    async def read(reader):
+        if asyncio.iscoroutinefunction(reader):
+            return await reader()
+        return await loop.run_in_executor(io_pool, reader)
+
+    async def scan_one(name, reader):
+        try:
+            data = await read(reader)
+            fru = await loop.run_in_executor(parse_pool, parse_image, bytes(data), opalkelly_workaround)
+        except (OSError, RuntimeError) as e:
+            return name, e
+        return name, fru
+
+    async def wait_pending(limit):
+        ''' Wait until fewer than limit images are pending, return the results completed meanwhile '''
+        nonlocal pending
+        results = []
+        while len(pending) >= limit and pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            results += [fut.result() for fut in done]
+        return results
+
+    try:
+        for src in sources:
+            if isinstance(src, tuple):
+                images = [src]
+            elif not os.fspath(src).endswith('.fra'):
+                src = os.fspath(src)
+                images = [(src, lambda src=src: read_image(src))]
+            else:
+                src = os.fspath(src)
+                try:
+                    archive = await loop.run_in_executor(io_pool, FruArchive, src)
+                except (OSError, RuntimeError) as e:
+                    yield src, e
+                    continue
+                archives.append(archive)
+                images = ((f'{src}[{idx}]', lambda archive=archive, idx=idx: archive.image(idx))
+                          for idx in range(len(archive)))
+
+            for name, reader in images:
+                for result in await wait_pending(concurrency):
+                    yield result
+                pending.add(asyncio.ensure_future(scan_one(name, reader)))
+
+        for result in await wait_pending(1):
+            yield result
+    finally:
+        # consumer may have stopped early
+        for task in pending:
+            task.cancel()
+        io_pool.shutdown(wait=True)
+        if executor is None:
+            parse_pool.shutdown(wait=False)
+        for archive in archives:
+            archive.close()
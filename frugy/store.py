@@ -0,0 +1,45 @@
+###########################################################################
+#      ____  _____________  __    __  __ _           _____ ___   _        #
+#     / __ \/ ____/ ___/\ \/ /   |  \/  (_)__ _ _ __|_   _/ __| /_\  (R)  #
+#    / / / / __/  \__ \  \  /    | |\/| | / _| '_/ _ \| || (__ / _ \      #
+#   / /_/ / /___ ___/ /  / /     |_|  |_|_\__|_| \___/|_| \___/_/ \_\     #
+#  /_____/_____//____/  /_/      T  E  C  H  N  O  L  O  G  Y   L A B     #
+#                                                                         #
+#          Copyright 2021 Deutsches Elektronen-Synchrotron DESY.          #
+#                  SPDX-License-Identifier: BSD-3-Clause                  #
+#                                                                         #
+###########################################################################
+
+
+class RecordStore:
+    ''' Interning table for deserialized FRU areas and multirecords '''
+    ''' Records are keyed by their raw bytes, so identical records found in several images
+    are deserialized only once and shared. Shared records are frozen: modifying them raises
+    a RuntimeError. Pass the store to Fru.deserialize / Fru.load_bin. '''
+
+    def __init__(self):
+        self._records = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def intern(self, key, build):
+        ''' Return record stored under key, or build, freeze and store it '''
+        record = self._records.get(key)
+        if record is not None:
+            self.hits += 1
+            return record
+
+        record = build()
+        if record is not None:
+            record._frozen = True
+            self._records[key] = record
+            self.misses += 1
+        return record
+
+    def clear(self):
+        self._records = {}
+        self.hits = 0
+        self.misses = 0
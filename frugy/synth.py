@@ -0,0 +1,326 @@
+###########################################################################
+#      ____  _____________  __    __  __ _           _____ ___   _        #
+#     / __ \/ ____/ ___/\ \/ /   |  \/  (_)__ _ _ __|_   _/ __| /_\  (R)  #
+#    / / / / __/  \__ \  \  /    | |\/| | / _| '_/ _ \| || (__ / _ \      #
+#   / /_/ / /___ ___/ /  / /     |_|  |_|_\__|_| \___/|_| \___/_/ \_\     #
+#  /_____/_____//____/  /_/      T  E  C  H  N  O  L  O  G  Y   L A B     #
+#                                                                         #
+#          Copyright 2021 Deutsches Elektronen-Synchrotron DESY.          #
+#                  SPDX-License-Identifier: BSD-3-Clause                  #
+#                                                                         #
+###########################################################################
+
+''' Generator of synthetic FRU descriptions and images
+
+Random FRU dicts are drawn from the JSON Schema that frugy.validate derives from the
+_schema of every registered area and record class, so every multirecord type, the
+value ranges, maximum string lengths and the element counts of arrays (255 for u8
+count fields) are covered without per-record code. Lengths of strings and arrays are
+drawn from an exponential distribution with a configurable mean, and hit their
+maximum with a configurable probability.
+
+Records whose payload exceeds 255 bytes and info areas exceeding 2040 bytes are
+shrunk by halving their longest string or array. Records the schema can't fully
+describe (e.g. cross-field dependencies) may still fail to serialize; these are
+drawn again, as are records the parser would decode differently. Every generated
+image is checked with Fru.verify_roundtrip() before it is returned.
+
+FRU number n of a seed only depends on (seed, n), so a corpus can be generated in
+parallel, in chunks, or be extended later.
+
+Run as: python -m frugy.synth [-n COUNT] [-s SEED] corpus.fra
+'''
+
+from datetime import datetime, timedelta
+from functools import lru_cache
+import argparse
+import logging
+import random
+import re
+import sys
+import time
+
+from frugy.fru import Fru
+from frugy.archive import FruArchive
+from frugy.fru_registry import rec_lookup_by_name
+from frugy.multirecords import MultirecordEntry
+from frugy.validate import json_schema
+from frugy.types import malformed_data_errors
+
+# record payload length is stored in a byte
+_max_payload = 0xff
+# area lengths and offsets are stored in multiples of 8 bytes in a byte
+_max_area_size = 0xff * 8
+# the multirecord area offset is limited the same way, so the info areas share that space
+_max_info_area_size = (_max_area_size - 8) // 3 // 8 * 8
+# length of strings / arrays without a maximum in the schema
+_unbounded_max = 0xff
+
+_hex_pattern = '^[0-9a-fA-F\\s]*$'
+_class_id_pattern = '^(A|D)\\d+\\.\\d+$'
+
+_printable = [chr(c) for c in range(0x20, 0x7f)]
+_latin1_printable = _printable + [chr(c) for c in range(0xa0, 0x100)]
+
+_time_ref = datetime(1996, 1, 1)
+_max_minutes = (1 << 24) - 1
+
+_info_areas = ['ChassisInfo', 'BoardInfo', 'ProductInfo']
+
+
+class FruSynth:
+    ''' Seeded generator of random, valid FRU dicts and images '''
+    ''' string_mean, array_mean and records_mean are the mean lengths of strings, arrays
+    and of the multirecord area; p_max is the probability of a string or array having its
+    maximum length, p_optional the probability of an optional field or area being present. '''
+
+    max_attempts = 20
+
+    def __init__(self, seed=0, string_mean=8, array_mean=4, records_mean=4, max_records=32,
+                 p_max=0.05, p_optional=0.7, record_types=None):
+        self.seed = seed
+        self.string_mean = string_mean
+        self.array_mean = array_mean
+        self.records_mean = records_mean
+        self.max_records = max_records
+        self.p_max = p_max
+        self.p_optional = p_optional
+
+        schema = json_schema()
+        self._defs = schema['$defs']
+        multirecords = [s['$ref'].rsplit('/', 1)[-1]
+                        for s in schema['properties']['MultirecordArea']['items']['oneOf']]
+        if record_types is not None:
+            unknown = set(record_types) - set(multirecords)
+            if unknown:
+                raise RuntimeError(f'unknown multirecord types: {", ".join(sorted(unknown))}')
+            multirecords = list(record_types)
+        self.record_types = multirecords
+        self._rng = random.Random(seed)
+        self._budget = 0
+
+    # Drawing values from the schema
+
+    def _length(self, mean, minimum, maximum):
+        if maximum is not None and self._rng.random() < self.p_max:
+            return maximum
+        n = minimum + (int(self._rng.expovariate(1 / mean)) if mean > 0 else 0)
+        return min(n, maximum if maximum is not None else _unbounded_max)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _alphabet(pattern):
+        ''' Printable characters allowed by a pattern like ^[...]*$ '''
+        if pattern is None:
+            return _printable
+        regex = re.compile(pattern)
+        return [c for c in _latin1_printable if regex.search(c)]
+
+    def _string(self, schema):
+        pattern = schema.get('pattern')
+        max_len = schema.get('maxLength')
+        if pattern == _class_id_pattern:
+            return f'{self._rng.choice("AD")}{self._rng.randrange(256)}.{self._rng.randrange(256)}'
+        if schema.get('format') == 'ipv4':
+            return '.'.join(str(self._rng.randrange(256)) for _ in range(4))
+        if schema.get('format') == 'uuid':
+            return '%08x-%04x-%04x-%04x-%012x' % tuple(
+                self._rng.getrandbits(n) for n in (32, 16, 16, 16, 48))
+        if schema.get('format') == 'date-time':
+            minutes = self._rng.randint(1, _max_minutes)
+            return (_time_ref + timedelta(minutes=minutes)).isoformat()
+        length = self._length(self.string_mean, 0, max_len)
+        if pattern == _hex_pattern:
+            return ' '.join('%02x' % self._rng.randrange(256) for _ in range(length))
+        chars = self._alphabet(pattern)
+        return ''.join(self._rng.choice(chars) for _ in range(length))
+
+    def _number(self, schema):
+        minimum, maximum = schema.get('minimum', 0), schema.get('maximum', 0xff)
+        step = schema.get('multipleOf', schema.get('x-frugy-div'))
+        if step is None:
+            return self._rng.randint(minimum, maximum)
+        # only values representable in the binary encoding
+        n = self._rng.randint(int(minimum / step), int(maximum / step))
+        return round(n * step, 9)
+
+    def _array(self, schema):
+        min_items = schema.get('minItems', 0)
+        length = self._length(self.array_mean, min_items, schema.get('maxItems'))
+        # every element takes at least one byte, so don't draw more than can fit,
+        # and share what is left between the elements' own arrays
+        length = max(min(length, self._budget), min_items)
+        remaining = self._budget - length
+        result = []
+        for _ in range(length):
+            share = remaining // length
+            self._budget = share
+            result.append(self.value(schema['items']))
+            remaining -= share - self._budget
+        self._budget = remaining
+        return result
+
+    def _object(self, schema):
+        required = schema.get('required', [])
+        result = {}
+        for name, prop in schema['properties'].items():
+            if name in required or self._rng.random() < self.p_optional:
+                result[name] = self.value(prop)
+        return result
+
+    def value(self, schema):
+        ''' Draw a random value matching a (sub-)schema '''
+        if '$ref' in schema:
+            return self.value(self._defs[schema['$ref'].rsplit('/', 1)[-1]])
+        for key in ('anyOf', 'oneOf'):
+            if key in schema:
+                return self.value(self._rng.choice(schema[key]))
+        if 'const' in schema:
+            return schema['const']
+        if 'enum' in schema:
+            return self._rng.choice(schema['enum'])
+        types = schema.get('type', 'object')
+        t = self._rng.choice(types) if isinstance(types, list) else types
+        if t == 'null':
+            return None
+        if t == 'string':
+            return self._string(schema)
+        if t in ('integer', 'number'):
+            return self._number(schema)
+        if t == 'array':
+            return self._array(schema)
+        return self._object(schema)
+
+    # Keeping records and areas within their size limits
+
+    @staticmethod
+    def _longest(value, parent=None, key=None):
+        ''' Return (length, parent, key) of the longest string or list within value '''
+        best = (len(value), parent, key) if isinstance(value, (str, list)) and parent is not None else (0, None, None)
+        if isinstance(value, dict):
+            items = value.items()
+        elif isinstance(value, list):
+            items = enumerate(value)
+        else:
+            items = []
+        for k, v in items:
+            candidate = FruSynth._longest(v, value, k)
+            if candidate[0] > best[0]:
+                best = candidate
+        return best
+
+    @staticmethod
+    def _shrink(value, ratio):
+        ''' Cut the longest string or list in value to ratio of its length (at least by one element) '''
+        ''' Return False if there is nothing left to shrink. '''
+        length, parent, key = FruSynth._longest(value)
+        if length == 0:
+            return False
+        item = parent[key]
+        hex_bytes = item.split() if isinstance(item, str) else None
+        if hex_bytes and all(len(b) == 2 for b in hex_bytes):
+            # keep hex strings valid
+            parent[key] = ' '.join(hex_bytes[:min(len(hex_bytes) - 1, int(len(hex_bytes) * ratio))])
+        else:
+            parent[key] = item[:min(length - 1, int(length * ratio))]
+        return True
+
+    def _fit(self, make, size_of, max_size, initdict):
+        ''' Shrink initdict until the object made from it is small enough '''
+        while True:
+            size = size_of(make(initdict))
+            if size <= max_size:
+                return initdict
+            if not self._shrink(initdict, max_size / size):
+                raise RuntimeError('object exceeds size limit')
+
+    def record_dict(self, type_name):
+        ''' Random dict of a multirecord, shrunk to the maximum payload size '''
+        constructor = rec_lookup_by_name(type_name)
+        for _ in range(self.max_attempts):
+            self._budget = _max_payload
+            initdict = self.value(self._defs[type_name])
+            # the type name must not be shrunk
+            del initdict['type']
+            try:
+                initdict = self._fit(constructor, lambda rec: rec.size_payload() - 5, _max_payload, initdict)
+                rec = constructor(initdict)
+                parsed, _, _ = MultirecordEntry.deserialize(rec.serialize(end_of_list=True))
+                # records the parser skips (e.g. with empty payload) or decodes differently are drawn again
+                if parsed is not None and not rec.diff(parsed, type_name):
+                    return {'type': type_name, **initdict}
+            except (RuntimeError, AttributeError, OverflowError) + malformed_data_errors:
+                # the schema doesn't describe every constraint of a record; draw again
+                continue
+        raise RuntimeError(f'{type_name}: no valid record after {self.max_attempts} attempts')
+
+    def _area_dict(self, name):
+        self._budget = _max_info_area_size
+        initdict = self.value(self._defs[name])
+        return self._fit(lambda d: Fru({name: d}).areas[name], lambda area: area.size_total(),
+                         _max_info_area_size, initdict)
+
+    def fru_dict(self, index=0):
+        ''' FRU description number index of this generator's seed '''
+        self._rng = random.Random(f'{self.seed}/{index}')
+        result = {}
+        for name in _info_areas:
+            if self._rng.random() < self.p_optional:
+                result[name] = self._area_dict(name)
+        num_records = self._length(self.records_mean, 0, self.max_records)
+        if num_records:
+            result['MultirecordArea'] = [self.record_dict(self._rng.choice(self.record_types))
+                                         for _ in range(num_records)]
+        return result
+
+    def image(self, index=0):
+        ''' Return (FRU description, FRU image) number index of this generator's seed '''
+        fru_dict = self.fru_dict(index)
+        fru = Fru(fru_dict)
+        img = fru.serialize()
+        diffs = fru.verify_roundtrip(img)
+        if diffs:
+            raise RuntimeError(f'synthetic FRU {index} does not round-trip: {diffs[0]}')
+        return fru_dict, img
+
+    def generate(self, count, start=0):
+        ''' Yield (FRU description, FRU image) for indices start .. start+count-1 '''
+        for index in range(start, start + count):
+            yield self.image(index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a corpus of synthetic FRU images')
+    parser.add_argument('archive', help='FRU archive (.fra) to write')
+    parser.add_argument('-n', '--count', type=int, default=1000, help='number of images (default: 1000)')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='random seed (default: 0)')
+    parser.add_argument('--start', type=int, default=0, help='index of the first image (default: 0)')
+    parser.add_argument('-a', '--append', action='store_true', help='append to an existing archive')
+    parser.add_argument('--string-mean', type=float, default=8, help='mean string length (default: 8)')
+    parser.add_argument('--array-mean', type=float, default=4, help='mean array length (default: 4)')
+    parser.add_argument('--records-mean', type=float, default=4,
+                        help='mean number of multirecords (default: 4)')
+    parser.add_argument('--p-max', type=float, default=0.05,
+                        help='probability of strings and arrays having maximum length (default: 0.05)')
+    parser.add_argument('-t', '--type', action='append', dest='record_types',
+                        help='generate only this multirecord type (can be repeated)')
+    args = parser.parse_args()
+
+    # y2k27 heuristics and the like would log for many generated timestamps
+    logging.disable(logging.WARNING)
+    synth = FruSynth(seed=args.seed, string_mean=args.string_mean, array_mean=args.array_mean,
+                     records_mean=args.records_mean, p_max=args.p_max, record_types=args.record_types)
+    total_bytes = 0
+    start_time = time.perf_counter()
+    with FruArchive(args.archive, 'a' if args.append else 'w') as archive:
+        for _, img in synth.generate(args.count, args.start):
+            archive.append(img)
+            total_bytes += len(img)
+    elapsed = time.perf_counter() - start_time
+    print(f'{args.count} images, {total_bytes} bytes ({total_bytes / max(args.count, 1):.0f} avg) '
+          f'in {elapsed:.1f} s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
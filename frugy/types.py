@@ -13,15 +13,22 @@
 import bitstruct
 from collections import OrderedDict
 from enum import Enum
+from functools import lru_cache
 from itertools import zip_longest
+import random
 import uuid
 from bidict import bidict
 from ipaddress import IPv4Address
 import logging
+from frugy.codegen import compile_codec
+from frugy import metrics
 
 _format_version_default = 1
 _en_decode='ISO-8859-1'
 
+# Exceptions raised by the parsers when they run into malformed data
+malformed_data_errors = (bitstruct.Error, IndexError, KeyError, TypeError, ValueError, EOFError)
+
 def _sizeAlign(size: int, alignment: int) -> int:
     ''' return number of padding bytes & total length after padding '''
     numPadBytes = -size % alignment
@@ -34,28 +41,90 @@ def _grouper(n, iterable, padvalue=None):
 
 
 def ser_6bit(val: str) -> bytearray:
-    result = b''
+    result = []
     for chunk in _grouper(4, val.upper(), padvalue=' '):
         chunk = list(map(lambda x: ord(x) - 0x20, chunk))
         chunk.reverse()
         tmp = bitstruct.pack('u6'*4, *chunk)
-        result += tmp[::-1]
-    return result
+        result.append(tmp[::-1])
+    return b''.join(result)
 
 
 def deser_6bit(val: bytearray) -> str:
     result = b''
-    for chunk in _grouper(3, val, padvalue=' '):
+    for chunk in _grouper(3, val, padvalue=0):
         tmp = bitstruct.unpack('u6'*4, bytearray(reversed(chunk)))
         for x in tmp[::-1]:
             result += bytes((x + 0x20,))
     return result.decode(_en_decode)
 
 
+# Random generator for new GUIDs, see seed_guids()
+_guid_rng = None
+
+
+def seed_guids(seed=None):
+    ''' Generate GUIDs of fields created without a value (e.g. GuidField()) from a seeded random generator '''
+    ''' This makes generated images reproducible; seed None switches back to uuid4(). '''
+    global _guid_rng
+    _guid_rng = random.Random(seed) if seed is not None else None
+
+
+def new_guid():
+    ''' Random (version 4) GUID, reproducible if seed_guids() was called '''
+    if _guid_rng is None:
+        return uuid.uuid4()
+    return uuid.UUID(int=_guid_rng.getrandbits(128), version=4)
+
+
+@lru_cache(maxsize=None)
+def _calcsize(fmt: str) -> int:
+    ''' bitstruct.calcsize(), cached as sizes are computed for every field of a record '''
+    return bitstruct.calcsize(fmt)
+
+
+def write_into(buf, offset, data) -> int:
+    ''' Copy data into the preallocated buffer buf at offset, return offset behind it '''
+    end = offset + len(data)
+    buf[offset:end] = data
+    return end
+
+
+def _serialize_into(self, buf, offset) -> int:
+    ''' serialize_into() of fields serialized in one piece '''
+    return write_into(buf, offset, self.serialize())
+
+
+def reuse_record(record, value):
+    ''' Set record to value as if it was newly constructed from it, reusing the record object '''
+    ''' Records shared between FRUs (see frugy.store) are frozen; a new record is created instead. '''
+    if getattr(record, '_frozen', False):
+        return record.__class__(value)
+    if hasattr(record, 'reset'):
+        record.reset()
+    record.update(value)
+    return record
+
+
 def bin2hex_helper(val: bytearray):
     return ' '.join('%02x' % x for x in val)
 
 
+def diff_values(path, expected, actual):
+    ''' Return list with a difference report, or empty list if the values are equal '''
+    return [] if expected == actual else [f'{path}: expected {expected!r}, got {actual!r}']
+
+
+def diff_lists(path, expected, actual):
+    ''' Compare lists of fields / records element-wise '''
+    if len(expected) != len(actual):
+        return [f'{path}: expected {len(expected)} elements, got {len(actual)}']
+    result = []
+    for n, (e, a) in enumerate(zip(expected, actual)):
+        result += e.diff(a, f'{path}[{n}]')
+    return result
+
+
 class FixedField():
     ''' Fixed length field for numbers & bitfields '''
     _shortname = 'int'
@@ -65,19 +134,27 @@ class FixedField():
         self._default = default
         self._value = default
         self._div = div
-        self._constants_lookup = bidict(
-            constants) if constants is not None else None
+        # record classes hand in a bidict shared by all their instances
+        self._constants_lookup = bidict(constants) if constants is not None and not isinstance(
+            constants, bidict) else constants
 
     def bit_fmt(self) -> str:
         return self._format
 
     def bit_size(self) -> int:
-        return bitstruct.calcsize(self._format)
+        return _calcsize(self._format)
 
     def to_serialized(self):
+        ''' Integer to be packed; values with div are rounded to the nearest step '''
         tmp = self._value
         if self._div is not None:
-            tmp = int(tmp / self._div)
+            # round, as e.g. 0.29 / 0.01 is 28.999999999999996
+            return round(tmp / self._div)
+        if not isinstance(tmp, int):
+            # bitstruct would silently truncate floats and parse numeric strings
+            if isinstance(tmp, float) and tmp.is_integer():
+                return int(tmp)
+            raise bitstruct.Error(f'"{self._format}" requires an integer (got {tmp!r})')
         return tmp
 
     def from_serialized(self, value):
@@ -101,9 +178,20 @@ class FixedField():
         else:
             self._value = value
 
+    def reset(self):
+        ''' Restore default value '''
+        self._value = self._default
+
     def val_not_default(self):
         return self.to_dict() != self._default
 
+    def diff(self, other, path):
+        if self._div is not None and self._value is not None and other._value is not None:
+            # values are stored as multiples of div
+            if abs(self._value - other._value) <= self._div / 2 + 1e-9:
+                return []
+        return diff_values(path, self.to_dict(), other.to_dict())
+
 
 class StringFmt(Enum):
     BIN = 0b00
@@ -120,6 +208,7 @@ class StringField():
         if default is None:
             print(f'ERROR: {parent.__class__.__name__}')
         self._format = format
+        self._default_format = format
         self._default = default
         self._value = default
 
@@ -174,9 +263,11 @@ class StringField():
         result = ser_fn(self._value)
         return ser_type_length(result) + result
 
+    serialize_into = _serialize_into
+
     def deserialize(self, input: bytearray) -> bytearray:
         def deser_plain(val: bytearray) -> str:
-            return val.decode(_en_decode)
+            return bytes(val).decode(_en_decode)
 
         def deser_bcd_plus(val: bytearray) -> str:
             result = ''
@@ -211,9 +302,17 @@ class StringField():
     def update(self, value):
         self._value = value
 
+    def reset(self):
+        ''' Restore default value and encoding '''
+        self._value = self._default
+        self._format = self._default_format
+
     def val_not_default(self):
         return self.to_dict() != self._default
 
+    def diff(self, other, path):
+        return diff_values(path, self.to_dict(), other.to_dict())
+
 
 class BytearrayField():
     ''' Variable length field containing a transparent bytearray, to handle stupid ambiguous multirecord payloads '''
@@ -238,13 +337,15 @@ class BytearrayField():
     def serialize(self) -> bytearray:
         return self._value
 
+    serialize_into = _serialize_into
+
     def deserialize(self, input: bytearray) -> bytearray:
         if self._num_elems_field:
             num_elems = self._parent._get(self._num_elems_field)
-            self._value = input[:num_elems]
+            self._value = bytearray(input[:num_elems])
             return input[num_elems:]
         else:
-            self._value = input
+            self._value = bytearray(input)
             return b''
 
     def to_dict(self):
@@ -254,9 +355,16 @@ class BytearrayField():
         self._value = bytearray.fromhex(
             value) if self._hex else value.encode(_en_decode)
 
+    def reset(self):
+        ''' Restore default value '''
+        self._value = self._default
+
     def val_not_default(self):
         return self.to_dict() != self._default
 
+    def diff(self, other, path):
+        return diff_values(path, self.to_dict(), other.to_dict())
+
 
 class FixedStringField():
     ''' Null-terminated string with fixed size buffer '''
@@ -273,10 +381,14 @@ class FixedStringField():
         return self._bufsize * 8
 
     def serialize(self) -> bytearray:
-        return self._value[:self._bufsize-1].encode(_en_decode) + self._null_term
+        result = self._value[:self._bufsize-1].encode(_en_decode) + self._null_term
+        # pad to the buffer size, as the following fields are at fixed offsets
+        return result.ljust(self._bufsize, self._null_term)
+
+    serialize_into = _serialize_into
 
     def deserialize(self, input: bytearray) -> bytearray:
-        tmp, remainder = input[:self._bufsize], input[self._bufsize:]
+        tmp, remainder = bytes(input[:self._bufsize]), input[self._bufsize:]
         if self._null_term in tmp:
             pos = tmp.index(self._null_term)
             tmp = tmp[:pos]
@@ -289,9 +401,16 @@ class FixedStringField():
     def update(self, value):
         self._value = value
 
+    def reset(self):
+        ''' Restore default value '''
+        self._value = self._default
+
     def val_not_default(self):
         return self.to_dict() != self._default
 
+    def diff(self, other, path):
+        return diff_values(path, self.to_dict(), other.to_dict())
+
 
 class CustomStringArray:
     ''' Platform Management FRU Information Storage Definition, Table 10-1, 11-1, 12-1 '''
@@ -315,10 +434,12 @@ class CustomStringArray:
         return [v.to_dict() for v in self.strings]
 
     def serialize(self):
-        result = b''
+        return b''.join([v.serialize() for v in self.strings] + [self._delimiter])
+
+    def serialize_into(self, buf, offset):
         for v in self.strings:
-            result += v.serialize()
-        return result + self._delimiter
+            offset = v.serialize_into(buf, offset)
+        return write_into(buf, offset, self._delimiter)
 
     def deserialize(self, input):
         self.strings = []
@@ -342,9 +463,15 @@ class CustomStringArray:
     def bit_size(self) -> int:
         return self.size_total() * 8
 
+    def reset(self):
+        self.strings = []
+
     def val_not_default(self):
         return len(self.strings) != 0
 
+    def diff(self, other, path):
+        return diff_lists(path, self.strings, other.strings)
+
 
 class IpV4Field():
     ''' Field containing a IPv4 address '''
@@ -356,12 +483,22 @@ class IpV4Field():
         self._default = default
         self._value = IPv4Address(default)
 
+    @classmethod
+    def _new_blank(cls, default='0.0.0.0', parent=None):
+        ''' Create field to be deserialized, without parsing the default '''
+        field = cls.__new__(cls)
+        field._default = default
+        field._value = None
+        return field
+
     def bit_size(self) -> int:
         return self._num_bytes * 8
 
     def serialize(self) -> bytearray:
         return int(self._value).to_bytes(self._num_bytes, 'big')
 
+    serialize_into = _serialize_into
+
     def deserialize(self, input: bytearray) -> bytearray:
         tmp, remainder = input[:self._num_bytes], input[self._num_bytes:]
         tmp = int.from_bytes(tmp, 'big')
@@ -374,9 +511,16 @@ class IpV4Field():
     def update(self, value):
         self._value = IPv4Address(value)
 
+    def reset(self):
+        ''' Restore default value '''
+        self._value = IPv4Address(self._default)
+
     def val_not_default(self):
         return self.to_dict() != self._default
 
+    def diff(self, other, path):
+        return diff_values(path, self.to_dict(), other.to_dict())
+
 
 class GuidField():
     ''' Field containing a 128-bit GUID '''
@@ -385,7 +529,14 @@ class GuidField():
     _uuid_len = 16
 
     def __init__(self, value=None, parent=None):
-        self._value = uuid.UUID(value) if value is not None else uuid.uuid4()
+        self._value = uuid.UUID(value) if value is not None else new_guid()
+
+    @classmethod
+    def _new_blank(cls, value=None, parent=None):
+        ''' Create field to be deserialized, without generating a GUID '''
+        field = cls.__new__(cls)
+        field._value = None
+        return field
 
     def bit_size(self) -> int:
         return GuidField._uuid_len * 8
@@ -396,9 +547,11 @@ class GuidField():
     def serialize(self) -> bytearray:
         return self._value.bytes_le
 
+    serialize_into = _serialize_into
+
     def deserialize(self, input: bytearray) -> bytearray:
         payload, remainder = input[:GuidField._uuid_len], input[GuidField._uuid_len:]
-        self._value = uuid.UUID(bytes_le=payload)
+        self._value = uuid.UUID(bytes_le=bytes(payload))
         return remainder
 
     def to_dict(self):
@@ -407,6 +560,16 @@ class GuidField():
     def update(self, value):
         self._value = uuid.UUID(value)
 
+    def diff(self, other, path):
+        return diff_values(path, self.to_dict(), other.to_dict())
+
+
+@lru_cache(maxsize=None)
+def _is_fixed_size(cls):
+    # imported here, frugy.columnar depends on this module
+    from frugy.columnar import is_fixed_size
+    return is_fixed_size(cls)
+
 
 class ArrayField():
     ''' Field containing an array of instances of another record '''
@@ -415,15 +578,29 @@ class ArrayField():
     def __init__(self, cls, parent=None, initdict=None, num_elems_field=None):
         self._parent = parent
         self._cls = cls
+        # elements are overwritten by the parsed data, so skip their default initialization
+        self._new_elem = getattr(cls, '_new_blank', cls)
         self._records = []
+        # records dropped by reset(), to be reused by update()
+        self._spare = []
+        # raw bytes of parsed fixed-size elements, for columns(); None if set from values
+        self._payload = None
         self._num_elems_field = num_elems_field
         if initdict is not None:
             self.update(initdict)
 
+    def reset(self):
+        self._spare, self._records = self._records or self._spare, []
+        self._payload = None
+
     def update(self, initdict):
+        ''' Set elements from list of values; existing element objects are reused '''
+        spare = self._records or self._spare
         self._records = []
-        for v in initdict:
-            self._records.append(self._cls(v))
+        self._spare = []
+        self._payload = None
+        for n, v in enumerate(initdict):
+            self._records.append(reuse_record(spare[n], v) if n < len(spare) else self._cls(v))
 
     def __repr__(self):
         return self.to_dict().__repr__()
@@ -437,10 +614,12 @@ class ArrayField():
             self._parent._set(self._num_elems_field, self.num_elems())
 
     def serialize(self):
-        result = b''
+        return b''.join([f.serialize() for f in self._records])
+
+    def serialize_into(self, buf, offset):
         for f in self._records:
-            result += f.serialize()
-        return result
+            offset = f.serialize_into(buf, offset)
+        return offset
 
     def deserialize(self, input):
         self._records = []
@@ -450,12 +629,21 @@ class ArrayField():
             num_elems = self._parent._get(self._num_elems_field)
 
         while len(remainder) and num_elems != 0:
-            record = self._cls()
+            record = self._new_elem()
+            len_prev = len(remainder)
             remainder = record.deserialize(remainder)
+            if len(remainder) == len_prev:
+                raise RuntimeError(f'{self._cls.__name__}: array element without content')
             self._records.append(record)
             if num_elems is not None:
                 num_elems -= 1
 
+        # only arrays of fixed-size records are decoded by columns() from their raw bytes;
+        # a copy, input may be a view of an mmap'ed archive that is closed later
+        if _is_fixed_size(self._cls):
+            self._payload = bytes(input[:len(input) - len(remainder)])
+        else:
+            self._payload = None
         return remainder
 
     def bit_size(self):
@@ -470,48 +658,111 @@ class ArrayField():
     def val_not_default(self):
         return self.num_elems() != 0
 
+    def diff(self, other, path):
+        return diff_lists(path, self._records, other._records)
+
+    def columns(self):
+        ''' Decode the array into a NumPy structured array, one column per field '''
+        ''' Only available for arrays of fixed-size records, see frugy.columnar. Parsed arrays
+        are decoded from the raw bytes of the image, without going through the element objects. '''
+        from frugy.columnar import decode_columns
+        payload = self._payload if self._payload is not None else self.serialize()
+        return decode_columns(self._cls, payload)
+
 
 class FruAreaBase:
     ''' Common base class for FRU areas '''
 
     _mergeBitfield = False
 
+    # Set on records shared between several FRUs (see frugy.store)
+    _frozen = False
+
+    # Special accessors _get_<key> / _set_<key> by key, see _build_accessors()
+    _getters = {}
+    _setters = {}
+
+    # Field constructors per schema entry, see _field_constructors()
+    _fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        ''' Replace generic _serialize / _deserialize with code generated from _schema, unless defined by cls '''
+        ''' and build the accessor and field constructor tables '''
+        super().__init_subclass__(**kwargs)
+        if hasattr(cls, '_schema'):
+            compile_codec(cls)
+            cls._fields = cls._field_constructors()
+        cls._build_accessors()
+
+    @classmethod
+    def _field_constructors(cls):
+        ''' Per schema entry: (name, field class, constructor for decoding, args, kwargs) '''
+        ''' Constants are turned into a bidict once per class, instead of once per field object. '''
+        result = []
+        for entry in cls._schema:
+            kwargs = dict(entry[3]) if len(entry) > 3 else {}
+            if kwargs.get('constants') is not None:
+                kwargs['constants'] = bidict(kwargs['constants'])
+            args = (entry[2],) if len(entry) > 2 else ()
+            result.append((entry[0], entry[1], getattr(entry[1], '_new_blank', entry[1]), args, kwargs))
+        return result
+
+    @classmethod
+    def _build_accessors(cls):
+        ''' Collect the special accessors of a class, so item access doesn't look them up by name '''
+        ''' Accessors added to a class after its creation need another call of this. '''
+        cls._getters = {name[len('_get_'):]: getattr(cls, name) for name in dir(cls) if name.startswith('_get_')}
+        cls._setters = {name[len('_set_'):]: getattr(cls, name) for name in dir(cls) if name.startswith('_set_')}
+
     def __init__(self, initdict=None):
         self._dict = OrderedDict()
-        for v in self._schema:
-            kwargs = v[3] if len(v) > 3 else {}
-            obj = v[1]
-            if len(v) > 2:
-                obj = obj(v[2], parent=self, **kwargs)
-            else:
-                obj = obj(parent=self, **kwargs)
-            self._dict[v[0]] = obj
+        for name, field_cls, _, args, kwargs in self._fields:
+            self._dict[name] = field_cls(*args, parent=self, **kwargs)
 
         if initdict is not None:
             self.update(initdict)
 
+    @classmethod
+    def _new_blank(cls):
+        ''' Create record to be deserialized, skipping the initialization of default values '''
+        ''' Fields like GuidField don't generate (random) values only to have them overwritten. '''
+        record = cls.__new__(cls)
+        record._dict = OrderedDict()
+        for name, _, new_blank, args, kwargs in cls._fields:
+            record._dict[name] = new_blank(*args, parent=record, **kwargs)
+        return record
+
+    @classmethod
+    def from_bytes(cls, input):
+        ''' Decode a record, return (record, remainder of input) '''
+        record = cls._new_blank()
+        return record, record.deserialize(input)
+
     # dict interface
 
     def __getitem__(self, key):
         # check for special accessor
-        fname = f'_get_{key}'
-        if hasattr(self, fname):
-            return getattr(self, fname)()
+        getter = self._getters.get(key)
+        if getter is not None:
+            return getter(self)
         else:
             # use generic accessor
             return self._get(key)
 
     def __setitem__(self, key, value):
+        if self._frozen:
+            raise RuntimeError(
+                f'{self.__class__.__name__} is shared between FRUs and can\'t be modified')
         # check for special accessor
-        fname = f'_set_{key}'
-        if hasattr(self, fname):
-            getattr(self, fname)(value)
+        setter = self._setters.get(key)
+        if setter is not None:
+            setter(self, value)
         else:
             # use generic accessor
             self._set(key, value)
 
     def __contains__(self, key):
-        return hasattr(self, f'_set_{key}') or key in self._dict
+        return key in self._setters or key in self._dict
 
     def __repr__(self):
         return repr(self.to_dict())
@@ -520,6 +771,14 @@ class FruAreaBase:
         for k, v in src.items():
             self[k] = v
 
+    def reset(self):
+        ''' Restore default values of all fields '''
+        if self._frozen:
+            raise RuntimeError(
+                f'{self.__class__.__name__} is shared between FRUs and can\'t be modified')
+        for v in self._dict.values():
+            v.reset()
+
     def to_dict(self):
         # Fields starting with _ are ignored by convention (reserved values).
         return {
@@ -527,6 +786,21 @@ class FruAreaBase:
             if not k.startswith('_') and self._dict[k].val_not_default()
         }
 
+    def diff(self, other, path):
+        ''' Compare field by field with another record, return list of differences '''
+        if self.__class__ is not other.__class__:
+            return [f'{path}: expected {self.__class__.__name__}, got {other.__class__.__name__}']
+        result = []
+        for k, v in self._dict.items():
+            result += v.diff(other._dict[k], f'{path}.{k}')
+        return result
+
+    @classmethod
+    def numpy_dtype(cls):
+        ''' NumPy structured dtype of a decoded record, for fixed-size record classes '''
+        from frugy.columnar import columnar_dtype
+        return columnar_dtype(cls)
+
     # accessors
 
     def _get(self, key):
@@ -551,42 +825,54 @@ class FruAreaBase:
     def size_total(self) -> int:
         return self.size_payload()
 
-    def _serialize(self) -> bytearray:
+    def _serialize_chunks(self):
+        ''' yield (field names, serialized bytes) for each contiguous chunk of the payload '''
+        ''' Consecutive FixedFields are packed into one bitfield chunk. '''
         for v in self._dict.values():
             if hasattr(v, 'pre_serialize'):
                 v.pre_serialize()
 
-        result = b''
         bit_fmt = ''
+        bit_names = []
         bit_values = []
 
         def serialize_bitfield():
-            nonlocal bit_fmt, bit_values
-            if bit_fmt == '':
-                return b''
             if not self._mergeBitfield:
-                bits = bitstruct.pack(bit_fmt + '<', *bit_values)
+                return bitstruct.pack(bit_fmt + '<', *bit_values)
             else:
-                bits = bitstruct.pack(bit_fmt, *bit_values)[::-1]
-            bit_fmt = ''
-            bit_values = []
-            return bits
+                return bitstruct.pack(bit_fmt, *bit_values)[::-1]
 
-        for v in self._dict.values():
+        for k, v in self._dict.items():
             if hasattr(v, 'bit_fmt'):
                 bit_fmt += v.bit_fmt()
+                bit_names.append(k)
                 bit_values.append(v.to_serialized())
             else:
                 # before any other type is serialized, serialize bitfield first
-                result += serialize_bitfield()
-                result += v.serialize()
+                if bit_fmt != '':
+                    yield bit_names, serialize_bitfield()
+                    bit_fmt, bit_names, bit_values = '', [], []
+                yield [k], v.serialize()
         # finish serializing bitfield, if anything is left
-        result += serialize_bitfield()
-        return result
+        if bit_fmt != '':
+            yield bit_names, serialize_bitfield()
+
+    def _serialize(self) -> bytearray:
+        return b''.join(chunk for _, chunk in self._serialize_chunks())
+
+    def _serialize_into(self, buf, offset) -> int:
+        for _, chunk in self._serialize_chunks():
+            offset = write_into(buf, offset, chunk)
+        return offset
 
     def serialize(self) -> bytearray:
         return self._serialize()
 
+    def serialize_into(self, buf, offset) -> int:
+        ''' Write serialized record into the preallocated buffer buf at offset '''
+        ''' Returns the offset behind the record; buf has to hold size_total() bytes from offset. '''
+        return self._serialize_into(buf, offset)
+
     def _deserialize(self, input: bytearray):
         remainder = input
         bit_fmt = ''
@@ -650,14 +936,22 @@ class FruAreaChecksummed(FruAreaBase):
         return n
 
     def serialize(self) -> bytearray:
-        payload = self._prologue()
-        payload += self._serialize()
-        return payload + self._epilogue(payload)
+        buf = bytearray(self.size_total())
+        self.serialize_into(buf, 0)
+        return bytes(buf)
+
+    def serialize_into(self, buf, offset) -> int:
+        start = offset
+        offset = write_into(buf, offset, self._prologue())
+        offset = self._serialize_into(buf, offset)
+        return write_into(buf, offset, self._epilogue(memoryview(buf)[start:offset]))
 
     def _verify_epilogue(self, input: bytearray, offs: int) -> bytearray:
         payload = input[:offs]
         ep = self._epilogue(payload)
         vfy, remainder = input[offs:offs+len(ep)], input[offs+len(ep):]
+        if ep != vfy:
+            metrics.checksum_errors.inc((self.__class__.__name__,))
         if ep != vfy and not self.ignore_checksum_errors:
             raise RuntimeError(
                 f'padding or checksum verify error in {self.__class__.__name__}: expected {bin2hex_helper(ep)}, received {bin2hex_helper(vfy)}')
@@ -671,9 +965,11 @@ class FruAreaChecksummed(FruAreaBase):
 class FruAreaVersioned(FruAreaChecksummed):
     ''' FRU area featuring a version field '''
 
-    def __init__(self, initdict=None):
+    _format_version = _format_version_default
+
+    def reset(self):
+        super().reset()
         self._format_version = _format_version_default
-        super().__init__(initdict=initdict)
 
     def _set_format_version(self, val):
         self._format_version = val
@@ -724,6 +1020,8 @@ class FruAreaSized(FruAreaVersioned):
         self._deserialize(input[2:area_len])
         # The remainder may have arbitrary padding, so just check the last byte, and return only stuff that's behind our area
         cksum = (-sum(input[:area_len])) & 0xff
+        if cksum != 0:
+            metrics.checksum_errors.inc((self.__class__.__name__,))
         if cksum != 0 and not self.ignore_checksum_errors:
             raise RuntimeError(
                 f'{self.__class__.__name__}: checksum doesn\'t add up to zero')
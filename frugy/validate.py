@@ -0,0 +1,483 @@
+###########################################################################
+#      ____  _____________  __    __  __ _           _____ ___   _        #
+#     / __ \/ ____/ ___/\ \/ /   |  \/  (_)__ _ _ __|_   _/ __| /_\  (R)  #
+#    / / / / __/  \__ \  \  /    | |\/| | / _| '_/ _ \| || (__ / _ \      #
+#   / /_/ / /___ ___/ /  / /     |_|  |_|_\__|_| \___/|_| \___/_/ \_\     #
+#  /_____/_____//____/  /_/      T  E  C  H  N  O  L  O  G  Y   L A B     #
+#                                                                         #
+#          Copyright 2021 Deutsches Elektronen-Synchrotron DESY.          #
+#                  SPDX-License-Identifier: BSD-3-Clause                  #
+#                                                                         #
+###########################################################################
+
+''' Validation of FRU description dicts (as loaded from YAML) against the record schemas
+
+A JSON Schema is derived from the _schema of every registered area and record class.
+It is exported as-is for editors (json_schema()), and compiled into a tree of checker
+closures for validating dicts in one pass, reporting all errors with their paths.
+
+Record classes whose dict representation differs from their _schema provide
+_json_schema (replacing the derived schema) or _json_schema_extra ('properties' to add
+or override, and additionally 'required' property names).
+'''
+
+from datetime import datetime
+import ipaddress
+import re
+import uuid
+
+from frugy.fru_registry import FruRecordType, rec_enumerate, rec_generation, rec_lookup_by_name
+# register all areas and records before the schema is derived
+import frugy.fru
+import frugy.areas
+import frugy.multirecords
+from frugy.types import FixedField, StringField, BytearrayField, FixedStringField, \
+    CustomStringArray, IpV4Field, GuidField, ArrayField
+
+_unsigned_fmt = re.compile(r'^u(\d+)$')
+
+# type/length byte of IPMI strings has 6 bits for the length
+_string_max_len = 63
+# strings are encoded as ISO-8859-1
+_latin1_pattern = '^[\\u0000-\\u00ff]*$'
+
+_area_names = ['ChassisInfo', 'BoardInfo', 'ProductInfo']
+_multirecord_types = [FruRecordType.ipmi_multirecord, FruRecordType.picmg_multirecord,
+                      FruRecordType.fmc_multirecord, FruRecordType.oem_multirecord]
+
+
+def _entry_kwargs(entry):
+    return entry[3] if len(entry) > 3 else {}
+
+
+def _fixed_width(cls, name):
+    for e in cls._schema:
+        if e[0] == name:
+            return int(_unsigned_fmt.match(e[2]).group(1))
+    raise KeyError(name)
+
+
+def uint_schema(width):
+    return {'type': 'integer', 'minimum': 0, 'maximum': (1 << width) - 1}
+
+
+def _fixed_schema(cls, entry):
+    kwargs = _entry_kwargs(entry)
+    width = int(_unsigned_fmt.match(entry[2]).group(1))
+    div = kwargs.get('div')
+    if div is not None:
+        result = {'type': 'number', 'minimum': 0, 'maximum': round(((1 << width) - 1) * div, 9)}
+        if isinstance(div, int):
+            result['multipleOf'] = div
+        else:
+            # validators check multipleOf by float division, which rejects e.g. 0.3 for 0.1;
+            # the step is kept as annotation (values are rounded to it when encoding)
+            result['x-frugy-div'] = div
+    else:
+        result = uint_schema(width)
+    constants = kwargs.get('constants')
+    if constants is not None:
+        result = {'anyOf': [{'enum': list(constants.keys())}, result]}
+    return result
+
+
+def _string_schema(cls, entry):
+    return {'type': 'string', 'maxLength': _string_max_len, 'pattern': _latin1_pattern}
+
+
+def _bytearray_schema(cls, entry):
+    if _entry_kwargs(entry).get('hex', True):
+        return {'type': 'string', 'pattern': '^[0-9a-fA-F\\s]*$'}
+    return {'type': 'string', 'pattern': _latin1_pattern}
+
+
+def _fixed_string_schema(cls, entry):
+    # one byte of the buffer is taken by the null terminator
+    return {'type': 'string', 'maxLength': entry[2] - 1, 'pattern': _latin1_pattern}
+
+
+def _custom_string_array_schema(cls, entry):
+    return {'type': 'array', 'items': _string_schema(cls, entry)}
+
+
+def _ipv4_schema(cls, entry):
+    return {'type': 'string', 'format': 'ipv4'}
+
+
+def _guid_schema(cls, entry):
+    return {'type': 'string', 'format': 'uuid'}
+
+
+def _array_schema(cls, entry):
+    elem = entry[2]
+    if elem is GuidField:
+        items = _guid_schema(cls, entry)
+    else:
+        items = {'$ref': f'#/$defs/{elem.__name__}'}
+    result = {'type': 'array', 'items': items}
+    count_field = _entry_kwargs(entry).get('num_elems_field')
+    if count_field is not None:
+        result['maxItems'] = (1 << _fixed_width(cls, count_field)) - 1
+    return result
+
+
+_field_schemas = {
+    FixedField: _fixed_schema,
+    StringField: _string_schema,
+    BytearrayField: _bytearray_schema,
+    FixedStringField: _fixed_string_schema,
+    CustomStringArray: _custom_string_array_schema,
+    IpV4Field: _ipv4_schema,
+    GuidField: _guid_schema,
+    ArrayField: _array_schema,
+}
+
+
+def record_schema(cls):
+    ''' JSON Schema of the dict representation of an area or record class '''
+    if '_json_schema' in cls.__dict__:
+        return dict(cls._json_schema)
+
+    properties = {}
+    required = []
+    for entry in cls._schema:
+        name = entry[0]
+        if name.startswith('_'):
+            continue
+        schema_fn = _field_schemas.get(entry[1])
+        properties[name] = schema_fn(cls, entry) if schema_fn is not None else {}
+        if entry[1] is FixedField and _entry_kwargs(entry).get('default') is None:
+            required.append(name)
+
+    extra = getattr(cls, '_json_schema_extra', {})
+    properties.update(extra.get('properties', {}))
+    required += [r for r in extra.get('required', []) if r not in required]
+
+    if hasattr(cls, '_type_id'):
+        # multirecord: 'type' selects the record class
+        properties = {'type': {'const': cls.__name__}, **properties}
+        required.insert(0, 'type')
+
+    result = {
+        'description': str(cls.__doc__).strip(),
+        'type': 'object',
+        'properties': properties,
+        'additionalProperties': False,
+    }
+    if required:
+        result['required'] = required
+    return result
+
+
+def _add_defs(cls, defs):
+    ''' Add schema of cls and of all record classes used in its arrays '''
+    if cls.__name__ in defs:
+        return
+    defs[cls.__name__] = record_schema(cls)
+    for entry in cls._schema:
+        if entry[1] is ArrayField and hasattr(entry[2], '_schema'):
+            _add_defs(entry[2], defs)
+
+
+def json_schema(load_plugins=True):
+    ''' JSON Schema of a complete FRU description, as loaded from YAML '''
+    ''' Records of plugins not loaded yet are only included if load_plugins is True. '''
+    defs = {}
+    for cls in rec_enumerate(load_plugins=load_plugins):
+        if hasattr(cls, '_schema') and cls.__name__ != 'CommonHeader':
+            _add_defs(cls, defs)
+    multirecords = [cls.__name__ for cls in rec_enumerate(_multirecord_types, load_plugins)
+                    if hasattr(cls, '_schema')]
+
+    properties = {name: {'$ref': f'#/$defs/{name}'} for name in _area_names}
+    properties['MultirecordArea'] = {
+        'type': 'array',
+        'items': {'oneOf': [{'$ref': f'#/$defs/{name}'} for name in multirecords]},
+    }
+    return {
+        '$schema': 'https://json-schema.org/draft/2020-12/schema',
+        'title': 'frugy FRU description',
+        'type': 'object',
+        'properties': properties,
+        'additionalProperties': False,
+        '$defs': defs,
+    }
+
+
+# Compiler from JSON Schema to checker functions check(value, path, errors)
+
+def _join(path, key):
+    return f'{path}.{key}' if path else str(key)
+
+
+def _is_type(value, t):
+    if t == 'integer':
+        return isinstance(value, int) and not isinstance(value, bool)
+    if t == 'number':
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return isinstance(value, {
+        'string': str, 'array': list, 'object': dict, 'boolean': bool, 'null': type(None)
+    }[t])
+
+
+def _is_ipv4(value):
+    try:
+        ipaddress.IPv4Address(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _is_uuid(value):
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _is_datetime(value):
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+_formats = {
+    'ipv4': _is_ipv4,
+    'uuid': _is_uuid,
+    'date-time': _is_datetime,
+}
+
+
+class _Compiler:
+    def __init__(self, schema):
+        self._defs = schema.get('$defs', {})
+        self._compiled_defs = {}
+
+    def ref(self, name):
+        ''' Checker of a definition; compiled once, even if referenced from many places '''
+        if name not in self._compiled_defs:
+            slot = []
+            # placeholder, in case the definition is (indirectly) recursive
+            self._compiled_defs[name] = lambda value, path, errors: slot[0](value, path, errors)
+            slot.append(self.compile(self._defs[name]))
+            self._compiled_defs[name] = slot[0]
+        return self._compiled_defs[name]
+
+    def compile(self, schema):
+        checks = []
+        if '$ref' in schema:
+            checks.append(self.ref(schema['$ref'].rsplit('/', 1)[-1]))
+        if 'anyOf' in schema:
+            checks.append(self._any_of([self.compile(s) for s in schema['anyOf']]))
+        if 'oneOf' in schema:
+            checks.append(self._one_of(schema['oneOf']))
+        if 'type' in schema:
+            checks.append(self._type(schema['type'], schema.get('format')))
+        if 'const' in schema:
+            checks.append(self._enum([schema['const']]))
+        if 'enum' in schema:
+            checks.append(self._enum(schema['enum']))
+        if 'minimum' in schema or 'maximum' in schema:
+            checks.append(self._range(schema.get('minimum'), schema.get('maximum')))
+        if 'maxLength' in schema:
+            checks.append(self._max_length(schema['maxLength']))
+        if 'pattern' in schema:
+            checks.append(self._pattern(schema['pattern']))
+        if schema.get('format') in _formats:
+            checks.append(self._format(schema['format']))
+        if 'minItems' in schema or 'maxItems' in schema:
+            checks.append(self._num_items(schema.get('minItems'), schema.get('maxItems')))
+        if 'items' in schema:
+            checks.append(self._items(self.compile(schema['items'])))
+        if 'properties' in schema:
+            checks.append(self._object(schema))
+
+        if len(checks) == 1:
+            return checks[0]
+
+        def check(value, path, errors):
+            num_errors = len(errors)
+            for c in checks:
+                c(value, path, errors)
+                if len(errors) != num_errors:
+                    # don't pile up follow-up errors of a value with wrong type or range
+                    return
+        return check
+
+    @staticmethod
+    def _type(types, fmt):
+        types = [types] if isinstance(types, str) else types
+        expected = ' or '.join(types)
+
+        def check(value, path, errors):
+            # YAML parses timestamps itself
+            if fmt == 'date-time' and isinstance(value, datetime):
+                return
+            if not any(_is_type(value, t) for t in types):
+                errors.append(f'{path}: expected {expected}, got {type(value).__name__} {value!r}')
+        return check
+
+    @staticmethod
+    def _enum(values):
+        allowed = set(values)
+
+        def check(value, path, errors):
+            if not isinstance(value, (str, int)) or value not in allowed:
+                errors.append(f'{path}: invalid value {value!r}, expected one of {", ".join(map(str, values))}')
+        return check
+
+    @staticmethod
+    def _range(minimum, maximum):
+        def check(value, path, errors):
+            if not _is_type(value, 'number'):
+                return
+            if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+                errors.append(f'{path}: value {value} out of range {minimum}..{maximum}')
+        return check
+
+    @staticmethod
+    def _max_length(max_len):
+        def check(value, path, errors):
+            if isinstance(value, str) and len(value) > max_len:
+                errors.append(f'{path}: string too long ({len(value)} > {max_len} characters)')
+        return check
+
+    @staticmethod
+    def _pattern(pattern):
+        regex = re.compile(pattern)
+
+        def check(value, path, errors):
+            if isinstance(value, str) and not regex.search(value):
+                errors.append(f'{path}: {value!r} does not match {pattern}')
+        return check
+
+    @staticmethod
+    def _format(fmt):
+        is_valid = _formats[fmt]
+
+        def check(value, path, errors):
+            if isinstance(value, str) and not is_valid(value):
+                errors.append(f'{path}: {value!r} is not a valid {fmt}')
+        return check
+
+    @staticmethod
+    def _num_items(min_items, max_items):
+        def check(value, path, errors):
+            if not isinstance(value, list):
+                return
+            if min_items is not None and len(value) < min_items:
+                errors.append(f'{path}: too few elements ({len(value)} < {min_items})')
+            if max_items is not None and len(value) > max_items:
+                errors.append(f'{path}: too many elements ({len(value)} > {max_items})')
+        return check
+
+    @staticmethod
+    def _items(item_check):
+        def check(value, path, errors):
+            if isinstance(value, list):
+                for n, v in enumerate(value):
+                    item_check(v, f'{path}[{n}]', errors)
+        return check
+
+    def _object(self, schema):
+        properties = {k: self.compile(v) for k, v in schema['properties'].items()}
+        required = schema.get('required', [])
+        closed = schema.get('additionalProperties', True) is False
+
+        def check(value, path, errors):
+            if not isinstance(value, dict):
+                errors.append(f'{path}: expected object, got {type(value).__name__}')
+                return
+            for k in required:
+                if k not in value:
+                    errors.append(f'{_join(path, k)}: missing')
+            for k, v in value.items():
+                prop_check = properties.get(k)
+                if prop_check is not None:
+                    prop_check(v, _join(path, k), errors)
+                elif closed:
+                    errors.append(f'{_join(path, k)}: unknown field')
+        return check
+
+    @staticmethod
+    def _any_of(alternatives):
+        def check(value, path, errors):
+            messages = []
+            for alt in alternatives:
+                alt_errors = []
+                alt(value, path, alt_errors)
+                if not alt_errors:
+                    return
+                msg = alt_errors[0]
+                messages.append(msg[len(path) + 2:] if msg.startswith(f'{path}: ') else msg)
+            errors.append(f'{path}: {" / ".join(messages)}')
+        return check
+
+    def _one_of(self, alternatives):
+        ''' Only discriminated unions are supported: every alternative is a record with a 'type' const '''
+        by_type = {}
+        for alt in alternatives:
+            name = alt['$ref'].rsplit('/', 1)[-1]
+            by_type[self._defs[name]['properties']['type']['const']] = self.ref(name)
+
+        def check(value, path, errors):
+            if not isinstance(value, dict):
+                errors.append(f'{path}: expected object, got {type(value).__name__}')
+                return
+            if 'type' not in value:
+                errors.append(f'{_join(path, "type")}: missing')
+                return
+            alt = by_type.get(value['type'])
+            if alt is None:
+                errors.append(f'{_join(path, "type")}: unknown record type {value["type"]!r}')
+                return
+            alt(value, path, errors)
+        return check
+
+
+def compile_schema(schema):
+    ''' Compile a JSON Schema into a checker function check(value, path, errors) '''
+    return _Compiler(schema).compile(schema)
+
+
+_validator = None
+_validator_generation = None
+
+
+def _load_multirecords(fru_dict):
+    ''' Load the plugins of multirecord types named in fru_dict, if not registered yet '''
+    records = fru_dict.get('MultirecordArea') if isinstance(fru_dict, dict) else None
+    if not isinstance(records, list):
+        return
+    for rec in records:
+        if isinstance(rec, dict) and isinstance(rec.get('type'), str):
+            try:
+                rec_lookup_by_name(rec['type'])
+            except KeyError:
+                # reported by the validator
+                pass
+
+
+def validate(fru_dict):
+    ''' Validate a FRU description dict, return list of error messages (empty if valid) '''
+    ''' Only plugins of the multirecords used are loaded. The validator is compiled on first
+    use, and again if records were registered or removed since. '''
+    global _validator, _validator_generation
+    _load_multirecords(fru_dict)
+    generation = rec_generation()
+    if _validator is None or _validator_generation != generation:
+        _validator = compile_schema(json_schema(load_plugins=False))
+        _validator_generation = generation
+    errors = []
+    _validator(fru_dict, '', errors)
+    return errors
+
+
+def check(fru_dict):
+    ''' Validate a FRU description dict, raise RuntimeError listing all errors '''
+    errors = validate(fru_dict)
+    if errors:
+        raise RuntimeError('invalid FRU description:\n' + '\n'.join(errors))
@@ -25,9 +25,12 @@ setuptools.setup(
     long_description_content_type='text/markdown',
     keywords='ipmi fru microtca amc fmc picmg vita',
     install_requires=requirements,
+    extras_require={
+        'numpy': ['numpy'],
+    },
     packages=packages,
     classifiers=[
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
         'Operating System :: OS Independent',
         'Environment :: Console',
         'License :: OSI Approved :: BSD License',
@@ -39,5 +42,5 @@ setuptools.setup(
             'frugy=frugy.cli:main',
         ],
     },
-    python_requires='>=3.6'
+    python_requires='>=3.7'
 )
@@ -0,0 +1,20 @@
+"""
+SPDX-License-Identifier: BSD-3-Clause
+Copyright (c) 2020 Deutsches Elektronen-Synchrotron DESY.
+See LICENSE.txt for license details.
+"""
+
+# Multirecord module loaded through a (mock) entry point by test_plugins
+
+from frugy.types import FixedField
+from frugy.multirecords import OemEntry, oem_multirecord
+
+
+@oem_multirecord(0xc0, 0x00abcd, 0x01)
+class PluginBoardRevision(OemEntry):
+    ''' Test plugin record '''
+
+    _schema = [
+        ('revision', FixedField, 'u8'),
+        ('variant', FixedField, 'u8'),
+    ]
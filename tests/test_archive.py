@@ -0,0 +1,114 @@
+"""
+SPDX-License-Identifier: BSD-3-Clause
+Copyright (c) 2020 Deutsches Elektronen-Synchrotron DESY.
+See LICENSE.txt for license details.
+"""
+
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest import mock
+from frugy.archive import FruArchive
+from frugy.fru import Fru
+
+
+class TestArchive(unittest.TestCase):
+    _bin_files = ['damc-fmc2zup.bin', 'dmmc-stamp.bin', 'drtm-clkft.bin']
+
+    def setUp(self):
+        self.images = []
+        for name in self._bin_files:
+            with open(os.path.join('tests/bin_files', name), 'rb') as f:
+                self.images.append((name, f.read()))
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.tmpdir.name, 'test.fra')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_write_read(self):
+        with FruArchive(self.fname, 'w') as arc:
+            for name, img in self.images:
+                arc.append(img, board_id=name)
+
+        with FruArchive(self.fname) as arc:
+            self.assertEqual(len(arc), len(self.images))
+            for (name, img), e, raw in zip(self.images, arc.entries, arc):
+                self.assertEqual(e.board_id, name)
+                self.assertEqual(e.sha1, hashlib.sha1(img).digest())
+                self.assertEqual(raw, img)
+            self.assertEqual(arc.find('dmmc-stamp.bin'), [1])
+
+            ref = Fru()
+            ref.load_bin('tests/bin_files/drtm-clkft.bin')
+            self.assertEqual(arc.load_fru(2).to_dict(), ref.to_dict())
+
+    def test_append(self):
+        with FruArchive(self.fname, 'w') as arc:
+            arc.append(self.images[0][1], board_id=self.images[0][0])
+        with FruArchive(self.fname, 'a') as arc:
+            for name, img in self.images[1:]:
+                arc.append(img, board_id=name)
+            # reading back an appended image flushes the index
+            self.assertEqual(arc.image(2), self.images[2][1])
+
+        with FruArchive(self.fname) as arc:
+            self.assertEqual([e.board_id for e, _ in arc.iter_frus()],
+                             [name for name, _ in self.images])
+
+    def test_interrupted_append(self):
+        ''' Archive stays readable, as of the last flush, if an append is interrupted '''
+        with FruArchive(self.fname, 'w') as arc:
+            arc.append(self.images[0][1], board_id=self.images[0][0])
+
+        # crash after writing the image
+        arc = FruArchive(self.fname, 'a')
+        arc.append(self.images[1][1], board_id=self.images[1][0])
+        arc._file.flush()
+        arc._unmap()
+        arc._file.close()
+
+        # crash after writing the new index, before switching the header over
+        arc = FruArchive(self.fname, 'a')
+        arc.append(self.images[2][1], board_id=self.images[2][0])
+        with mock.patch('os.fsync', side_effect=OSError('disk gone')):
+            with self.assertRaises(OSError):
+                arc.flush()
+        arc._unmap()
+        arc._file.close()
+
+        with FruArchive(self.fname, 'a') as arc:
+            self.assertEqual([e.board_id for e in arc.entries], [self.images[0][0]])
+            self.assertEqual(arc.image(0), self.images[0][1])
+            arc.append(self.images[1][1], board_id=self.images[1][0])
+        with FruArchive(self.fname) as arc:
+            self.assertEqual(list(arc), [img for _, img in self.images[:2]])
+
+    def test_zero_copy(self):
+        with FruArchive(self.fname, 'w') as arc:
+            arc.append(self.images[0][1])
+        with FruArchive(self.fname) as arc:
+            raw = arc.image(0)
+            self.assertIsInstance(raw, memoryview)
+            ref = Fru()
+            ref.deserialize(self.images[0][1])
+            self.assertEqual(arc.load_fru(0).to_dict(), ref.to_dict())
+        # still referenced after closing the archive
+        self.assertEqual(raw, self.images[0][1])
+
+    def test_corrupt(self):
+        with FruArchive(self.fname, 'w') as arc:
+            for name, img in self.images:
+                arc.append(img, board_id=name)
+        with open(self.fname, 'rb') as f:
+            data = f.read()
+        for size in [0, 16, len(data) - 4]:
+            with open(self.fname, 'wb') as f:
+                f.write(data[:size])
+            with self.assertRaises(RuntimeError):
+                FruArchive(self.fname)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+SPDX-License-Identifier: BSD-3-Clause
+Copyright (c) 2020 Deutsches Elektronen-Synchrotron DESY.
+See LICENSE.txt for license details.
+"""
+
+import os
+import unittest
+import bitstruct
+from frugy.fru import Fru
+from frugy.fru_registry import rec_enumerate
+from frugy.multirecords import MultirecordEntry
+from frugy.types import FruAreaBase
+
+
+def walk_records(obj):
+    ''' yield all schema based records of a FRU area, including array elements '''
+    if isinstance(obj, FruAreaBase):
+        yield obj
+    for record in getattr(obj, 'records', []):
+        yield from walk_records(record)
+    for field in getattr(obj, '_dict', {}).values():
+        for record in getattr(field, '_records', []):
+            yield from walk_records(record)
+
+
+class TestCodegen(unittest.TestCase):
+    def corpus(self):
+        for name in sorted(os.listdir('tests/bin_files')):
+            MultirecordEntry.opalkelly_workaround_enabled = name.startswith('opalkelly')
+            fru = Fru()
+            fru.load_bin(os.path.join('tests/bin_files', name))
+            yield fru
+        MultirecordEntry.opalkelly_workaround_enabled = False
+        for name in sorted(os.listdir('examples')):
+            fru = Fru()
+            fru.load_yaml(os.path.join('examples', name))
+            yield fru
+
+    def test_generated_codecs(self):
+        for cls in rec_enumerate():
+            if hasattr(cls, '_schema'):
+                self.assertIn('_codec_source', cls.__dict__, cls.__name__)
+
+    def test_corpus_vs_generic(self):
+        num_records = 0
+        for fru in self.corpus():
+            for area in fru.areas.values():
+                for record in walk_records(area):
+                    ser = record._serialize()
+                    self.assertEqual(ser, FruAreaBase._serialize(record))
+                    buf = bytearray(len(ser) + 1)
+                    self.assertEqual(record._serialize_into(buf, 1), len(ser) + 1)
+                    self.assertEqual(buf[1:], ser)
+
+                    generic = record.__class__()
+                    generated = record.__class__()
+                    self.assertEqual(generated._deserialize(ser),
+                                     FruAreaBase._deserialize(generic, ser))
+                    self.assertEqual(generated.to_dict(), generic.to_dict())
+                    num_records += 1
+        self.assertGreater(num_records, 400)
+
+    def test_errors(self):
+        from frugy.multirecords_picmg import SlotEntry
+        rec = SlotEntry({'site_no': 256, 'site_type': 'rtm', 'slot_no': 1, 'tier_no': 1,
+                         'slot_org_y': 0, 'slot_org_x': 0})
+        with self.assertRaises(bitstruct.Error):
+            FruAreaBase._serialize(rec)
+        with self.assertRaises(bitstruct.Error):
+            rec._serialize()
+        with self.assertRaises(bitstruct.Error):
+            rec._deserialize(b'\x01\x02')
+
+    def test_value_conversion(self):
+        ''' Generated codecs convert and reject values like FixedField.to_serialized '''
+        from frugy.multirecords_picmg import SlotEntry
+        values = {'site_no': 1, 'site_type': 'rtm', 'slot_no': 1, 'tier_no': 1, 'slot_org_y': 0, 'slot_org_x': 0}
+        ref = SlotEntry(values)._serialize()
+        for site_no in [1.0, True]:
+            rec = SlotEntry(dict(values, site_no=site_no))
+            self.assertEqual(rec._serialize(), ref)
+            self.assertEqual(FruAreaBase._serialize(rec), ref)
+        for site_no in [1.5, '1', None]:
+            rec = SlotEntry(dict(values, site_no=site_no))
+            with self.assertRaises(bitstruct.Error):
+                FruAreaBase._serialize(rec)
+            with self.assertRaises(bitstruct.Error):
+                rec._serialize()
+            with self.assertRaises(bitstruct.Error):
+                rec._serialize_into(bytearray(len(ref)), 0)
+
+    def test_hand_written(self):
+        ''' Methods a record class defines itself aren't replaced by generated ones '''
+        from frugy.types import FixedField
+
+        class HandWritten(FruAreaBase):
+            _schema = [('value', FixedField, 'u8')]
+
+            def _serialize(self):
+                return b'\x2a'
+
+        class Generated(FruAreaBase):
+            _schema = [('value', FixedField, 'u8')]
+
+        rec = HandWritten({'value': 1})
+        self.assertEqual(rec._serialize(), b'\x2a')
+        buf = bytearray(2)
+        self.assertEqual(rec._serialize_into(buf, 1), 2)
+        self.assertEqual(buf, b'\x00\x2a')
+        # not hand-written, so still generated
+        self.assertIn('_deserialize', HandWritten.__dict__)
+        rec._deserialize(b'\x07')
+        self.assertEqual(rec['value'], 7)
+        self.assertEqual(Generated({'value': 1})._serialize(), b'\x01')
+
+
+if __name__ == '__main__':
+    unittest.main()
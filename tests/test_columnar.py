@@ -0,0 +1,96 @@
+"""
+SPDX-License-Identifier: BSD-3-Clause
+Copyright (c) 2020 Deutsches Elektronen-Synchrotron DESY.
+See LICENSE.txt for license details.
+"""
+
+import glob
+import unittest
+from unittest import mock
+from frugy.fru import Fru
+from frugy.types import ArrayField
+from frugy.columnar import is_fixed_size, decode_columns
+from frugy.multirecords_picmg import AmcLinkDescriptor, SlotEntry
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _arrays(record):
+    for k, v in getattr(record, '_dict', {}).items():
+        if isinstance(v, ArrayField):
+            yield k, v
+            for r in v._records:
+                yield from _arrays(r)
+
+
+def _fixed_size_arrays(record):
+    return ((k, v) for k, v in _arrays(record) if is_fixed_size(v._cls))
+
+
+@unittest.skipIf(numpy is None, 'NumPy not installed')
+class TestColumnar(unittest.TestCase):
+    def test_corpus(self):
+        ''' Columnar decoding matches the per-record objects for all arrays in the examples '''
+        num_arrays = 0
+        for fname in sorted(glob.glob('examples/*.yml')):
+            fru = Fru()
+            fru.load_yaml(fname)
+            if 'MultirecordArea' not in fru.areas:
+                continue
+            for rec in fru.areas['MultirecordArea'].records:
+                for name, arr in _fixed_size_arrays(rec):
+                    cols = arr.columns()
+                    self.assertEqual(len(cols), arr.num_elems())
+                    for field in cols.dtype.names:
+                        expected = [r._dict[field].to_dict() for r in arr._records]
+                        self.assertEqual(cols[field].tolist(), expected, f'{fname} {name}.{field}')
+                    num_arrays += 1
+        self.assertGreater(num_arrays, 0)
+
+    def test_parsed_payload(self):
+        ''' Parsed arrays are decoded from the image bytes, not from the element objects '''
+        num_arrays = 0
+        for fname in sorted(glob.glob('tests/bin_files/*.bin')):
+            fru = Fru()
+            fru.load_bin(fname)
+            if 'MultirecordArea' not in fru.areas:
+                continue
+            for rec in fru.areas['MultirecordArea'].records:
+                # other arrays don't keep a copy of their bytes
+                for name, arr in _arrays(rec):
+                    if not is_fixed_size(arr._cls):
+                        self.assertIsNone(arr._payload, f'{fname} {name}')
+                for name, arr in _fixed_size_arrays(rec):
+                    with mock.patch.object(ArrayField, 'serialize', side_effect=AssertionError):
+                        cols = arr.columns()
+                    for field in cols.dtype.names:
+                        expected = [r._dict[field].to_dict() for r in arr._records]
+                        self.assertEqual(cols[field].tolist(), expected, f'{fname} {name}.{field}')
+                    num_arrays += 1
+                    arr.update(arr.to_dict()[:1])
+                    self.assertEqual(len(arr.columns()), 1)
+        self.assertGreater(num_arrays, 0)
+
+    def test_decode_buffer(self):
+        links = [AmcLinkDescriptor({
+            'asymm_match': 'match_10b', 'grouping_id': n, 'link_type_ext': 1,
+            'link_type': 'pcie' if n % 2 else 0x42, 'lane_flags': [1, n % 2, 0, 1], 'channel_id': n
+        }) for n in range(20)]
+        cols = decode_columns(AmcLinkDescriptor, b''.join(l.serialize() for l in links))
+        self.assertEqual(cols['grouping_id'].tolist(), list(range(20)))
+        self.assertEqual(cols['link_type'][:2].tolist(), [0x42, 'pcie'])
+        self.assertEqual(cols['asymm_match'][0], 'match_10b')
+        self.assertEqual(cols['_lane1_flag'].tolist(), [n % 2 for n in range(20)])
+        self.assertEqual(AmcLinkDescriptor.numpy_dtype(), cols.dtype)
+
+        with self.assertRaises(RuntimeError):
+            decode_columns(AmcLinkDescriptor, b'\x00' * 7)
+
+    def test_not_fixed_size(self):
+        self.assertTrue(is_fixed_size(SlotEntry))
+        self.assertFalse(is_fixed_size(Fru().factory('BoardInfo').__class__))
+        with self.assertRaises(ValueError):
+            decode_columns(Fru().factory('BoardInfo').__class__, b'')
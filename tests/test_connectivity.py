@@ -0,0 +1,111 @@
+"""
+SPDX-License-Identifier: BSD-3-Clause
+Copyright (c) 2020 Deutsches Elektronen-Synchrotron DESY.
+See LICENSE.txt for license details.
+"""
+
+import unittest
+from frugy.fru import Fru
+from frugy.connectivity import CrateConnectivity
+
+carrier = {
+    'MultirecordArea': [{
+        'type': 'CarrierP2pConnectivity',
+        'resource_descriptors': [{
+            'resource_type': 'amc', 'site_no': 1, 'port_descriptors': [
+                # AMC1 ports 4, 5 to AMC2 ports 4, 5; port 8 to on-carrier device 0
+                {'local_port': 4, 'remote_port': 4, 'resource_type': 'amc', 'site_no': 2},
+                {'local_port': 5, 'remote_port': 5, 'resource_type': 'amc', 'site_no': 2},
+                {'local_port': 8, 'remote_port': 0, 'resource_type': 'carrier', 'site_no': 0},
+            ]
+        }]
+    }, {
+        'type': 'CarrierClkP2pConnectivity',
+        'clk_p2p_resource_descriptors': [{
+            'resource_type': 'amc_module', 'dev_id': 1, 'p2p_clk_conn_descriptors': [
+                {'local_clock_id': 'TCLKA', 'remote_clock_id': 'TCLKA', 'resource_type': 'amc_module', 'dev_id': 2},
+                {'local_clock_id': 'TCLKB', 'remote_clock_id': 'TCLKB', 'resource_type': 'amc_module', 'dev_id': 2},
+            ]
+        }]
+    }, {
+        'type': 'CarrierBusedConnectivity',
+        'bused_connection_descriptors': [{'bused_device_descriptor': [
+            {'resource_id': 'AMC', 'amc_site': 1, 'port': 17},
+            {'resource_id': 'AMC', 'amc_site': 2, 'port': 17},
+        ]}]
+    }]
+}
+
+
+def module(asymm_match, ports, clock_role):
+    return {'MultirecordArea': [{
+        'type': 'PointToPointConnectivity',
+        'record_type': 'amc_module',
+        'channel_descriptors': [ports],
+        'link_descriptors': [{
+            'asymm_match': asymm_match, 'grouping_id': 0, 'link_type_ext': 1, 'link_type': 'ethernet',
+            'channel_id': 0, 'lane_flags': [1] * len(ports) + [0] * (4 - len(ports))
+        }]
+    }, {
+        'type': 'ClockConfig',
+        'resource_type': 'amc_module',
+        'dev_id': 0,
+        'conf_desc': [{
+            'clk_id': clk, 'activation': 'by_carrier',
+            'direct_clk_desc': [{
+                'pll_connect': 0, 'asymm_match': clock_role, 'family': 'unspecified',
+                'accuracy': 0, 'frequency': 100000000, 'freq_min': 100000000, 'freq_max': 100000000
+            }]
+        } for clk in ('TCLKA', 'TCLKB')]
+    }]}
+
+
+class TestConnectivity(unittest.TestCase):
+    def setUp(self):
+        self.crate = CrateConnectivity()
+        self.crate.add_carrier(Fru(carrier))
+        self.crate.add_module(1, Fru(module('match_10b', [4, 5, 6, 8], 'clk_source')))
+        self.crate.add_module(2, module('match_01b', [4], 'clk_source'))
+
+    def test_links(self):
+        pairs = {(a, b): links for a, b, links in self.crate.link_pairs()}
+        self.assertEqual(len(pairs[(('amc', 1), 4), (('amc', 2), 4)]), 1)
+        self.assertEqual(self.crate.remote((('amc', 2), 5)), (('amc', 1), 5))
+        unmatched = dict(self.crate.unmatched_ports())
+        self.assertIn('not described', unmatched[(('amc', 1), 5)])
+        self.assertEqual(unmatched[(('amc', 1), 6)], 'not connected')
+        # on-carrier device without own P2P record
+        self.assertNotIn((('amc', 1), 8), unmatched)
+        self.assertEqual(len(unmatched), 2)
+
+    def test_incompatible(self):
+        crate = CrateConnectivity()
+        crate.add_carrier(carrier)
+        crate.add_module(1, module('match_10b', [4], 'clk_source'))
+        crate.add_module(2, module('match_10b', [4], 'clk_receiver'))
+        unmatched = dict(crate.unmatched_ports())
+        self.assertIn('no compatible link type', unmatched[(('amc', 1), 4)])
+
+    def test_clocks(self):
+        self.assertEqual(list(self.crate.clock_pairs()), [])
+        self.assertEqual(len(self.crate.unmatched_clocks()), 4)
+
+        crate = CrateConnectivity()
+        crate.add_carrier(carrier)
+        crate.add_module(1, module('match_10b', [4], 'clk_source'))
+        crate.add_module(2, module('match_01b', [4], 'clk_receiver'))
+        self.assertEqual(sorted(crate.clock_pairs()), [
+            ((('amc', 1), 'TCLKA'), (('amc', 2), 'TCLKA')),
+            ((('amc', 1), 'TCLKB'), (('amc', 2), 'TCLKB')),
+        ])
+        self.assertEqual(crate.unmatched_clocks(), [])
+
+    def test_bus(self):
+        self.assertEqual(self.crate.bus_members((('amc', 2), 17)), [(('amc', 1), 17), (('amc', 2), 17)])
+        self.assertEqual(self.crate.bus_members((('amc', 3), 17)), [])
+
+    def test_example(self):
+        crate = CrateConnectivity()
+        crate.add_module(1, 'examples/damc-fmc2zup.yml')
+        self.assertTrue(crate.ports)
+        self.assertTrue(all(reason == 'not connected' for _, reason in crate.unmatched_ports()))
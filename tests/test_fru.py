@@ -5,9 +5,13 @@ See LICENSE.txt for license details.
 """
 
 import unittest
+import yaml
+from copy import deepcopy
 from datetime import datetime
 from frugy.fru import Fru
 from frugy.multirecords import MultirecordEntry
+from frugy.synth import FruSynth
+from frugy.store import RecordStore
 import os
 
 class TestFru(unittest.TestCase):
@@ -105,5 +109,161 @@ class TestFru(unittest.TestCase):
                     name_dest = os.path.join('examples', name_base + '.yml')
                     self.bin_to_yaml(name_src, name_dest)
 
+    def test_patch_bin(self):
+        fru = Fru()
+        fru.load_yaml('examples/damc-fmc2zup.yml')
+        img = fru.serialize()
+
+        def full_serialize(area, key, value):
+            ref = Fru(fru.to_dict())
+            ref.areas[area][key] = value
+            return ref.serialize()
+
+        # same length: patched in place, checksum adjusted
+        patched = Fru.patch_bin(img, {'BoardInfo.serial_number': '21Y01W4711'})
+        self.assertEqual(patched, full_serialize('BoardInfo', 'serial_number', '21Y01W4711'))
+
+        # bitfield member with special accessor
+        ts = datetime(2021, 6, 1, 12, 0)
+        patched = Fru.patch_bin(img, {'BoardInfo.mfg_date_time': ts})
+        self.assertEqual(patched, full_serialize('BoardInfo', 'mfg_date_time', ts))
+
+        # length change: falls back to full serialization, padded to old size
+        patched = Fru.patch_bin(img + b'\xff' * 16, {'ProductInfo.version': 'revC2'})
+        ref = full_serialize('ProductInfo', 'version', 'revC2')
+        self.assertEqual(patched[:len(ref)], ref)
+        self.assertEqual(len(patched), len(img) + 16)
+
+        with self.assertRaises(ValueError):
+            Fru.patch_bin(img, {'ChassisInfo.serial_number': '1234'})
+
+    def test_patch_bin_internal_use(self):
+        ''' An area growing into an internal use area behind it isn't patched in place '''
+        fru = Fru()
+        fru.load_yaml('examples/damc-fmc2zup.yml')
+        img = bytearray(fru.serialize(slack=64))
+        # internal use area (format version 1, opaque data) in the slack behind BoardInfo
+        board_offs = fru.header['board_info_offs']
+        internal_use_offs = board_offs + fru.areas['BoardInfo'].size_total() + 8
+        internal_use = b'\x01' + bytes(range(1, 16))
+        img[internal_use_offs:internal_use_offs + len(internal_use)] = internal_use
+        fru.header['internal_use_offs'] = internal_use_offs
+        img[:fru.header.size_total()] = fru.header.serialize()
+
+        serial_number = fru.areas['BoardInfo']['serial_number']
+        patched = Fru.patch_bin(img, {'BoardInfo.serial_number': serial_number + 'X'})
+        self.assertEqual(patched[internal_use_offs:internal_use_offs + len(internal_use)], internal_use)
+        parsed = Fru()
+        parsed.deserialize(patched)
+        self.assertEqual(parsed.areas['BoardInfo']['serial_number'], serial_number + 'X')
+
+        with self.assertRaisesRegex(RuntimeError, 'internal use area'):
+            Fru.patch_bin(img, {'BoardInfo.serial_number': serial_number + 'X' * 16})
+
+    def test_serialize_into(self):
+        fru = Fru()
+        fru.load_yaml('examples/damc-fmc2zup.yml')
+        img = fru.serialize()
+
+        buf = bytearray(b'\x55' * (len(img) + 8))
+        self.assertEqual(fru.serialize_into(buf, 4), len(img) + 4)
+        self.assertEqual(buf, b'\x55' * 4 + img + b'\x55' * 4)
+
+        padded = fru.serialize(eeprom_size=len(img) + 100)
+        self.assertEqual(padded, img + b'\xff' * 100)
+        with self.assertRaises(RuntimeError):
+            fru.serialize(eeprom_size=len(img) - 1)
+
+    def test_page_layout(self):
+        fru = Fru()
+        fru.load_yaml('examples/damc-fmc2zup.yml')
+        img = fru.serialize(eeprom_size=1024, page_size=32, slack=16)
+        for offs_key in Fru._area_table_lookup.values():
+            self.assertEqual(fru.header[offs_key] % 32, 0)
+        parsed = Fru()
+        parsed.deserialize(img)
+        self.assertEqual(parsed.to_dict(), fru.to_dict())
+
+        # area grows into its slack: only that area is rewritten
+        patched = Fru.patch_bin(img, {'BoardInfo.serial_number': fru.areas['BoardInfo']['serial_number'] + '-rev2'})
+        offs = fru.header['board_info_offs']
+        end = fru.header['product_info_offs']
+        self.assertEqual(patched[:offs], img[:offs])
+        self.assertEqual(patched[end:], img[end:])
+        fru.areas['BoardInfo']['serial_number'] += '-rev2'
+        self.assertEqual(patched, fru.serialize(eeprom_size=1024, page_size=32, slack=16))
+
+        with self.assertRaises(ValueError):
+            fru.serialize(page_size=12)
+        with self.assertRaises(ValueError):
+            fru.serialize(slack=-16)
+        # the common header can't point behind 2040 bytes
+        with self.assertRaisesRegex(RuntimeError, 'exceeds 2040 bytes'):
+            fru.serialize(page_size=1024)
+
+    def test_verify_roundtrip(self):
+        fru = Fru()
+        fru.load_yaml('examples/damc-fmc2zup.yml')
+        self.assertEqual(fru.verify_roundtrip(), [])
+
+        fru = Fru({
+            'BoardInfo': {'manufacturer': 'DESY'},
+            'MultirecordArea': [
+                # within the 10 mV resolution
+                {'type': 'DCOutput', 'standby_enable': 0, 'output_number': 'P1_VADJ',
+                 'nominal_voltage': 2504, 'max_neg_voltage': 0, 'max_pos_voltage': 0,
+                 'max_noise_pk2pk': 0, 'min_current_draw': 0, 'max_current_draw': 0},
+                {'type': 'CarrierManagerIPLink', 'username': 'a_rather_long_username'},
+            ]
+        })
+        self.assertEqual(fru.verify_roundtrip(), [
+            "MultirecordArea[1].username: expected 'a_rather_long_username', got 'a_rather_long_us'"
+        ])
+        # broken checksum, the last record is skipped by the parser
+        img = bytearray(fru.serialize())
+        img[-1] ^= 0xff
+        self.assertEqual(fru.verify_roundtrip(img), [
+            'MultirecordArea: expected 2 elements, got 1'
+        ])
+
+    def test_initdict_unmodified(self):
+        ''' Building a FRU leaves the description it is built from unchanged '''
+        for name in sorted(os.listdir('examples')):
+            with open(os.path.join('examples', name), 'r') as f:
+                fru_dict = yaml.safe_load(f)
+            ref = deepcopy(fru_dict)
+            Fru(fru_dict)
+            self.assertEqual(fru_dict, ref, name)
+
+        synth = FruSynth(seed=3, p_optional=1.0)
+        for rec_type in synth.record_types:
+            rec_dict = synth.record_dict(rec_type)
+            ref = deepcopy(rec_dict)
+            Fru({'MultirecordArea': [rec_dict]})
+            self.assertEqual(rec_dict, ref, rec_type)
+
+    def test_update_in_place(self):
+        ''' In-place updates build the same image as a new FRU, reusing the objects '''
+        fru = Fru()
+        fru.load_bin('tests/bin_files/damc-fmc2zup.bin', store=RecordStore())
+        shared = fru.areas['BoardInfo']
+        shared_dict = shared.to_dict()
+        for name in sorted(os.listdir('examples')) * 2:
+            with open(os.path.join('examples', name), 'r') as f:
+                fru_dict = yaml.safe_load(f)
+            areas = dict(fru.areas)
+            records = list(fru.areas['MultirecordArea'].records) if 'MultirecordArea' in areas else []
+            fru.update(fru_dict, in_place=True)
+            self.assertEqual(fru.serialize(), Fru(fru_dict).serialize(), name)
+            for k, area in fru.areas.items():
+                if k in areas and areas[k] is not shared:
+                    self.assertIs(area, areas[k], name)
+            new_records = fru.areas['MultirecordArea'].records if 'MultirecordArea' in fru.areas else []
+            for old, new in zip(records, new_records):
+                if old.__class__ is new.__class__ and not old._frozen:
+                    self.assertIs(new, old, name)
+        # records shared by the store are replaced, not modified
+        self.assertEqual(shared.to_dict(), shared_dict)
+
 if __name__ == '__main__':
     unittest.main()
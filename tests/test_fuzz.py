@@ -0,0 +1,49 @@
+"""
+SPDX-License-Identifier: BSD-3-Clause
+Copyright (c) 2020 Deutsches Elektronen-Synchrotron DESY.
+See LICENSE.txt for license details.
+"""
+
+import glob
+import logging
+import unittest
+from frugy.fru import Fru
+from frugy.fuzz import fuzz
+
+
+class TestFuzz(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.WARNING)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_no_crashes(self):
+        corpus = []
+        for fname in sorted(glob.glob('tests/bin_files/*.bin')):
+            with open(fname, 'rb') as f:
+                corpus.append((fname, f.read()))
+        crashes = [r for r in fuzz(corpus, iterations=50, seed=1) if r.outcome == 'crash']
+        self.assertEqual(crashes, [])
+
+    def test_truncated(self):
+        with open('tests/bin_files/damc-fmc2zup.bin', 'rb') as f:
+            img = f.read()
+        for n in range(0, len(img), 7):
+            try:
+                Fru().deserialize(img[:n])
+            except RuntimeError:
+                pass
+
+    def test_max_image_size(self):
+        with open('tests/bin_files/damc-fmc2zup.bin', 'rb') as f:
+            img = f.read()
+        ref = Fru()
+        ref.deserialize(img)
+        # e.g. raw dump of a larger EEPROM: only the leading max_image_size bytes are parsed
+        fru = Fru()
+        logging.disable(logging.NOTSET)
+        with self.assertLogs(level='INFO') as cm:
+            fru.deserialize(img + b'\xff' * Fru.max_image_size)
+        self.assertIn(f'Ignoring {len(img)} bytes', cm.output[0])
+        self.assertEqual(fru.to_dict(), ref.to_dict())
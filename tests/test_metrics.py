@@ -0,0 +1,78 @@
+"""
+SPDX-License-Identifier: BSD-3-Clause
+Copyright (c) 2020 Deutsches Elektronen-Synchrotron DESY.
+See LICENSE.txt for license details.
+"""
+
+import os
+import tempfile
+import unittest
+from urllib.request import urlopen
+from frugy.fru import Fru
+from frugy import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        with open('tests/bin_files/damc-fmc2zup.bin', 'rb') as f:
+            self.img = f.read()
+
+    def test_counters(self):
+        fru = Fru()
+        fru.deserialize(self.img)
+        img = fru.serialize()
+        broken = bytearray(self.img)
+        broken[9] ^= 0xff
+        with self.assertRaises(RuntimeError):
+            Fru().deserialize(broken)
+
+        self.assertEqual(metrics.images_parsed.value(), 1)
+        self.assertEqual(metrics.bytes_parsed.value(), len(self.img))
+        self.assertEqual(metrics.images_serialized.value(), 1)
+        self.assertEqual(metrics.bytes_serialized.value(), len(img))
+        self.assertEqual(metrics.parse_errors.value(), 1)
+        self.assertEqual(metrics.checksum_errors.value(('BoardInfo',)), 1)
+        self.assertEqual(metrics.phase_seconds.value(('parse',))[0], 1)
+        self.assertEqual(metrics.snapshot()['frugy_checksum_errors_total'], {('BoardInfo',): 1})
+
+        text = metrics.to_prometheus()
+        self.assertIn('frugy_images_parsed_total 1\n', text)
+        self.assertIn('frugy_checksum_errors_total{area="BoardInfo"} 1\n', text)
+        self.assertIn('frugy_phase_seconds_count{phase="parse"} 1\n', text)
+        self.assertIn('frugy_phase_seconds_bucket{phase="parse",le="+Inf"} 1\n', text)
+
+    def test_histogram(self):
+        hist = metrics.Histogram('test_seconds', 'test', buckets=(0.1, 1.0))
+        for v in [0.05, 0.1, 0.5, 2]:
+            hist.observe(v)
+        self.assertEqual(list(hist._samples()), [
+            ('test_seconds_bucket', (), 'le="0.1"', 2),
+            ('test_seconds_bucket', (), 'le="1.0"', 3),
+            ('test_seconds_bucket', (), 'le="+Inf"', 4),
+            ('test_seconds_sum', (), '', 2.65),
+            ('test_seconds_count', (), '', 4),
+        ])
+        del metrics._metrics['test_seconds']
+
+    def test_export(self):
+        Fru().deserialize(self.img)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fname = os.path.join(tmpdir, 'frugy.prom')
+            metrics.write_textfile(fname)
+            with open(fname, 'r') as f:
+                self.assertEqual(f.read(), metrics.to_prometheus())
+            self.assertEqual(os.listdir(tmpdir), ['frugy.prom'])
+
+        server = metrics.serve(0)
+        try:
+            self.assertEqual(server.server_address[0], '127.0.0.1')
+            with urlopen(f'http://127.0.0.1:{server.server_port}/metrics') as resp:
+                self.assertEqual(resp.read().decode(), metrics.to_prometheus())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,7 @@ See LICENSE.txt for license details.
 """
 
 import unittest
+import frugy.fru
 from frugy.multirecords import MultirecordArea
 from frugy.multirecords_picmg import ModuleCurrentRequirements
 
@@ -25,5 +26,30 @@ class TestMultirecord(unittest.TestCase):
         ])
         self.assertEqual(mr.serialize(), b'\xc0\x82\x06\x14\xa4Z1\x00\x16\x00K')
 
+    @staticmethod
+    def raw_record(type_id, payload):
+        header = bytes([type_id, 0x02, len(payload), -sum(payload) & 0xff])
+        return header + bytes([-sum(header) & 0xff]) + payload
+
+    def test_dispatch(self):
+        mcr = ModuleCurrentRequirements({'current_draw': 7.5}).serialize()
+        # OEM record of an unknown manufacturer is skipped without a warning
+        private = self.raw_record(0xc0, b'\x34\x12\x00\x01\xaa\xbb')
+        frugy.fru.import_log.str = ''
+        mr = MultirecordArea()
+        mr.deserialize(private + mcr)
+        self.assertNotIn('Failed', frugy.fru.import_log.str)
+        self.assertEqual([type(r) for r in mr.records], [ModuleCurrentRequirements])
+        self.assertIn('Ignored private / proprietary multirecord (manufacturer 0x001234)',
+                      frugy.fru.import_log.str)
+
+        # unknown record of a known manufacturer is reported
+        unknown = self.raw_record(0xc0, b'\x5a\x31\x00\x7f\x00\xaa')
+        mr = MultirecordArea()
+        with self.assertLogs(level='WARNING') as cm:
+            mr.deserialize(unknown + mcr)
+        self.assertIn('Unknown OEM multirecord 0x7f of manufacturer 0x00315a', '\n'.join(cm.output))
+        self.assertEqual(len(mr.records), 1)
+
 if __name__ == '__main__':
     unittest.main()
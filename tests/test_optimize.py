@@ -0,0 +1,76 @@
+"""
+SPDX-License-Identifier: BSD-3-Clause
+Copyright (c) 2020 Deutsches Elektronen-Synchrotron DESY.
+See LICENSE.txt for license details.
+"""
+
+import glob
+import unittest
+from frugy.fru import Fru
+from frugy.types import StringFmt
+from frugy.optimize import compact_formats, optimize, size_budget, write_amplification
+
+
+class TestOptimize(unittest.TestCase):
+    def test_compact_formats(self):
+        self.assertEqual(compact_formats('21-0042'), [])
+        self.assertEqual(compact_formats('2021-0042.'), [StringFmt.BCD_PLUS])
+        self.assertEqual(compact_formats('DESY'), [StringFmt.ASCII_6BIT])
+        self.assertEqual(compact_formats('1234'), [StringFmt.BCD_PLUS, StringFmt.ASCII_6BIT])
+        self.assertEqual(compact_formats('Desy'), [])
+        self.assertEqual(compact_formats(''), [])
+
+    def test_examples(self):
+        ''' Optimized images are never larger, and decode to the same content '''
+        saved_total = 0
+        for fname in sorted(glob.glob('examples/*.yml')):
+            fru = Fru()
+            fru.load_yaml(fname)
+            size = len(fru.serialize())
+            saved = optimize(fru)
+            img = fru.serialize()
+            self.assertEqual(len(img), size - saved, fname)
+            self.assertEqual(len(img), sum(e.size for e in size_budget(fru)), fname)
+            parsed = Fru()
+            parsed.deserialize(img)
+            self.assertEqual(parsed.to_dict(), fru.to_dict(), fname)
+            saved_total += saved
+        self.assertGreater(saved_total, 0)
+
+    def test_keep_plain_strings(self):
+        ''' Strings are re-encoded only if the padded area gets smaller '''
+        fru = Fru({
+            'BoardInfo': {'manufacturer': 'DESY', 'serial_number': '12345678'},
+            'ProductInfo': {},
+        })
+        # BCD+ serial number saves 8 bytes of BoardInfo, empty ProductInfo is dropped
+        self.assertEqual(optimize(fru), 8 + 16)
+        self.assertNotIn('ProductInfo', fru.areas)
+        self.assertEqual(fru.areas['BoardInfo']._dict['serial_number']._format, StringFmt.BCD_PLUS)
+        formats = [f._format for f in fru.areas['BoardInfo']._dict.values() if hasattr(f, '_format')
+                   and isinstance(f._format, StringFmt)]
+        self.assertEqual(formats.count(StringFmt.ASCII_8BIT), len(formats) - 1)
+
+    def test_keep_original_format(self):
+        ''' Strings are reverted to the format they had, not to plain 8-bit ASCII '''
+        fru = Fru({'BoardInfo': {'manufacturer': 'DESY', 'serial_number': '1234'}})
+        field = fru.areas['BoardInfo']._dict['serial_number']
+        field._format = StringFmt.ASCII_6BIT
+        size = fru.size_total()
+        # BCD+ saves a byte of the string, but not of the padded area
+        self.assertEqual(optimize(fru), 0)
+        self.assertEqual(field._format, StringFmt.ASCII_6BIT)
+        self.assertEqual(fru.size_total(), size)
+
+    def test_write_amplification(self):
+        fru = Fru()
+        fru.load_yaml('examples/damc-fmc2zup.yml')
+        img = fru.serialize(page_size=32, slack=16)
+        self.assertEqual(len(img), sum(e.size for e in size_budget(fru, 32, 16)))
+
+        costs = write_amplification(fru, 32, slack=16)
+        self.assertEqual(fru.serialize(page_size=32, slack=16), img)
+        self.assertIn('BoardInfo.serial_number', [c.field for c in costs])
+        # grown areas fit into their slack, the packed layout shifts all following areas
+        for c in costs:
+            self.assertLess(c.aligned, c.packed, c.field)
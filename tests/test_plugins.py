@@ -0,0 +1,88 @@
+"""
+SPDX-License-Identifier: BSD-3-Clause
+Copyright (c) 2020 Deutsches Elektronen-Synchrotron DESY.
+See LICENSE.txt for license details.
+"""
+
+import importlib
+import sys
+import unittest
+from unittest import mock
+import frugy.fru
+from frugy import fru_registry
+from frugy.multirecords import MultirecordArea
+from frugy.validate import validate
+
+
+class EntryPoint:
+    def __init__(self, name, module):
+        self.name = name
+        self.module = module
+        self.loaded = 0
+
+    def load(self):
+        self.loaded += 1
+        return importlib.import_module(self.module)
+
+
+class TestPlugins(unittest.TestCase):
+    # tests/plugin_records.PluginBoardRevision, revision 3, variant 7
+    record = b'\xc0\x82\x06};\xcd\xab\x00\x01\x03\x07'
+
+    def setUp(self):
+        self.ep = EntryPoint('0xc0:0x00abcd', 'tests.plugin_records')
+        self.entry_points = [self.ep, EntryPoint('not_an_id', 'no.such.module')]
+        fru_registry._plugins = None
+        patcher = mock.patch.object(fru_registry, '_entry_points', return_value=self.entry_points)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, fru_registry, '_plugins', None)
+        self.addCleanup(self.unload_plugin)
+
+    def unload_plugin(self):
+        ''' Remove the records of the plugin module, so other tests see the built-in records only '''
+        module = sys.modules.pop(self.ep.module, None)
+        if module is None:
+            return
+        for obj in vars(module).values():
+            if isinstance(obj, type) and obj.__module__ == self.ep.module:
+                fru_registry.rec_unregister(obj)
+
+    def test_lazy_load(self):
+        private = b'\xc0\x82\x06Td\x34\x12\x00\x01\xaa\xbb'
+        frugy.fru.import_log.str = ''
+        mr = MultirecordArea()
+        with self.assertLogs(level='WARNING') as cm:
+            mr.deserialize(private)
+        self.assertIn('Ignoring multirecord plugin not_an_id', cm.output[0])
+        self.assertEqual(self.ep.loaded, 0)
+
+        mr.deserialize(self.record)
+        self.assertEqual(self.ep.loaded, 1)
+        self.assertEqual(mr.to_dict(), [{'type': 'PluginBoardRevision', 'revision': 3, 'variant': 7}])
+        self.assertEqual(mr.serialize(), self.record)
+        mr.deserialize(self.record)
+        self.assertEqual(self.ep.loaded, 1)
+
+    def test_lookup_by_name(self):
+        mr = MultirecordArea([{'type': 'PluginBoardRevision', 'revision': 3, 'variant': 7}])
+        self.assertIn('tests.plugin_records', sys.modules)
+        self.assertEqual(mr.serialize(), self.record)
+
+    def test_validate(self):
+        ''' Validation only loads the plugins of the multirecords used '''
+        self.assertEqual(validate({'BoardInfo': {'manufacturer': 'DESY'}}), [])
+        self.assertEqual(self.ep.loaded, 0)
+        rec = {'type': 'PluginBoardRevision', 'revision': 3, 'variant': 7}
+        self.assertEqual(validate({'MultirecordArea': [rec]}), [])
+        self.assertEqual(self.ep.loaded, 1)
+
+        self.unload_plugin()
+        self.assertNotIn('PluginBoardRevision', fru_registry._lookup_by_name)
+        fru_registry._plugins = {}
+        errors = validate({'MultirecordArea': [rec]})
+        self.assertEqual(errors, ["MultirecordArea[0].type: unknown record type 'PluginBoardRevision'"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+SPDX-License-Identifier: BSD-3-Clause
+Copyright (c) 2020 Deutsches Elektronen-Synchrotron DESY.
+See LICENSE.txt for license details.
+"""
+
+import json
+import unittest
+from frugy.fru import Fru
+from frugy.multirecords_picmg import AmcLinkDescriptor
+import frugy.profiling as profiling
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        profiling.reset()
+
+    def test_collect(self):
+        calls = []
+
+        def callback(phase, name, start, duration, nbytes):
+            calls.append((phase, name, nbytes))
+
+        profiling.add_callback(callback)
+        try:
+            with profiling.profiled():
+                fru = Fru()
+                fru.load_bin('tests/bin_files/damc-fmc2zup.bin')
+                img = fru.serialize()
+        finally:
+            profiling.remove_callback(callback)
+
+        stats = {(e.phase, e.name): e for e in profiling.results()}
+        self.assertEqual(stats[('fru.deserialize', 'Fru')].bytes, len(img))
+        self.assertEqual(stats[('fru.serialize', 'Fru')].calls, 1)
+        links = stats[('record.deserialize', 'AmcLinkDescriptor')]
+        self.assertEqual(links.bytes, links.calls * 5)
+        self.assertIn(('multirecord.deserialize', 'PointToPointConnectivity', 124), calls)
+        self.assertEqual(len(calls), sum(e.calls for e in stats.values()))
+
+        self.assertEqual(len(json.loads(profiling.to_json())), len(stats))
+        self.assertIn('AmcLinkDescriptor', profiling.format_table())
+
+    def test_disabled(self):
+        ''' Without profiling, the original (generated) methods are in place '''
+        orig = AmcLinkDescriptor.__dict__['_deserialize']
+        profiling.enable()
+        self.assertIsNot(AmcLinkDescriptor.__dict__['_deserialize'], orig)
+        profiling.disable()
+        self.assertIs(AmcLinkDescriptor.__dict__['_deserialize'], orig)
+
+        Fru().load_bin('tests/bin_files/damc-fmc2zup.bin')
+        self.assertEqual(profiling.results(), [])
@@ -0,0 +1,67 @@
+"""
+SPDX-License-Identifier: BSD-3-Clause
+Copyright (c) 2020 Deutsches Elektronen-Synchrotron DESY.
+See LICENSE.txt for license details.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import yaml
+from frugy.multirecords import MultirecordEntry
+from frugy.regress import find_pairs, regress
+
+
+class TestRegress(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = self.tmpdir.name
+        with open('tests/bin_files/damc-fmc2zup.bin', 'rb') as f:
+            img = f.read()
+        with open('examples/damc-fmc2zup.yml', 'r') as f:
+            fru_dict = yaml.safe_load(f)
+        self.serial = fru_dict['BoardInfo']['serial_number']
+        self.records = len(fru_dict['MultirecordArea'])
+
+        # unchanged, and padded to EEPROM size
+        shutil.copy('examples/damc-fmc2zup.yml', os.path.join(self.path, 'good.yml'))
+        with open(os.path.join(self.path, 'good.bin'), 'wb') as f:
+            f.write(img + b'\xff' * 256)
+        # field changed, record dropped
+        fru_dict['BoardInfo']['serial_number'] = 'changed'
+        del fru_dict['MultirecordArea'][-1]
+        with open(os.path.join(self.path, 'bad.yml'), 'w') as f:
+            yaml.dump(fru_dict, f)
+        with open(os.path.join(self.path, 'bad.bin'), 'wb') as f:
+            f.write(img)
+        with open(os.path.join(self.path, 'unpaired.yml'), 'w') as f:
+            yaml.dump(fru_dict, f)
+
+    def test_regress(self):
+        pairs = find_pairs([self.path])
+        self.assertEqual([p.name for p in pairs], ['bad', 'good', 'unpaired'])
+        self.assertIsNone(pairs[2].bin)
+
+        for jobs in [1, 2]:
+            results = list(regress(pairs, jobs=jobs))
+            self.assertEqual([r.name for r in results], ['bad', 'good'])
+            bad, good = results
+            self.assertEqual(good.diffs, {'yaml2bin': [], 'bin2yaml2bin': []})
+            self.assertEqual(bad.diffs['bin2yaml2bin'], [])
+            self.assertEqual(bad.diffs['yaml2bin'], [
+                f"BoardInfo.serial_number: expected '{self.serial}', got 'changed'",
+                f'MultirecordArea[{self.records - 2}]: end of list flag differs',
+                f'MultirecordArea[{self.records - 1}]: missing',
+            ])
+
+    def test_opalkelly_restored(self):
+        ''' In-process runs leave the parser settings of the caller alone '''
+        results = list(regress(find_pairs([self.path]), jobs=1, opalkelly_workaround=True))
+        self.assertEqual(len(results), 2)
+        self.assertFalse(MultirecordEntry.opalkelly_workaround_enabled)
+
+
+if __name__ == '__main__':
+    unittest.main()
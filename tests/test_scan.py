@@ -0,0 +1,128 @@
+"""
+SPDX-License-Identifier: BSD-3-Clause
+Copyright (c) 2020 Deutsches Elektronen-Synchrotron DESY.
+See LICENSE.txt for license details.
+"""
+
+import asyncio
+import glob
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from frugy.archive import FruArchive
+from frugy.fru import Fru
+from frugy.multirecords import MultirecordEntry
+from frugy.scan import scan, parse_image
+
+
+def run_scan(sources, **kwargs):
+    async def collect():
+        return [r async for r in scan(sources, **kwargs)]
+    loop = asyncio.new_event_loop()
+    try:
+        return dict(loop.run_until_complete(collect()))
+    finally:
+        loop.close()
+
+
+class TestScan(unittest.TestCase):
+    def setUp(self):
+        self.sources = sorted(glob.glob('tests/bin_files/damc-*.bin'))
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def reference(self, fname):
+        fru = Fru()
+        fru.load_bin(fname)
+        return fru.to_dict()
+
+    def test_sources(self):
+        archive_name = os.path.join(self.tmpdir.name, 'dumps.fra')
+        with FruArchive(archive_name, 'w') as archive:
+            for fname in self.sources[:2]:
+                with open(fname, 'rb') as f:
+                    archive.append(f.read())
+        with open(self.sources[0], 'rb') as f:
+            img = f.read()
+
+        async def simulated():
+            await asyncio.sleep(0.01)
+            return img
+
+        missing = os.path.join(self.tmpdir.name, 'missing.bin')
+        results = run_scan(self.sources + [archive_name, missing,
+                                           ('sim0', simulated), ('broken', lambda: img[:7] + b'\x00' + img[8:])],
+                           concurrency=4, executor=ThreadPoolExecutor(2))
+
+        self.assertEqual(len(results), len(self.sources) + 5)
+        for fname in self.sources:
+            self.assertEqual(results[fname].to_dict(), self.reference(fname))
+        for idx in range(2):
+            self.assertEqual(results[f'{archive_name}[{idx}]'].to_dict(), self.reference(self.sources[idx]))
+        self.assertEqual(results['sim0'].to_dict(), self.reference(self.sources[0]))
+        self.assertIsInstance(results[missing], OSError)
+        self.assertIsInstance(results['broken'], RuntimeError)
+
+    def test_default_executor(self):
+        results = run_scan(self.sources[:2])
+        for fname in self.sources[:2]:
+            self.assertEqual(results[fname].to_dict(), self.reference(fname))
+
+    def test_bounded(self):
+        ''' Sources are taken from the iterator as images complete '''
+        with open(self.sources[0], 'rb') as f:
+            img = f.read()
+        drawn = []
+        running = []
+        max_running = []
+
+        async def simulated():
+            running.append(1)
+            max_running.append(len(running))
+            await asyncio.sleep(0.001)
+            running.pop()
+            return img
+
+        def sources():
+            for n in range(50):
+                drawn.append(n)
+                yield f'sim{n}', simulated
+
+        async def first():
+            async for result in scan(sources(), concurrency=3, executor=ThreadPoolExecutor(1)):
+                return len(drawn), result
+        loop = asyncio.new_event_loop()
+        try:
+            num_drawn, (name, fru) = loop.run_until_complete(first())
+        finally:
+            loop.close()
+        self.assertLessEqual(num_drawn, 4)
+        self.assertEqual(fru.to_dict(), self.reference(self.sources[0]))
+
+        results = run_scan(sources(), concurrency=3, executor=ThreadPoolExecutor(1))
+        self.assertEqual(len(results), 50)
+        self.assertLessEqual(max(max_running), 3)
+
+    def test_opalkelly_restored(self):
+        with open(self.sources[0], 'rb') as f:
+            img = f.read()
+        parse_image(img, opalkelly_workaround=True)
+        self.assertFalse(MultirecordEntry.opalkelly_workaround_enabled)
+
+    def test_opalkelly_threads(self):
+        ''' Parsers in a thread pool don't see the workaround setting of the others '''
+        with open('tests/bin_files/opalkelly_default.bin', 'rb') as f:
+            img = f.read()
+        with self.assertLogs(level='WARNING'):
+            expected = {w: parse_image(img, w).to_dict() for w in (False, True)}
+        self.assertNotEqual(expected[False], expected[True])
+        settings = [n % 2 == 0 for n in range(64)]
+        with self.assertLogs(level='WARNING'), ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda w: parse_image(img, w).to_dict(), settings))
+        for w, result in zip(settings, results):
+            self.assertEqual(result, expected[w])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+SPDX-License-Identifier: BSD-3-Clause
+Copyright (c) 2020 Deutsches Elektronen-Synchrotron DESY.
+See LICENSE.txt for license details.
+"""
+
+import unittest
+from frugy.fru import Fru
+from frugy.store import RecordStore
+
+
+class TestRecordStore(unittest.TestCase):
+    def test_shared_records(self):
+        with open('tests/bin_files/damc-fmc2zup.bin', 'rb') as f:
+            img = f.read()
+        variant = Fru.patch_bin(img, {'BoardInfo.serial_number': '21Y01W4711'})
+
+        store = RecordStore()
+        a, b = Fru(), Fru()
+        a.deserialize(img, store=store)
+        b.deserialize(variant, store=store)
+
+        ref = Fru()
+        ref.deserialize(variant)
+        self.assertEqual(b.to_dict(), ref.to_dict())
+        self.assertEqual(b.serialize(), variant)
+
+        # only BoardInfo differs, everything else is shared
+        self.assertIsNot(a.areas['BoardInfo'], b.areas['BoardInfo'])
+        self.assertIs(a.areas['ProductInfo'], b.areas['ProductInfo'])
+        for rec_a, rec_b in zip(a.areas['MultirecordArea'].records, b.areas['MultirecordArea'].records):
+            self.assertIs(rec_a, rec_b)
+        self.assertEqual(store.misses, len(store))
+        self.assertEqual(store.hits, 1 + len(b.areas['MultirecordArea'].records))
+
+        with self.assertRaises(RuntimeError):
+            b.areas['ProductInfo']['serial_number'] = '1234'
+
+    def test_end_of_list(self):
+        ''' Serializing a FRU doesn't change shared records, whose position differs between FRUs '''
+        x = {'type': 'ModuleCurrentRequirements', 'current_draw': 1.5}
+        y = {'type': 'ModuleCurrentRequirements', 'current_draw': 2.5}
+        img_a = Fru({'MultirecordArea': [x, y]}).serialize()
+        img_b = Fru({'MultirecordArea': [y, x]}).serialize()
+
+        store = RecordStore()
+        a, b = Fru(), Fru()
+        a.deserialize(img_a, store=store)
+        b.deserialize(img_b, store=store)
+        rec_x = a.areas['MultirecordArea'].records[0]
+        self.assertIs(rec_x, b.areas['MultirecordArea'].records[1])
+
+        standalone = rec_x.serialize()
+        self.assertEqual(a.serialize(), img_a)
+        self.assertEqual(rec_x.serialize(), standalone)
+        self.assertEqual(b.serialize(), img_b)
+        self.assertEqual(rec_x.serialize(), standalone)
+        self.assertEqual(a.serialize(), img_a)
+        self.assertNotEqual(rec_x.serialize(end_of_list=True), standalone)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+SPDX-License-Identifier: BSD-3-Clause
+Copyright (c) 2020 Deutsches Elektronen-Synchrotron DESY.
+See LICENSE.txt for license details.
+"""
+
+import glob
+import io
+import json
+import os
+import argparse
+import tempfile
+import unittest
+import yaml
+from frugy.fru import Fru
+from frugy.cli import stream_frus, named_documents, build_images, build_image
+
+
+class TestStream(unittest.TestCase):
+    def setUp(self):
+        self.sources = sorted(glob.glob('tests/bin_files/*.bin'))[:4]
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_write_yaml(self):
+        ''' Streamed YAML matches the in-memory dump '''
+        for fname in self.sources:
+            fru = Fru()
+            fru.load_bin(fname)
+            out = io.StringIO()
+            fru.write_yaml(out)
+            self.assertEqual(out.getvalue(), fru.dump_yaml(), fname)
+
+    def test_multi_document(self):
+        outfile = os.path.join(self.tmpdir.name, 'out.yml')
+        self.assertEqual(stream_frus(self.sources, outfile), 0)
+        with open(outfile, 'r') as f:
+            docs = list(yaml.safe_load_all(f))
+        self.assertEqual(len(docs), len(self.sources))
+        for fname, doc in zip(self.sources, docs):
+            fru = Fru()
+            fru.load_bin(fname)
+            self.assertEqual(doc, fru.to_dict(), fname)
+
+    def test_json_lines(self):
+        broken = os.path.join(self.tmpdir.name, 'broken.bin')
+        with open(broken, 'wb') as f:
+            f.write(b'\x01\x00\x00\x01\x00\x00\x00\xfe')
+        outfile = os.path.join(self.tmpdir.name, 'out.jsonl')
+        self.assertEqual(stream_frus(self.sources + [broken], outfile, jsonl=True), 1)
+        with open(outfile, 'r') as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line['source'] for line in lines], self.sources)
+        self.assertIn('BoardInfo', lines[0]['fru'])
+
+    def test_corrupt_archive(self):
+        ''' A truncated archive is reported, the following sources are still written '''
+        broken = os.path.join(self.tmpdir.name, 'broken.fra')
+        with open(broken, 'wb') as f:
+            f.write(b'FRUGYARC\x01\x00')
+        outfile = os.path.join(self.tmpdir.name, 'out.jsonl')
+        self.assertEqual(stream_frus([broken] + self.sources, outfile, jsonl=True), 1)
+        with open(outfile, 'r') as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line['source'] for line in lines], self.sources)
+
+    def test_named_documents(self):
+        docs = []
+        for fname in ['examples/damc-fmc20.yml', 'examples/damc-fmc25.yml']:
+            with open(fname, 'r') as f:
+                docs.append(yaml.safe_load(f))
+        self.assertIsNone(named_documents(docs[:1], 'family'))
+        self.assertEqual(named_documents(docs, 'family'), [('family-0', docs[0]), ('family-1', docs[1])])
+        keyed = {'fmc20': docs[0], 'fmc25': docs[1]}
+        self.assertEqual(named_documents([keyed], 'family'), list(keyed.items()))
+        self.assertEqual(named_documents([[{k: v} for k, v in keyed.items()]], 'family'), list(keyed.items()))
+        # a single description with a misspelled area isn't taken for named descriptions
+        misspelled = dict(docs[0], BordInfo=docs[0]['BoardInfo'])
+        del misspelled['BoardInfo']
+        self.assertIsNone(named_documents([misspelled], 'family'))
+        self.assertIsNone(named_documents([{'BordInfo': {'manufacturer': 'DESY'}}], 'family'))
+
+        args = argparse.Namespace(set=None, timestamp=False, no_validate=False, optimize=False, budget=False,
+                                  page_size=None, slack=0, eeprom_size=None, verify=False, jobs=None)
+        named = list(keyed.items()) + [('broken', {'BoardInfo': {'no_such_field': 1}})]
+        self.assertEqual(build_images(named, self.tmpdir.name, args), 1)
+        for name, doc in keyed.items():
+            with open(os.path.join(self.tmpdir.name, f'{name}.bin'), 'rb') as f:
+                self.assertEqual(f.read(), Fru(doc).serialize(), name)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, 'broken.bin')))
+
+    def test_set_values(self):
+        ''' --set values of integer fields are converted, strings stay strings '''
+        args = argparse.Namespace(set=['ChassisInfo.type=17', 'serial_number=1234'], timestamp=False,
+                                  no_validate=False, optimize=False, budget=False, page_size=None, slack=0,
+                                  eeprom_size=None, verify=False, jobs=None)
+        fru_dict = {'ChassisInfo': {'type': 23, 'serial_number': '0'}, 'BoardInfo': {'serial_number': '0'}}
+        img, _ = build_image(Fru(), fru_dict, args, 't.yml')
+        fru = Fru()
+        fru.deserialize(img)
+        self.assertEqual(fru.to_dict()['ChassisInfo']['type'], 17)
+        self.assertEqual(fru.to_dict()['BoardInfo']['serial_number'], '1234')
+
+        args.set, args.no_validate = ['ChassisInfo.type=1.5'], True
+        with self.assertRaisesRegex(RuntimeError, 'Error: t.yml cannot be encoded'):
+            build_image(Fru(), {'ChassisInfo': {'type': 23}}, args, 't.yml')
@@ -0,0 +1,40 @@
+"""
+SPDX-License-Identifier: BSD-3-Clause
+Copyright (c) 2020 Deutsches Elektronen-Synchrotron DESY.
+See LICENSE.txt for license details.
+"""
+
+import unittest
+from frugy.fru import Fru
+from frugy.synth import FruSynth
+from frugy.validate import validate
+
+
+class TestSynth(unittest.TestCase):
+    def test_reproducible(self):
+        synth = FruSynth(seed=42)
+        first = list(synth.generate(5))
+        self.assertEqual(list(synth.generate(3, start=2)), first[2:])
+        self.assertNotEqual(FruSynth(seed=43).image(0), first[0])
+
+    def test_valid(self):
+        ''' Generated descriptions validate, and parsed images serialize identically '''
+        for fru_dict, img in FruSynth(seed=1, records_mean=2).generate(20):
+            self.assertEqual(validate(fru_dict), [])
+            fru = Fru()
+            fru.deserialize(img)
+            self.assertEqual(fru.serialize(), img)
+
+    def test_size_limits(self):
+        ''' Arrays of maximum length are shrunk until the record fits '''
+        synth = FruSynth(seed=2, p_max=1.0, p_optional=1.0, max_records=4,
+                         record_types=['PointToPointConnectivity', 'ClockConfig'])
+        for n in range(4):
+            fru_dict, img = synth.image(n)
+            fru = Fru(fru_dict)
+            for rec in fru.areas['MultirecordArea'].records:
+                self.assertLessEqual(rec.size_payload() - 5, 255)
+                self.assertGreater(rec.size_payload() - 5, 200)
+
+        with self.assertRaises(RuntimeError):
+            FruSynth(record_types=['NoSuchRecord'])
@@ -5,8 +5,10 @@ See LICENSE.txt for license details.
 """
 
 import unittest
+from unittest import mock
 
-from frugy.types import FixedField, StringField, StringFmt, GuidField, ArrayField, FruAreaBase
+from frugy.types import FixedField, StringField, StringFmt, FixedStringField, GuidField, ArrayField, FruAreaBase, \
+    seed_guids
 
 
 class TestString(unittest.TestCase):
@@ -62,6 +64,52 @@ class ArrayTest(FruAreaBase):
         ('bits2', FixedField, 'u4', {'default': 0}),
     ]
 
+class FixedStringTest(FruAreaBase):
+    _schema = [
+        ('username', FixedStringField, 8, {'default': ''}),
+        ('port', FixedField, 'u8', {'default': 0}),
+    ]
+
+
+class TestFixedString(unittest.TestCase):
+    def test_padding(self):
+        ''' Short strings are padded to the buffer size, so the following fields stay in place '''
+        tmp = FixedStringField(8, default='abc')
+        self.assertEqual(tmp.serialize(), b'abc\x00\x00\x00\x00\x00')
+        self.assertEqual(len(tmp.serialize()), tmp._bufsize)
+        tmp.update('x' * 10)
+        self.assertEqual(tmp.serialize(), b'xxxxxxx\x00')
+
+        record = FixedStringTest({'username': 'ab', 'port': 7})
+        ser = record.serialize()
+        self.assertEqual(ser, b'ab\x00\x00\x00\x00\x00\x00\x07')
+        self.assertEqual(len(ser), record.size_total())
+        tmp2 = FixedStringTest()
+        tmp2.deserialize(ser)
+        self.assertEqual(tmp2.to_dict(), {'username': 'ab', 'port': 7})
+
+
+class DivTest(FruAreaBase):
+    _schema = [
+        ('current_draw', FixedField, 'u8', {'div': 0.1}),
+        ('voltage', FixedField, 'u16', {'div': 0.01}),
+    ]
+
+
+class TestFixed(unittest.TestCase):
+    def test_div_rounding(self):
+        ''' Scaled values are rounded to the nearest step, not truncated '''
+        tmp = FixedField('u8', div=0.1)
+        tmp.update(0.3)
+        # 0.3 / 0.1 is 2.9999999999999996
+        self.assertEqual(tmp.to_serialized(), 3)
+        record = DivTest({'current_draw': 0.3, 'voltage': 0.29})
+        self.assertEqual(record.serialize(), b'\x03\x1d\x00')
+        tmp2 = DivTest()
+        tmp2.deserialize(record.serialize())
+        self.assertEqual(tmp2.to_dict(), {'current_draw': 0.3, 'voltage': 0.29})
+
+
 class TestMisc(unittest.TestCase):
     def test_uuid(self):
         testUid = 'cafebabe-1234-5678-d00f-deadbeef4711'
@@ -87,5 +135,38 @@ class TestMisc(unittest.TestCase):
         tmp2.deserialize(ser)
         self.assertEqual(tmp.__repr__(), tmp2.__repr__())
 
+    def test_accessors(self):
+        class AccessorTest(ArrayTest):
+            def _get_bits(self):
+                return self._get('bits1') << 4 | self._get('bits2')
+
+            def _set_bits(self, value):
+                self._set('bits1', value >> 4)
+                self._set('bits2', value & 0xf)
+
+        tmp = AccessorTest({'first_byte': 1, 'bits': 0x5a})
+        self.assertEqual((tmp['bits1'], tmp['bits2'], tmp['bits']), (5, 10, 0x5a))
+        self.assertIn('bits', tmp)
+        self.assertNotIn('bits', ArrayTest())
+
+    def test_guid_array_deserialize(self):
+        testUid = 'cafebabe-1234-5678-d00f-deadbeef4711'
+        ser = ArrayField(GuidField, initdict=[testUid] * 2).serialize()
+        tmp = ArrayField(GuidField)
+        with mock.patch('uuid.uuid4') as uuid4:
+            tmp.deserialize(ser)
+        uuid4.assert_not_called()
+        self.assertEqual(tmp.to_dict(), [testUid] * 2)
+
+    def test_guid_seed(self):
+        try:
+            seed_guids(42)
+            first = [GuidField().to_dict() for _ in range(3)]
+            seed_guids(42)
+            self.assertEqual([GuidField().to_dict() for _ in range(3)], first)
+            self.assertEqual(len(set(first)), 3)
+        finally:
+            seed_guids()
+
 if __name__ == '__main__':
     unittest.main()
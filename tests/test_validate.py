@@ -0,0 +1,109 @@
+"""
+SPDX-License-Identifier: BSD-3-Clause
+Copyright (c) 2020 Deutsches Elektronen-Synchrotron DESY.
+See LICENSE.txt for license details.
+"""
+
+import glob
+import json
+import subprocess
+import sys
+import unittest
+import yaml
+from frugy.fru import Fru
+from frugy.validate import validate, check, json_schema, compile_schema
+
+
+class TestValidate(unittest.TestCase):
+    def test_examples(self):
+        for fname in sorted(glob.glob('examples/*.yml')):
+            with open(fname, 'r') as f:
+                fru_dict = yaml.safe_load(f)
+            self.assertEqual(validate(fru_dict), [], fname)
+
+    def test_standalone_import(self):
+        ''' Validator registers all records itself, without frugy.fru imported first '''
+        code = 'from frugy.validate import validate; print(validate({"BoardInfo": {"manufacturer": "DESY"}}))'
+        result = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.assertEqual(result.returncode, 0, result.stderr.decode())
+        self.assertEqual(result.stdout.decode().strip(), '[]')
+
+    def test_roundtrip_dicts(self):
+        ''' Everything frugy reads from a FRU image validates '''
+        for fname in sorted(glob.glob('tests/bin_files/*.bin')):
+            fru = Fru()
+            fru.load_bin(fname)
+            self.assertEqual(validate(fru.to_dict()), [], fname)
+
+    def test_errors(self):
+        fru_dict = {
+            'BoardInfo': {
+                'serial_number': 1234,
+                'product_name': 'x' * 64,
+                'mfg_date_time': 'yesterday',
+                'colour': 'blue',
+            },
+            'MultirecordArea': [{
+                'type': 'DCLoad',
+                'output_number': 'P3_VADJ',
+                'nominal_voltage': 700000.0,
+                'min_voltage': 0,
+                'max_voltage': 0,
+                'max_noise_pk2pk': 0,
+                'min_current_load': 0,
+            }, {
+                'type': 'PointToPointConnectivity',
+                'record_type': 'amc_module',
+                'channel_descriptors': [[1, 2, 3, 4, 5]],
+                'link_descriptors': [{
+                    'asymm_match': 'match_exact', 'grouping_id': 0, 'link_type': 'pcie',
+                    'channel_id': 256, 'lane_flags': [1, 1]
+                }],
+            }, {
+                'type': 'NoSuchRecord',
+            }],
+        }
+        errors = validate(fru_dict)
+        self.assertEqual(errors, [
+            "BoardInfo.serial_number: expected string, got int 1234",
+            "BoardInfo.product_name: string too long (64 > 63 characters)",
+            "BoardInfo.mfg_date_time: 'yesterday' is not a valid date-time",
+            "BoardInfo.colour: unknown field",
+            "MultirecordArea[0].max_current_load: missing",
+            "MultirecordArea[0].output_number: invalid value 'P3_VADJ', expected one of "
+            "P1_VADJ, P1_3P3V, P1_12P0V, P1_VIO_B_M2C, P1_VREF_A_M2C, P1_VREF_B_M2C, "
+            "P2_VADJ, P2_3P3V, P2_12P0V, P2_VIO_B_M2C, P2_VREF_A_M2C, P2_VREF_B_M2C / "
+            "expected integer, got str 'P3_VADJ'",
+            "MultirecordArea[0].nominal_voltage: value 700000.0 out of range 0..655350",
+            "MultirecordArea[1].channel_descriptors[0]: too many elements (5 > 4)",
+            "MultirecordArea[1].link_descriptors[0].channel_id: value 256 out of range 0..255",
+            "MultirecordArea[1].link_descriptors[0].lane_flags: too few elements (2 < 4)",
+            "MultirecordArea[2].type: unknown record type 'NoSuchRecord'",
+        ])
+        with self.assertRaises(RuntimeError):
+            check(fru_dict)
+
+    def test_json_schema(self):
+        schema = json.loads(json.dumps(json_schema()))
+        self.assertIn('AmcLinkDescriptor', schema['$defs'])
+        self.assertIn('lane_flags', schema['$defs']['AmcLinkDescriptor']['required'])
+        errors = []
+        compile_schema(schema)({'ProductInfo': {'version': None}}, '', errors)
+        self.assertEqual(errors, ['ProductInfo.version: expected string, got NoneType None'])
+
+    def test_multiple_of(self):
+        ''' multipleOf is only emitted for integer steps, as validators check it by float division '''
+        def steps(node):
+            if isinstance(node, dict):
+                if 'multipleOf' in node:
+                    yield node['multipleOf']
+                for v in node.values():
+                    yield from steps(v)
+            elif isinstance(node, list):
+                for v in node:
+                    yield from steps(v)
+        schema = json_schema()
+        self.assertTrue(all(isinstance(step, int) for step in steps(schema)))
+        current_draw = schema['$defs']['ModuleCurrentRequirements']['properties']['current_draw']
+        self.assertEqual(current_draw.get('x-frugy-div'), 0.1)
+        self.assertEqual(validate({'MultirecordArea': [{'type': 'ModuleCurrentRequirements', 'current_draw': 0.3}]}), [])